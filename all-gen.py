@@ -0,0 +1,270 @@
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import click
+from rich.console import Console
+from rich.progress import Progress
+from dotenv import load_dotenv
+
+from codernize.cache import open_cache
+from codernize.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAX_FILE_TOKENS, filter_skipped
+from codernize.classifier import DEFAULT_MIN_CONFIDENCE
+from codernize.dedup import DEFAULT_NEAR_DUPLICATE_SIMILARITY, duplicates_summary, find_duplicates, map_duplicates, reuse_result
+from codernize.diagram import DEFAULT_MAX_NODES, is_valid_mermaid
+from codernize.executor import DEFAULT_CONCURRENCY
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, LazyClient, get_limiter, set_cache
+from codernize.packing import DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_FILE_TOKENS, map_packed
+from codernize.reduce import DEFAULT_FAN_IN, DEFAULT_NODE_TOKEN_BUDGET
+from codernize.retrieval import DEFAULT_CONTEXT_TOKENS, DEFAULT_TOP_K, DocIndex
+from codernize.routing import ModelsFileError, get_router, routing_summary
+from codernize.scanner import read_text, scan, set_snapshot
+from codernize.suggestions import DEFAULT_SIMILARITY, has_suggestions
+from codernize.telemetry import telemetry
+from codernize.tools import load_tool
+from codernize.triage import rule_analysis
+
+load_dotenv()
+
+console = Console(width=200, force_terminal=True)
+
+RUN_REPORT_FILE = 'all-gen-run-report.json'
+
+
+@click.command()
+@click.argument('repo-directory', required=True, type=click.Path(exists=True))
+@click.option('--output', '-o', default='docs', help='Output directory for all generated files')
+@click.option('--doc-file', '-doc', default='project.md', help='Name of the documentation file')
+@click.option('--modernization-report-file', '-report', default='modernization-report.md', help='Name of the modernization report file')
+@click.option('--combined-diagram-file', '-diagram', default='system-diagram.mermaid', help='Name of the combined diagram file')
+@click.option('--debug', '-d', is_flag=True, help='Enable debug output')
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True, help='Maximum number of OpenAI requests in flight across all stages')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the response cache')
+@click.option('--refresh', is_flag=True, help='Ignore cached responses and overwrite them with fresh ones')
+@click.option('--min-confidence', default=DEFAULT_MIN_CONFIDENCE, show_default=True, help='Confidence needed to accept the local file classifier')
+@click.option('--small-file-tokens', default=DEFAULT_SMALL_FILE_TOKENS, show_default=True, help='Files up to this many tokens are packed into shared requests (0 disables packing)')
+@click.option('--batch-token-budget', default=DEFAULT_BATCH_TOKEN_BUDGET, show_default=True, help='Maximum tokens of files packed into one request')
+@click.option('--chunk-tokens', default=DEFAULT_CHUNK_TOKENS, show_default=True, help='Larger files are split into chunks of this many tokens')
+@click.option('--max-file-tokens', default=DEFAULT_MAX_FILE_TOKENS, show_default=True, help='Files larger than this many tokens are skipped')
+@click.option('--fan-in', default=DEFAULT_FAN_IN, show_default=True, type=click.IntRange(min=2), help='Maximum number of docs combined in one summary call')
+@click.option('--node-token-budget', default=DEFAULT_NODE_TOKEN_BUDGET, show_default=True, help='Maximum input tokens of one summary call')
+@click.option('--per-file-llm', is_flag=True, help='Ask the model for a diagram of every file instead of extracting the structure locally')
+@click.option('--llm-layout', is_flag=True, help='Let the model refine labels and layout of the extracted diagram (one call)')
+@click.option('--prometheus-file', default=None, help='Also write the run metrics to this file for the Prometheus textfile collector')
+@click.option('--max-nodes', default=DEFAULT_MAX_NODES, show_default=True, help='Maximum number of nodes in the simplified diagram')
+@click.option('--max-output-tokens', default=DEFAULT_MAX_OUTPUT_TOKENS, show_default=True, help='Cap on the tokens of each streamed final answer')
+@click.option('--doc-top-k', default=DEFAULT_TOP_K, show_default=True, help='Number of documentation sections sent with each analyzed file')
+@click.option('--doc-context-tokens', default=DEFAULT_CONTEXT_TOKENS, show_default=True, help='Maximum tokens of documentation sent with each analyzed file')
+@click.option('--similarity', default=DEFAULT_SIMILARITY, show_default=True, help='Similarity above which suggestions of different files are merged (above 1 disables merging)')
+@click.option('--no-triage', is_flag=True, help='Send every Java EE file to the model, including those the rules resolve')
+@click.option('--near-duplicate-similarity', default=DEFAULT_NEAR_DUPLICATE_SIMILARITY, show_default=True, help='Similarity above which a file reuses the results of a near-copy (above 1 only reuses exact copies)')
+def main(repo_directory: str, output: str, doc_file: str, modernization_report_file: str, combined_diagram_file: str,
+         debug: bool, concurrency: int, no_cache: bool, refresh: bool, min_confidence: float, small_file_tokens: int,
+         batch_token_budget: int, chunk_tokens: int, max_file_tokens: int, fan_in: int, node_token_budget: int,
+         per_file_llm: bool, llm_layout: bool, prometheus_file: str, max_nodes: int, max_output_tokens: int,
+         doc_top_k: int, doc_context_tokens: int, similarity: float, no_triage: bool, near_duplicate_similarity: float):
+    """Generate documentation, modernization report and system diagram in one run.
+
+    The stages run side by side; the Java files needing the model are analyzed once the documentation is written,
+    with its relevant sections as context as in ModGen.
+    """
+    if not os.getenv("OPENAI_API_KEY"):
+        console.print("[red]Error: OPENAI_API_KEY environment variable not set[/red]")
+        return
+    try:
+        get_router()
+    except ModelsFileError as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return
+
+    cache = open_cache(no_cache, refresh)
+    set_cache(cache)
+
+    doc_gen, mod_gen, diag_gen = load_tool('doc-gen.py'), load_tool('mod-gen.py'), load_tool('diag-gen.py')
+    # One client, hence one HTTP connection pool, for every stage
+    client = LazyClient(api_key=os.getenv("OPENAI_API_KEY"))
+    for tool in (doc_gen, mod_gen, diag_gen):
+        tool.client = client
+
+    os.makedirs(output, exist_ok=True)
+
+    # Scan once for the union of the three tools' file types
+    console.print("[yellow]Scanning codebase...[/yellow]")
+    extensions = doc_gen.RELEVANT_EXTENSIONS | mod_gen.RELEVANT_EXTENSIONS | diag_gen.RELEVANT_EXTENSIONS
+    with telemetry.stage('scan'):
+        snapshot = scan(repo_directory, extensions)
+        set_snapshot(snapshot)
+        files = filter_skipped(
+            snapshot.paths(), max_file_tokens,
+            on_skip=lambda file_path, reason: console.print(f"[yellow]Skipping {file_path}: {reason}[/yellow]"),
+            root=repo_directory)
+    doc_files = [path for path in files if os.path.splitext(path)[1] in doc_gen.RELEVANT_EXTENSIONS]
+    mod_files = [path for path in files if os.path.splitext(path)[1] in mod_gen.RELEVANT_EXTENSIONS]
+    diag_files = [path for path in files if os.path.splitext(path)[1] in diag_gen.RELEVANT_EXTENSIONS]
+    if debug: console.print(f"[cyan]{len(doc_files)} files to document, {len(mod_files)} to analyze, {len(diag_files)} to diagram[/cyan]")
+
+    if not files:
+        console.print("[red]No relevant files found in the repository[/red]")
+        return
+
+    # Files the rules resolve get their analysis without a request
+    with telemetry.stage('triage'):
+        triaged = mod_gen.triage_files(mod_files, repo_directory, os.path.join(output, mod_gen.INVENTORY_FILE))
+    rule_analyses = {}
+    if not no_triage:
+        mod_files = [path for path in mod_files if triaged[path].relevant]
+        rule_analyses = {path: rule_analysis(triaged[path]) for path in mod_files if not triaged[path].needs_llm}
+
+    # Every per-file unit (file or packed batch) and final answer of every stage holds one of these slots
+    slots = threading.BoundedSemaphore(concurrency)
+
+    def limited(fn):
+        def run(*args):
+            with slots:
+                return fn(*args)
+        return run
+
+    def reuse(file_path: str, duplicate, result, validate, process):
+        """The duplicate's result from its representative's, or from its own requests if that failed."""
+        if result is not None:
+            try:
+                reused = reuse_result(client, file_path, duplicate, result, repo_directory, validate)
+                if reused is not None:
+                    return reused
+            except Exception as e:
+                console.print(f"[red]Error processing {file_path}: {str(e)}[/red]")
+        return process(file_path)
+
+    def per_file(file_paths: list, process, process_batch, validate, failed, on_done):
+        """The per-file stage of a tool, as the tool runs it: small files packed, copies and near-copies reused."""
+        duplicates = find_duplicates(file_paths, near_duplicate_similarity)
+        if duplicates: console.print(f"[cyan]{duplicates_summary(duplicates)}[/cyan]")
+        results = {}
+
+        def finish_file(file_path: str, result):
+            results[file_path] = result
+            on_done(file_path, result)
+
+        def process_duplicate(file_path: str, duplicate):
+            result = results.get(duplicate.representative)
+            return reuse(file_path, duplicate, None if result is None or failed(result) else result, validate, process)
+
+        map_packed([file_path for file_path in file_paths if file_path not in duplicates], limited(process),
+                   limited(process_batch), concurrency, on_done=finish_file,
+                   small_file_tokens=small_file_tokens, batch_token_budget=batch_token_budget)
+        map_duplicates(duplicates, limited(process_duplicate), concurrency, on_done=finish_file)
+        return results
+
+    def document(file_path: str):
+        try:
+            return doc_gen.document_file(file_path, read_text(file_path), min_confidence, chunk_tokens, debug)[1]
+        except Exception as e:
+            console.print(f"[red]Error processing {file_path}: {str(e)}[/red]")
+            return None
+
+    def document_batch(file_paths: list) -> dict:
+        try:
+            documented = doc_gen.document_small_files([(file_path, read_text(file_path)) for file_path in file_paths],
+                                                      min_confidence, debug)
+            return {file_path: short_doc for file_path, (_, short_doc) in documented.items()}
+        except Exception as e:
+            console.print(f"[red]Error processing batch: {str(e)}[/red]")
+            return {}
+
+    # The analyses get their documentation context from the finished documentation, as in ModGen
+    documentation = {'text': ''}
+    documentation_written = threading.Event()
+
+    with Progress() as progress:
+        doc_task = progress.add_task("[green]Generating documentation for files...", total=len(doc_files))
+        mod_task = progress.add_task("[green]Analyzing Java files...", total=len(mod_files))
+        diag_task = progress.add_task("[green]Generating diagrams...", total=len(diag_files) if per_file_llm else 0)
+
+        def advance(task):
+            return lambda file_path, result: progress.update(task, advance=1)
+
+        def stream_progress(description: str):
+            """A task for a streamed final answer, added when its first token arrives."""
+            task = None
+
+            def on_tokens(tokens: int):
+                nonlocal task
+                if task is None:
+                    task = progress.add_task(f"[green]{description}...", total=max_output_tokens)
+                progress.update(task, completed=tokens, description=f"[green]{description}: {tokens} tokens")
+            return on_tokens
+
+        def finish_documentation():
+            try:
+                with telemetry.stage('per-file documentation'):
+                    short_docs = per_file(doc_files, document, document_batch, lambda doc: doc.strip() != '',
+                                          lambda doc: doc.startswith("// Error documenting"), advance(doc_task))
+                leaves = [(os.path.relpath(path, repo_directory), short_docs[path])
+                          for path in doc_files if short_docs.get(path) is not None]
+                with telemetry.stage('combine documentation'):
+                    combined_doc = doc_gen.combine_short_docs(leaves, fan_in, node_token_budget, concurrency, debug)
+                doc_path = os.path.join(output, doc_file)
+                with telemetry.stage('cleanup'):
+                    with slots:
+                        doc_gen.clean_up_within_budget(combined_doc, node_token_budget, doc_path, max_output_tokens, debug,
+                                                       on_tokens=stream_progress("Cleaning up documentation"))
+                documentation['text'] = read_text(doc_path)
+                console.print(f"[green]Documentation saved to '{doc_path}'[/green]")
+            finally:
+                documentation_written.set()
+
+        def finish_report():
+            analyses = dict(rule_analyses)
+            for file_path in rule_analyses:
+                progress.update(mod_task, advance=1)
+            with telemetry.stage('per-file analysis'):
+                documentation_written.wait()
+                doc_index = DocIndex(documentation['text'], doc_top_k, doc_context_tokens)
+                analyses.update(per_file(
+                    [path for path in mod_files if path not in rule_analyses],
+                    lambda file_path: mod_gen.analyze_java_file(doc_index, file_path, debug, chunk_tokens),
+                    lambda file_paths: mod_gen.analyze_java_files(doc_index, file_paths, debug),
+                    has_suggestions, lambda analysis: analysis.startswith("Error analyzing"), advance(mod_task)))
+            with telemetry.stage('aggregate'):
+                suggestions = mod_gen.aggregate_analyses(((path, analyses[path]) for path in mod_files), similarity, debug)
+            with telemetry.stage('combine report'):
+                with slots:
+                    mod_gen.generate_modernization_report(suggestions, os.path.join(output, modernization_report_file), debug,
+                                                          max_output_tokens, stream_progress("Generating modernization report"))
+
+        def finish_diagram():
+            combined_path = os.path.join(output, combined_diagram_file)
+            with telemetry.stage('diagram'):
+                if per_file_llm:
+                    diagrams = per_file(
+                        diag_files, lambda file_path: diag_gen.generate_file_diagram(file_path, debug, chunk_tokens),
+                        lambda file_paths: diag_gen.generate_file_diagrams(file_paths, debug),
+                        is_valid_mermaid, lambda mermaid: mermaid.startswith("Error generating diagram"), advance(diag_task))
+                    diag_gen.combine_diagrams(((path, diagrams[path]) for path in diag_files), combined_path, debug)
+                else:
+                    with slots:
+                        diag_gen.write_static_diagram(diag_files, combined_path, llm_layout, debug, max_output_tokens,
+                                                      stream_progress("Refining diagram"))
+                diag_gen.simplify_diagram(combined_path, max_nodes, debug)
+
+        # The three stages run side by side, each combine step starting as soon as its own inputs are complete
+        finishers = {'documentation': finish_documentation, 'modernization report': finish_report, 'diagram': finish_diagram}
+        with ThreadPoolExecutor(max_workers=len(finishers)) as stages:
+            futures = {name: stages.submit(finish) for name, finish in finishers.items()}
+        failed = [name for name, future in futures.items() if future.exception() is not None]
+        for name in failed:
+            console.print(f"[red]Error generating the {name}: {str(futures[name].exception())}[/red]")
+
+    console.print(f"[cyan]{doc_gen.classification_stats.summary()}[/cyan]")
+    if routing_summary(): console.print(f"[cyan]{routing_summary()}[/cyan]")
+    if cache: console.print(f"[cyan]{cache.summary()}[/cyan]")
+    if get_limiter().retries: console.print(f"[cyan]{get_limiter().summary()}[/cyan]")
+
+    run_report_path = os.path.join(output, RUN_REPORT_FILE)
+    telemetry.write_report(run_report_path, 'all-gen', prometheus_file)
+    console.print(f"[cyan]Run report saved to '{run_report_path}'[/cyan]")
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,535 @@
+"""Generate synthetic Java EE projects laid out like the kitchensink quickstart, from 10 to 50,000 files.
+
+    python benchmarks/generate_repo.py /tmp/kitchensink-1000 --files 1000
+
+The project has the kitchensink's shared files (pom.xml, persistence.xml, beans.xml,
+JSF templates, Resources, JaxRsActivator, ...) followed by entities that each come
+with a repository, list producer, registration service, JSF controller, REST service
+and Arquillian test, grouped into packages. The same --files and --seed always
+produce the same project.
+"""
+import os
+import random
+
+import click
+
+PACKAGE = 'org.jboss.as.quickstarts.kitchensink'
+ENTITIES_PER_MODULE = 20
+NAMES = ['Member', 'Account', 'Order', 'Invoice', 'Customer', 'Product', 'Shipment', 'Payment', 'Address', 'Ticket',
+         'Booking', 'Vendor', 'Contract', 'Employee', 'Project', 'Report', 'Session', 'Device', 'Region', 'Coupon']
+FIELD_TYPES = [('String', '@NotNull\n    @Size(min = 1, max = 25)'), ('String', '@NotEmpty\n    @Email'),
+               ('Long', '@NotNull'), ('Integer', '@Digits(fraction = 0, integer = 6)'), ('Boolean', ''),
+               ('String', '@Pattern(regexp = "[^0-9]*", message = "Must not contain numbers")')]
+
+POM = """<?xml version="1.0" encoding="UTF-8"?>
+<project xmlns="http://maven.apache.org/POM/4.0.0">
+    <modelVersion>4.0.0</modelVersion>
+    <groupId>org.jboss.eap.quickstarts</groupId>
+    <artifactId>kitchensink</artifactId>
+    <version>8.0.0.GA</version>
+    <packaging>war</packaging>
+    <dependencies>
+        <dependency><groupId>jakarta.enterprise</groupId><artifactId>jakarta.enterprise.cdi-api</artifactId></dependency>
+        <dependency><groupId>jakarta.persistence</groupId><artifactId>jakarta.persistence-api</artifactId></dependency>
+        <dependency><groupId>jakarta.ws.rs</groupId><artifactId>jakarta.ws.rs-api</artifactId></dependency>
+        <dependency><groupId>jakarta.faces</groupId><artifactId>jakarta.faces-api</artifactId></dependency>
+        <dependency><groupId>org.jboss.arquillian.junit</groupId><artifactId>arquillian-junit-container</artifactId></dependency>
+    </dependencies>
+</project>
+"""
+
+README = """# kitchensink: Assortment of technologies including Arquillian
+
+The kitchensink quickstart is a deployable Maven 3 project that demonstrates CDI, JSF, EJB, JTA,
+Bean Validation and JAX-RS with a member registration database, exposed through JSF pages and REST endpoints.
+
+## Building and Running
+
+Start the server, then run `mvn clean install wildfly:deploy` and open http://localhost:8080/kitchensink/.
+
+## Running the Arquillian Tests
+
+Run `mvn clean verify -Parq-remote` against a running server.
+"""
+
+PERSISTENCE = """<?xml version="1.0" encoding="UTF-8"?>
+<persistence version="3.0" xmlns="https://jakarta.ee/xml/ns/persistence">
+   <persistence-unit name="primary">
+      <jta-data-source>java:jboss/datasources/KitchensinkQuickstartDS</jta-data-source>
+      <properties>
+         <property name="hibernate.hbm2ddl.auto" value="create-drop" />
+         <property name="hibernate.show_sql" value="false" />
+      </properties>
+   </persistence-unit>
+</persistence>
+"""
+
+BEANS = """<?xml version="1.0" encoding="UTF-8"?>
+<beans xmlns="https://jakarta.ee/xml/ns/jakartaee" version="4.0" bean-discovery-mode="all">
+</beans>
+"""
+
+FACES_CONFIG = """<?xml version="1.0" encoding="UTF-8"?>
+<faces-config xmlns="https://jakarta.ee/xml/ns/jakartaee" version="4.0">
+</faces-config>
+"""
+
+TEMPLATE = """<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:h="jakarta.faces.html" xmlns:ui="jakarta.faces.facelets">
+<h:head><title>kitchensink</title></h:head>
+<h:body>
+    <div id="container">
+        <div id="content"><ui:insert name="content">[Template content will be inserted here]</ui:insert></div>
+        <div id="footer"><p>This project was generated from a Maven archetype.</p></div>
+    </div>
+</h:body>
+</html>
+"""
+
+INDEX = """<ui:composition xmlns="http://www.w3.org/1999/xhtml" xmlns:h="jakarta.faces.html"
+    xmlns:ui="jakarta.faces.facelets" template="/WEB-INF/templates/default.xhtml">
+    <ui:define name="content">
+        <h:form id="reg">
+            <h:inputText id="name" value="#{newMember.name}" />
+            <h:commandButton id="register" action="#{memberController.register}" value="Register" />
+        </h:form>
+        <h:dataTable var="_member" value="#{members}" rendered="#{not empty members}">
+            <h:column>#{_member.id}</h:column>
+        </h:dataTable>
+    </ui:define>
+</ui:composition>
+"""
+
+ARQUILLIAN = """<?xml version="1.0" encoding="UTF-8"?>
+<arquillian xmlns="http://jboss.org/schema/arquillian">
+    <defaultProtocol type="Servlet 5.0" />
+    <container qualifier="jboss" default="true"><configuration /></container>
+</arquillian>
+"""
+
+TEST_PERSISTENCE = """<?xml version="1.0" encoding="UTF-8"?>
+<persistence version="3.0" xmlns="https://jakarta.ee/xml/ns/persistence">
+   <persistence-unit name="primary">
+      <jta-data-source>java:jboss/datasources/KitchensinkQuickstartTestDS</jta-data-source>
+      <properties><property name="hibernate.hbm2ddl.auto" value="create-drop" /></properties>
+   </persistence-unit>
+</persistence>
+"""
+
+RESOURCES = f"""package {PACKAGE}.util;
+
+import java.util.logging.Logger;
+
+import jakarta.enterprise.inject.Produces;
+import jakarta.enterprise.inject.spi.InjectionPoint;
+import jakarta.persistence.EntityManager;
+import jakarta.persistence.PersistenceContext;
+
+/**
+ * This class uses CDI to alias Jakarta EE resources, such as the persistence context, to CDI beans
+ */
+public class Resources {{
+    @Produces
+    @PersistenceContext
+    private EntityManager em;
+
+    @Produces
+    public Logger produceLog(InjectionPoint injectionPoint) {{
+        return Logger.getLogger(injectionPoint.getMember().getDeclaringClass().getName());
+    }}
+}}
+"""
+
+ACTIVATOR = f"""package {PACKAGE}.rest;
+
+import jakarta.ws.rs.ApplicationPath;
+import jakarta.ws.rs.core.Application;
+
+/**
+ * A class extending {{@link Application}} and annotated with @ApplicationPath is the Jakarta EE "no XML" approach
+ * to activating JAX-RS.
+ */
+@ApplicationPath("/rest")
+public class JaxRsActivator extends Application {{
+    /* class body intentionally left blank */
+}}
+"""
+
+
+def entity(package: str, name: str, fields: list) -> str:
+    declarations = "\n\n".join(f"    {annotations}\n    private {kind} {field};" if annotations else f"    private {kind} {field};"
+                               for field, kind, annotations in fields)
+    accessors = "\n\n".join(
+        f"    public {kind} get{field[0].upper() + field[1:]}() {{\n        return {field};\n    }}\n\n"
+        f"    public void set{field[0].upper() + field[1:]}({kind} {field}) {{\n        this.{field} = {field};\n    }}"
+        for field, kind, _ in fields)
+    return f"""package {package}.model;
+
+import java.io.Serializable;
+
+import jakarta.persistence.Column;
+import jakarta.persistence.Entity;
+import jakarta.persistence.GeneratedValue;
+import jakarta.persistence.Id;
+import jakarta.persistence.Table;
+import jakarta.validation.constraints.*;
+import jakarta.xml.bind.annotation.XmlRootElement;
+
+@SuppressWarnings("serial")
+@Entity
+@XmlRootElement
+@Table(name = "{name.upper()}")
+public class {name} implements Serializable {{
+
+    @Id
+    @GeneratedValue
+    private Long id;
+
+{declarations}
+
+    public Long getId() {{
+        return id;
+    }}
+
+    public void setId(Long id) {{
+        this.id = id;
+    }}
+
+{accessors}
+}}
+"""
+
+
+def repository(package: str, name: str) -> str:
+    return f"""package {package}.data;
+
+import java.util.List;
+
+import jakarta.enterprise.context.ApplicationScoped;
+import jakarta.inject.Inject;
+import jakarta.persistence.EntityManager;
+import jakarta.persistence.criteria.CriteriaBuilder;
+import jakarta.persistence.criteria.CriteriaQuery;
+import jakarta.persistence.criteria.Root;
+
+import {package}.model.{name};
+
+@ApplicationScoped
+public class {name}Repository {{
+
+    @Inject
+    private EntityManager em;
+
+    public {name} findById(Long id) {{
+        return em.find({name}.class, id);
+    }}
+
+    public List<{name}> findAllOrderedById() {{
+        CriteriaBuilder cb = em.getCriteriaBuilder();
+        CriteriaQuery<{name}> criteria = cb.createQuery({name}.class);
+        Root<{name}> root = criteria.from({name}.class);
+        criteria.select(root).orderBy(cb.asc(root.get("id")));
+        return em.createQuery(criteria).getResultList();
+    }}
+}}
+"""
+
+
+def list_producer(package: str, name: str) -> str:
+    return f"""package {package}.data;
+
+import java.util.List;
+
+import jakarta.annotation.PostConstruct;
+import jakarta.enterprise.context.RequestScoped;
+import jakarta.enterprise.event.Observes;
+import jakarta.enterprise.event.Reception;
+import jakarta.enterprise.inject.Produces;
+import jakarta.inject.Inject;
+import jakarta.inject.Named;
+
+import {package}.model.{name};
+
+@RequestScoped
+public class {name}ListProducer {{
+
+    @Inject
+    private {name}Repository repository;
+
+    private List<{name}> items;
+
+    @Produces
+    @Named
+    public List<{name}> get{name}s() {{
+        return items;
+    }}
+
+    public void onListChanged(@Observes(notifyObserver = Reception.IF_EXISTS) final {name} item) {{
+        retrieveAllOrdered();
+    }}
+
+    @PostConstruct
+    public void retrieveAllOrdered() {{
+        items = repository.findAllOrderedById();
+    }}
+}}
+"""
+
+
+def registration(package: str, name: str) -> str:
+    return f"""package {package}.service;
+
+import java.util.logging.Logger;
+
+import jakarta.ejb.Stateless;
+import jakarta.enterprise.event.Event;
+import jakarta.inject.Inject;
+import jakarta.persistence.EntityManager;
+
+import {package}.model.{name};
+
+// The @Stateless annotation eliminates the need for manual transaction demarcation
+@Stateless
+public class {name}Registration {{
+
+    @Inject
+    private Logger log;
+
+    @Inject
+    private EntityManager em;
+
+    @Inject
+    private Event<{name}> eventSrc;
+
+    public void register({name} item) throws Exception {{
+        log.info("Registering " + item.getId());
+        em.persist(item);
+        eventSrc.fire(item);
+    }}
+}}
+"""
+
+
+def controller(package: str, name: str) -> str:
+    return f"""package {package}.controller;
+
+import jakarta.annotation.PostConstruct;
+import jakarta.enterprise.inject.Model;
+import jakarta.enterprise.inject.Produces;
+import jakarta.faces.application.FacesMessage;
+import jakarta.faces.context.FacesContext;
+import jakarta.inject.Inject;
+import jakarta.inject.Named;
+
+import {package}.model.{name};
+import {package}.service.{name}Registration;
+
+// The @Model stereotype is a convenience mechanism to make this a request-scoped bean that has an
+// EL name
+@Model
+public class {name}Controller {{
+
+    @Inject
+    private FacesContext facesContext;
+
+    @Inject
+    private {name}Registration registration;
+
+    @Produces
+    @Named
+    private {name} new{name};
+
+    @PostConstruct
+    public void init{name}() {{
+        new{name} = new {name}();
+    }}
+
+    public void register() throws Exception {{
+        try {{
+            registration.register(new{name});
+            facesContext.addMessage(null, new FacesMessage(FacesMessage.SEVERITY_INFO, "Registered!", "Registration successful"));
+            init{name}();
+        }} catch (Exception e) {{
+            facesContext.addMessage(null, new FacesMessage(FacesMessage.SEVERITY_ERROR, e.getMessage(), "Registration unsuccessful"));
+        }}
+    }}
+}}
+"""
+
+
+def rest_service(package: str, name: str) -> str:
+    path = name.lower() + 's'
+    return f"""package {package}.rest;
+
+import java.util.List;
+import java.util.logging.Logger;
+
+import jakarta.enterprise.context.RequestScoped;
+import jakarta.inject.Inject;
+import jakarta.ws.rs.*;
+import jakarta.ws.rs.core.MediaType;
+import jakarta.ws.rs.core.Response;
+
+import {package}.data.{name}Repository;
+import {package}.model.{name};
+import {package}.service.{name}Registration;
+
+/**
+ * JAX-RS Example
+ * <p/>
+ * This class produces a RESTful service to read/write the contents of the {path} table.
+ */
+@Path("/{path}")
+@RequestScoped
+public class {name}ResourceRESTService {{
+
+    @Inject
+    private Logger log;
+
+    @Inject
+    private {name}Repository repository;
+
+    @Inject
+    {name}Registration registration;
+
+    @GET
+    @Produces(MediaType.APPLICATION_JSON)
+    public List<{name}> listAll() {{
+        return repository.findAllOrderedById();
+    }}
+
+    @GET
+    @Path("/{{id:[0-9][0-9]*}}")
+    @Produces(MediaType.APPLICATION_JSON)
+    public {name} lookupById(@PathParam("id") long id) {{
+        {name} item = repository.findById(id);
+        if (item == null) {{
+            throw new WebApplicationException(Response.Status.NOT_FOUND);
+        }}
+        return item;
+    }}
+
+    @POST
+    @Consumes(MediaType.APPLICATION_JSON)
+    @Produces(MediaType.APPLICATION_JSON)
+    public Response create({name} item) {{
+        try {{
+            registration.register(item);
+            return Response.ok().build();
+        }} catch (Exception e) {{
+            log.warning(e.getMessage());
+            return Response.status(Response.Status.BAD_REQUEST).build();
+        }}
+    }}
+}}
+"""
+
+
+def test(package: str, name: str) -> str:
+    return f"""package {package}.test;
+
+import static org.junit.Assert.assertNotNull;
+
+import java.util.logging.Logger;
+
+import jakarta.inject.Inject;
+
+import org.jboss.arquillian.container.test.api.Deployment;
+import org.jboss.arquillian.junit.Arquillian;
+import org.jboss.shrinkwrap.api.Archive;
+import org.jboss.shrinkwrap.api.ShrinkWrap;
+import org.jboss.shrinkwrap.api.spec.WebArchive;
+import org.junit.Test;
+import org.junit.runner.RunWith;
+
+import {package}.model.{name};
+import {package}.service.{name}Registration;
+
+@RunWith(Arquillian.class)
+public class {name}RegistrationIT {{
+
+    @Deployment
+    public static Archive<?> createTestArchive() {{
+        return ShrinkWrap.create(WebArchive.class, "test.war")
+            .addClasses({name}.class, {name}Registration.class)
+            .addAsResource("META-INF/test-persistence.xml", "META-INF/persistence.xml");
+    }}
+
+    @Inject
+    {name}Registration registration;
+
+    @Inject
+    Logger log;
+
+    @Test
+    public void testRegister() throws Exception {{
+        {name} item = new {name}();
+        registration.register(item);
+        assertNotNull(item.getId());
+        log.info(item.getId() + " was persisted");
+    }}
+}}
+"""
+
+
+def project_files(seed: int):
+    """Yield (relative path, content) pairs of an endless kitchensink-like project."""
+    java = 'src/main/java/' + PACKAGE.replace('.', '/')
+    yield 'pom.xml', POM
+    yield 'README.md', README
+    yield 'src/main/resources/META-INF/persistence.xml', PERSISTENCE
+    yield f'{java}/util/Resources.java', RESOURCES
+    yield f'{java}/rest/JaxRsActivator.java', ACTIVATOR
+    yield 'src/main/webapp/WEB-INF/beans.xml', BEANS
+    yield 'src/main/webapp/WEB-INF/faces-config.xml', FACES_CONFIG
+    yield 'src/main/webapp/WEB-INF/templates/default.xhtml', TEMPLATE
+    yield 'src/main/webapp/index.xhtml', INDEX
+    yield 'src/test/resources/arquillian.xml', ARQUILLIAN
+    yield 'src/test/resources/META-INF/test-persistence.xml', TEST_PERSISTENCE
+
+    rng = random.Random(seed)
+    index = 0
+    while True:
+        module = index // ENTITIES_PER_MODULE
+        package = PACKAGE if module == 0 else f"{PACKAGE}.module{module}"
+        base = NAMES[index % len(NAMES)]
+        name = base if index < len(NAMES) else f"{base}{index // len(NAMES)}"
+        fields = [(f"field{i}", *rng.choice(FIELD_TYPES)) for i in range(rng.randint(3, 12))]
+        main_dir = 'src/main/java/' + package.replace('.', '/')
+        test_dir = 'src/test/java/' + package.replace('.', '/')
+        yield f'{main_dir}/model/{name}.java', entity(package, name, fields)
+        yield f'{main_dir}/data/{name}Repository.java', repository(package, name)
+        yield f'{main_dir}/data/{name}ListProducer.java', list_producer(package, name)
+        yield f'{main_dir}/service/{name}Registration.java', registration(package, name)
+        yield f'{main_dir}/controller/{name}Controller.java', controller(package, name)
+        yield f'{main_dir}/rest/{name}ResourceRESTService.java', rest_service(package, name)
+        yield f'{test_dir}/test/{name}RegistrationIT.java', test(package, name)
+        index += 1
+
+
+def generate_repo(directory: str, files: int, seed: int = 0) -> int:
+    """Write the first `files` files of the project into `directory`; returns the number written."""
+    written = 0
+    for relative_path, content in project_files(seed):
+        if written == files:
+            break
+        path = os.path.join(directory, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        written += 1
+    return written
+
+
+@click.command()
+@click.argument('directory', type=click.Path())
+@click.option('--files', default=100, show_default=True, help='Number of files to generate')
+@click.option('--seed', default=0, show_default=True, help='Seed for entity fields')
+def main(directory: str, files: int, seed: int):
+    """Generate a synthetic kitchensink-like Java EE project."""
+    written = generate_repo(directory, files, seed)
+    click.echo(f"{written} files written to {directory}")
+
+
+if __name__ == '__main__':
+    main()
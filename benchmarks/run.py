@@ -0,0 +1,159 @@
+"""Time doc-gen, mod-gen, diag-gen and all-gen on a synthetic project against the fake OpenAI server.
+
+    python benchmarks/run.py --files 1000 --latency 0.5 -o bench.json
+    python benchmarks/run.py --files 1000 --latency 0.5 --baseline bench.json
+
+Every scenario runs the tool as a subprocess with the response cache disabled and
+records its wall time, files/sec, peak RSS and the number of chat requests the
+server received. Results are written as JSON; with --baseline the change against
+an earlier result file is printed for each scenario.
+"""
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import click
+from rich.console import Console
+from rich.table import Table
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.generate_repo import generate_repo
+from codernize import fake_openai
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+console = Console(width=200, force_terminal=True)
+
+
+def scenarios(repo: str, output: str) -> dict:
+    """Scenario name -> (script, arguments). Order matters: the rerun and mod-gen use doc-gen's output."""
+    return {
+        'doc-gen': ('doc-gen.py', [repo, '-o', f'{output}/doc-gen', '--full']),
+        'doc-gen-unchanged': ('doc-gen.py', [repo, '-o', f'{output}/doc-gen']),
+        'mod-gen': ('mod-gen.py', [f'{output}/doc-gen/project.md', repo, '-o', f'{output}/mod-gen']),
+        'diag-gen': ('diag-gen.py', [repo, '-o', f'{output}/diag-gen']),
+        'diag-gen-per-file-llm': ('diag-gen.py', [repo, '-o', f'{output}/diag-gen-llm', '--per-file-llm']),
+        'all-gen': ('all-gen.py', [repo, '-o', f'{output}/all-gen']),
+    }
+
+
+def run_scenario(script: str, args: list, env: dict, log_file: str) -> dict:
+    """Run one tool to completion; returns its exit code, wall time and peak RSS."""
+    with open(log_file, 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(ROOT, script), *args, '--no-cache'],
+                                   stdout=log, stderr=subprocess.STDOUT, env=env)
+        # wait4 instead of wait() to get the child's own resource usage
+        _, status, rusage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss_mb = rusage.ru_maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    return {'exit_code': process.returncode, 'wall_seconds': round(wall, 3), 'peak_rss_mb': round(peak_rss_mb, 1)}
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results: dict, baseline: dict):
+    table = Table(title=f"Against baseline {baseline.get('revision', '?')}")
+    for column in ('Scenario', 'Wall (s)', 'Change', 'Files/s', 'Peak RSS (MB)', 'Requests'):
+        table.add_column(column)
+
+    def change(new, old) -> str:
+        if not old:
+            return '-'
+        percent = (new - old) / old * 100
+        color = 'green' if percent <= 0 else 'red'
+        return f"[{color}]{percent:+.1f}%[/{color}]"
+
+    for name, result in results['scenarios'].items():
+        old = baseline.get('scenarios', {}).get(name, {})
+        table.add_row(name, f"{result['wall_seconds']:.2f}", change(result['wall_seconds'], old.get('wall_seconds')),
+                      f"{result['files_per_second']:.1f}",
+                      f"{result['peak_rss_mb']:.0f} ({change(result['peak_rss_mb'], old.get('peak_rss_mb'))})",
+                      f"{result['requests']} ({change(result['requests'], old.get('requests'))})")
+    console.print(table)
+    if baseline.get('parameters') != results['parameters']:
+        console.print("[yellow]Warning: the baseline was run with different parameters[/yellow]")
+
+
+@click.command()
+@click.option('--files', default=200, show_default=True, help='Number of files in the synthetic project')
+@click.option('--seed', default=0, show_default=True, help='Seed of the project generator and the server draws')
+@click.option('--scenario', '-s', 'selected', multiple=True, help='Only run these scenarios (repeatable)')
+@click.option('--work-dir', default='.benchmarks', show_default=True, help='Directory for generated projects and outputs')
+@click.option('--output', '-o', default=None, help='Results file (default: <work-dir>/results-<revision>.json)')
+@click.option('--baseline', default=None, type=click.Path(exists=True), help='Earlier results file to compare against')
+@click.option('--latency', default=0.0, show_default=True, help='Median seconds the server takes to answer')
+@click.option('--latency-sigma', default=0.5, show_default=True, help='Spread of the log-normal latency distribution')
+@click.option('--rpm', default=0, show_default=True, help='Requests per minute allowed per model (0 for no limit)')
+@click.option('--tpm', default=0, show_default=True, help='Tokens per minute allowed per model (0 for no limit)')
+@click.option('--fail-rate', default=0.0, show_default=True, help='Share of requests answered with a 429')
+@click.option('--error-rate', default=0.0, show_default=True, help='Share of requests answered with a 500')
+@click.option('--invalid-rate', default=0.0, show_default=True, help='Share of requests answered with a refusal, to exercise model escalation')
+@click.option('--response-tokens', default=400, show_default=True, help='Approximate size of the answers')
+def main(files: int, seed: int, selected: tuple, work_dir: str, output: str, baseline: str, **server_settings):
+    """Benchmark the tools on a synthetic Java EE project."""
+    work_dir = os.path.abspath(work_dir)
+    repo = os.path.join(work_dir, f'repo-{files}-{seed}')
+    if not os.path.exists(os.path.join(repo, 'pom.xml')):
+        console.print(f"Generating a project of {files} files in {repo}")
+        generate_repo(repo, files, seed)
+
+    server = fake_openai.start_server(seed=seed, **server_settings)
+    env = dict(os.environ, OPENAI_API_KEY='fake', OPENAI_BASE_URL=f"http://127.0.0.1:{server.server_address[1]}/v1",
+               CODERNIZE_CACHE_DIR=os.path.join(work_dir, 'cache'))
+
+    outputs = os.path.join(work_dir, 'outputs')
+    all_scenarios = scenarios(repo, outputs)
+    unknown = set(selected) - set(all_scenarios)
+    if unknown:
+        raise click.BadParameter(f"Unknown scenarios: {', '.join(sorted(unknown))}", param_hint='--scenario')
+
+    revision = git_revision()
+    results = {
+        'revision': revision,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'files': files, 'seed': seed, **server_settings},
+        'scenarios': {},
+    }
+    for name, (script, args) in all_scenarios.items():
+        if selected and name not in selected:
+            continue
+        console.print(f"Running [cyan]{name}[/cyan]...")
+        requests_before = fake_openai.served['chat']
+        result = run_scenario(script, args, env, os.path.join(work_dir, f'{name}.log'))
+        result['requests'] = fake_openai.served['chat'] - requests_before
+        result['files_per_second'] = round(files / result['wall_seconds'], 2)
+        results['scenarios'][name] = result
+        if result['exit_code'] != 0:
+            console.print(f"[red]Error: {name} exited with {result['exit_code']}, see {work_dir}/{name}.log[/red]")
+        console.print(f"  {result['wall_seconds']:.2f}s, {result['files_per_second']:.1f} files/s, "
+                      f"{result['peak_rss_mb']:.0f} MB, {result['requests']} requests")
+    server.shutdown()
+
+    output = output or os.path.join(work_dir, f'results-{revision}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    console.print(f"[green]Results saved to {output}[/green]")
+
+    if baseline:
+        with open(baseline, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Shared helpers used by doc-gen, mod-gen and diag-gen."""
@@ -0,0 +1,170 @@
+"""Offline mode: per-file requests are collected into OpenAI Batch API jobs instead of being sent one by one."""
+import json
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+COMPLETION_WINDOW = '24h'
+DEFAULT_POLL_INTERVAL = 30.0
+FINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+STATE_FILE = 'state.json'
+RESULTS_FILE = 'results.jsonl'
+
+
+class BatchPending(BaseException):
+    """Raised by `chat` when a request was queued for the next batch.
+
+    It derives from BaseException so that the per-file `except Exception` handlers
+    let it through instead of reporting it as an error.
+    """
+
+
+class BatchQueue:
+    """Requests keyed by stable custom ids (the response cache key), submitted and collected in rounds.
+
+    Everything needed to resume lives in `directory`: the request files, the ids of
+    submitted batches in `state.json` and every collected answer in `results.jsonl`.
+    A rerun first waits for the batches an interrupted run left behind and never
+    submits a request whose answer is already known.
+    """
+
+    def __init__(self, client, directory: str, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 on_status: Optional[Callable] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.client = client
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.on_status = on_status
+        self.queued = {}    # custom id -> request body
+        self.results = {}   # custom id -> {'content': str} or {'error': str}
+        self._lock = threading.Lock()
+
+        state_path = os.path.join(directory, STATE_FILE)
+        self.state = {'batches': []}
+        if os.path.exists(state_path):
+            with open(state_path, 'r', encoding='utf-8') as f:
+                self.state = json.load(f)
+        results_path = os.path.join(directory, RESULTS_FILE)
+        if os.path.exists(results_path):
+            with open(results_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Torn last line of an interrupted run
+                    # Failed requests are tried again by the next run
+                    if 'content' in record:
+                        self.results[record.pop('custom_id')] = record
+
+    def complete(self, custom_id: str, body: dict) -> str:
+        """Return the collected answer for a request, or queue it and raise BatchPending."""
+        with self._lock:
+            result = self.results.get(custom_id)
+            if result is None:
+                self.queued[custom_id] = body
+                raise BatchPending(custom_id)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        return result['content']
+
+    def submit(self):
+        """Upload the queued requests as one JSONL file and create a batch for it."""
+        with self._lock:
+            queued, self.queued = self.queued, {}
+        if not queued:
+            return
+        requests_path = os.path.join(self.directory, f"requests-{len(self.state['batches']) + 1}.jsonl")
+        with open(requests_path, 'w', encoding='utf-8') as f:
+            for custom_id, body in queued.items():
+                f.write(json.dumps({'custom_id': custom_id, 'method': 'POST', 'url': BATCH_ENDPOINT, 'body': body}) + '\n')
+
+        with open(requests_path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose='batch')
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=COMPLETION_WINDOW)
+        self.state['batches'].append({'id': batch.id, 'requests': os.path.basename(requests_path), 'collected': False})
+        self._save_state()
+        if self.on_status: self.on_status(batch.id, batch.status, f"{len(queued)} requests")
+
+    def wait(self):
+        """Poll every submitted batch that has not been collected yet and store its answers."""
+        for entry in self.state['batches']:
+            if entry['collected']:
+                continue
+            batch = self.client.batches.retrieve(entry['id'])
+            while batch.status not in FINAL_STATUSES:
+                if self.on_status: self.on_status(batch.id, batch.status, _completed(batch))
+                time.sleep(self.poll_interval)
+                batch = self.client.batches.retrieve(entry['id'])
+            if self.on_status: self.on_status(batch.id, batch.status, _completed(batch))
+
+            records = {}
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    for line in self.client.files.content(file_id).text.splitlines():
+                        if line.strip():
+                            custom_id, record = _parse_output_line(json.loads(line))
+                            records[custom_id] = record
+            # Requests the batch never answered (failed or expired batch) are reported as errors
+            with open(os.path.join(self.directory, entry['requests']), 'r', encoding='utf-8') as f:
+                for line in f:
+                    records.setdefault(json.loads(line)['custom_id'], {'error': f"Batch {batch.id} {batch.status}"})
+            self._record(records)
+            entry['collected'] = True
+            self._save_state()
+
+    def run(self, items: list, fn: Callable, on_done: Optional[Callable] = None) -> list:
+        """Call `fn(item)` for every item, submitting the requests it queued between rounds.
+
+        Items whose requests depend on earlier answers (a category before the doc,
+        several chunks) simply take one round per step. `on_done(item, result)` is
+        called once per item.
+        """
+        self.wait()
+        results = {}
+        pending = list(items)
+        while pending:
+            waiting = []
+            for item in pending:
+                try:
+                    results[item] = fn(item)
+                except BatchPending:
+                    waiting.append(item)
+                    continue
+                if on_done: on_done(item, results[item])
+            if waiting:
+                self.submit()
+                self.wait()
+            pending = waiting
+        return [results[item] for item in items]
+
+    def _record(self, records: dict):
+        with open(os.path.join(self.directory, RESULTS_FILE), 'a', encoding='utf-8') as f:
+            for custom_id, record in records.items():
+                f.write(json.dumps({'custom_id': custom_id, **record}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        with self._lock:
+            self.results.update(records)
+
+    def _save_state(self):
+        path = os.path.join(self.directory, STATE_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+
+def _completed(batch) -> str:
+    counts = batch.request_counts
+    return f"{counts.completed + counts.failed}/{counts.total}" if counts else ''
+
+
+def _parse_output_line(line: dict) -> tuple:
+    response = line.get('response') or {}
+    body = response.get('body') or {}
+    if line.get('error') or response.get('status_code') != 200:
+        error = line.get('error') or body.get('error') or {}
+        return line['custom_id'], {'error': error.get('message', str(error)) if isinstance(error, dict) else str(error)}
+    return line['custom_id'], {'content': body['choices'][0]['message']['content'].strip()}
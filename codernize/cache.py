@@ -0,0 +1,117 @@
+"""Persistent, content-addressed cache of OpenAI chat completions."""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'codernize')
+DEFAULT_MAX_MB = 512
+# A hit only rewrites the access time of an entry once it is this old, so warm runs hardly write
+ACCESS_RESOLUTION = 60.0
+
+
+def make_key(model: str, messages: list, temperature: float, response_format: dict = None) -> str:
+    """Hash everything that determines the completion: model, prompts, temperature and output format."""
+    request = {'model': model, 'messages': messages, 'temperature': temperature}
+    if response_format is not None:
+        request['response_format'] = response_format
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """SQLite-backed response store with a size cap and least-recently-used eviction.
+
+    With `refresh` set, lookups always miss but new responses are still stored,
+    which overwrites stale entries.
+    """
+
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024, refresh: bool = False):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            )""")
+        self._db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+        self._db.commit()
+        self._total = self._stored_bytes()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = None if self.refresh else self._db.execute(
+                'SELECT value, accessed FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            now = time.time()
+            if now - row[1] > ACCESS_RESOLUTION:
+                self._db.execute('UPDATE responses SET accessed = ? WHERE key = ?', (now, key))
+                self._db.commit()
+            return row[0]
+
+    def peek(self, key: str) -> Optional[str]:
+        """The stored response, without counting a hit or a miss or touching its eviction order."""
+        if self.refresh:
+            return None
+        with self._lock:
+            row = self._db.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+            return row[0] if row else None
+
+    def put(self, key: str, value: str):
+        size = len(value.encode('utf-8'))
+        with self._lock:
+            replaced = self._db.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._db.execute('INSERT OR REPLACE INTO responses (key, value, size, accessed) VALUES (?, ?, ?, ?)',
+                             (key, value, size, time.time()))
+            self._total += size - (replaced[0] if replaced else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+            self._db.commit()
+
+    def _stored_bytes(self) -> int:
+        return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self):
+        """Delete the least recently used entries until the cache fits `max_bytes` again."""
+        # Other processes may share the file, so the running total is checked against the table first
+        self._total = self._stored_bytes()
+        excess, count = self._total - self.max_bytes, 0
+        for (size,) in self._db.execute('SELECT size FROM responses ORDER BY accessed'):
+            if excess <= 0:
+                break
+            excess -= size
+            count += 1
+        if count:
+            self._db.execute('DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)',
+                             (count,))
+            self._total = self._stored_bytes()
+
+    def summary(self) -> str:
+        return f"Cache: {self.hits} hits, {self.misses} misses"
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def open_cache(no_cache: bool, refresh: bool) -> Optional[ResponseCache]:
+    """Open the shared cache unless disabled. `CODERNIZE_CACHE_DIR`/`CODERNIZE_CACHE_MAX_MB` override the defaults."""
+    if no_cache:
+        return None
+    cache_dir = os.getenv('CODERNIZE_CACHE_DIR', DEFAULT_CACHE_DIR)
+    max_mb = int(os.getenv('CODERNIZE_CACHE_MAX_MB', DEFAULT_MAX_MB))
+    return ResponseCache(os.path.join(cache_dir, 'responses.sqlite'), max_mb * 1024 * 1024, refresh)
@@ -0,0 +1,165 @@
+"""Splitting of oversized files into prompt-sized chunks, and skip rules for generated files."""
+import os
+import re
+from pathlib import Path
+from typing import Callable, Optional
+
+from codernize.scanner import is_build_output, read_text
+from codernize.tokens import count_tokens, estimate_tokens
+
+DEFAULT_CHUNK_TOKENS = 8000
+DEFAULT_MAX_FILE_TOKENS = 80000
+
+GENERATED_ANNOTATIONS = re.compile(r'@([\w.]+\.)?(Generated|StaticMetamodel)\b')
+# Only searched in the comments heading a file, so a remark further down does not skip hand-written code
+GENERATED_MARKERS = re.compile(r'DO NOT EDIT|auto-?generated|this file (was|is) generated', re.I)
+HEADER_COMMENTS = re.compile(r'\s*(?:(?://|#)[^\n]*\s*|/\*.*?\*/\s*|<!--.*?-->\s*|<\?xml[^>]*\?>\s*)*', re.S)
+GENERATED_DIRECTORIES = {'generated-sources', 'generated'}
+MINIFIED_NAME = re.compile(r'\.min\.\w+$')
+# Assets that get minified; prose and data files may have long lines of their own
+MINIFIABLE_EXTENSIONS = {'.js', '.css', '.html', '.htm', '.xhtml', '.svg'}
+MAX_LINE_LENGTH = 2000
+MAX_AVERAGE_LINE_LENGTH = 300
+
+STRING_OR_CHAR = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+XML_TAG = re.compile(r'<(/?)([\w:.-]+)[^<>]*?(/?)>')
+XML_COMMENT = re.compile(r'<!--.*?-->|<!\[CDATA\[.*?\]\]>', re.S)
+
+
+def in_build_output(file_path: str, root: str) -> bool:
+    """Whether a directory between `root` and the file holds build output or generated sources."""
+    directory = os.path.dirname(os.path.abspath(file_path))
+    root = os.path.join(os.path.abspath(root), '')
+    while directory.startswith(root):
+        if os.path.basename(directory) in GENERATED_DIRECTORIES or is_build_output(directory):
+            return True
+        directory = os.path.dirname(directory)
+    return False
+
+
+def skip_reason(file_path: str, content: str, max_file_tokens: int = DEFAULT_MAX_FILE_TOKENS,
+                root: Optional[str] = None) -> Optional[str]:
+    """Return why a file should not be sent to the LLM at all, or None to process it.
+
+    Only the directories below `root` (the file's own directory if not given) are checked for build output.
+    """
+    suffix = Path(file_path).suffix
+    if in_build_output(file_path, root if root is not None else os.path.dirname(os.path.abspath(file_path))):
+        return 'inside a build output directory'
+    if suffix not in ('.md', '.adoc') and (GENERATED_ANNOTATIONS.search(content[:2000])
+                                           or GENERATED_MARKERS.search(HEADER_COMMENTS.match(content[:2000]).group())):
+        return 'generated file'
+    if MINIFIED_NAME.search(file_path):
+        return 'minified file'
+    lines = content.splitlines() or ['']
+    if suffix in MINIFIABLE_EXTENSIONS and (max(len(line) for line in lines) > MAX_LINE_LENGTH
+                                            or len(content) / len(lines) > MAX_AVERAGE_LINE_LENGTH):
+        return 'minified file'
+    if estimate_tokens(content) > max_file_tokens and count_tokens(content) > max_file_tokens:
+        return f'larger than {max_file_tokens} tokens'
+    return None
+
+
+def filter_skipped(file_paths: list, max_file_tokens: int, on_skip: Callable, root: Optional[str] = None) -> list:
+    """Drop the files matching a skip rule, reporting each one through `on_skip(path, reason)`."""
+    kept = []
+    for file_path in file_paths:
+        try:
+            reason = skip_reason(file_path, read_text(file_path), max_file_tokens, root)
+        except UnicodeDecodeError:
+            reason = 'not a UTF-8 text file'
+        if reason:
+            on_skip(file_path, reason)
+        else:
+            kept.append(file_path)
+    return kept
+
+
+def chunk_label(file_path: str, index: int, count: int) -> str:
+    """Path shown in the prompt for one chunk, so the model knows it only sees part of the file."""
+    return file_path if count == 1 else f"{file_path} (part {index + 1} of {count})"
+
+
+def _java_depths(lines: list) -> list:
+    """Brace depth after each line, ignoring braces in strings, chars and comments."""
+    depths, depth, in_comment = [], 0, False
+    for line in lines:
+        code = STRING_OR_CHAR.sub('', line)
+        i = 0
+        while i < len(code):
+            if in_comment:
+                end = code.find('*/', i)
+                if end == -1:
+                    break
+                in_comment, i = False, end + 2
+            elif code.startswith('/*', i):
+                in_comment, i = True, i + 2
+            elif code.startswith('//', i):
+                break
+            else:
+                depth += {'{': 1, '}': -1}.get(code[i], 0)
+                i += 1
+        depths.append(depth)
+    return depths
+
+
+def _xml_depths(lines: list) -> list:
+    """Element depth after each line; comments and CDATA are blanked out first."""
+    text = XML_COMMENT.sub(lambda m: re.sub(r'[^\n]', ' ', m.group(0)), '\n'.join(lines))
+    depths, depth = [], 0
+    for line in text.split('\n'):
+        for closing, name, self_closing in XML_TAG.findall(line):
+            if closing:
+                depth -= 1
+            elif not self_closing:
+                depth += 1
+        depths.append(depth)
+    return depths
+
+
+def _pack_segments(segments: list, max_tokens: int) -> list:
+    """Greedily join consecutive segments up to `max_tokens`; oversized segments are cut by lines."""
+    chunks, current, tokens = [], [], 0
+    for segment in segments:
+        size = count_tokens(segment)
+        if size > max_tokens:
+            pieces = [line + '\n' for line in segment.split('\n')]
+            chunks.extend(_pack_segments(pieces, max_tokens) if len(pieces) > 1 else [segment])
+            continue
+        if current and tokens + size > max_tokens:
+            chunks.append(''.join(current))
+            current, tokens = [], 0
+        current.append(segment)
+        tokens += size
+    if current:
+        chunks.append(''.join(current))
+    return chunks
+
+
+def split_content(file_path: str, content: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> list:
+    """Split `content` into chunks of at most `max_tokens`.
+
+    Java is cut at class and member boundaries (brace depth 0 or 1), XML between
+    children of the root element, and everything else at blank lines.
+    """
+    if count_tokens(content) <= max_tokens:
+        return [content]
+
+    lines = content.split('\n')
+    suffix = Path(file_path).suffix
+    if suffix == '.java':
+        boundaries = [depth <= 1 for depth in _java_depths(lines)]
+    elif suffix in ('.xml', '.xhtml', '.html'):
+        boundaries = [depth <= 1 for depth in _xml_depths(lines)]
+    else:
+        boundaries = [line.strip() == '' for line in lines]
+
+    segments, current = [], []
+    for line, boundary in zip(lines, boundaries):
+        current.append(line + '\n')
+        if boundary:
+            segments.append(''.join(current))
+            current = []
+    if current:
+        segments.append(''.join(current))
+    return _pack_segments(segments, max_tokens)
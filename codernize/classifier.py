@@ -0,0 +1,101 @@
+"""Local, rule-based file categorization used before falling back to the LLM."""
+import re
+import threading
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+TEST_PATH = re.compile(r'(^|/)src/test/|(Test|Tests|IT|TestCase)\.java$')
+TEST_IMPORTS = re.compile(r'^import\s+(static\s+)?(org\.junit|org\.testng|org\.mockito|org\.jboss\.arquillian)', re.M)
+ENTITY = re.compile(r'@(Entity|Embeddable|MappedSuperclass|StaticMetamodel)\b')
+ENUM = re.compile(r'^\s*(public\s+)?enum\s+\w+', re.M)
+API = re.compile(r'@(Path|ApplicationPath|RestController|Controller|RequestMapping|WebServlet|WebService)\b')
+PERSISTENCE_NAME = re.compile(r'(Repository|Dao|DAO)\.java$')
+PERSISTENCE_CONTEXT = re.compile(r'@PersistenceContext\b|\bEntityManager\b')
+SECURITY = re.compile(r'^import\s+(javax\.security|jakarta\.security|org\.springframework\.security)|@(RolesAllowed|DeclareRoles|PermitAll|DenyAll)\b', re.M)
+SERVICE = re.compile(r'@(Stateless|Stateful|Service|MessageDriven)\b')
+CONFIGURATION = re.compile(r'@Configuration\b|\bclass\s+Resources\b')
+UTILITY_NAME = re.compile(r'(Exception|Util|Utils|Helper|Helpers|Constants)\.java$')
+
+
+def classify_locally(file_path: str, content: str) -> tuple:
+    """Return (category, confidence) from path rules, annotation/import scanning and the extension.
+
+    A confidence of 0.0 means the rules had nothing to say about the file.
+    """
+    path = Path(file_path).as_posix()
+    name = Path(file_path).name
+    suffix = Path(file_path).suffix
+
+    if TEST_PATH.search(path):
+        return 'Testing', 0.95
+    if suffix in ('.md', '.adoc'):
+        return 'Documentation', 0.95
+    if suffix in ('.properties', '.yml', '.yaml'):
+        return 'Configuration', 0.9
+    if suffix == '.sql':
+        return 'Persistence', 0.85
+    if suffix == '.xml':
+        if name == 'persistence.xml' or name.endswith('-ds.xml') or name == 'orm.xml':
+            return 'Persistence', 0.9
+        return 'Configuration', 0.85
+    if suffix != '.java':
+        return 'Other', 0.0
+
+    if TEST_IMPORTS.search(content):
+        return 'Testing', 0.9
+    if ENTITY.search(content):
+        return 'Data Model', 0.95
+    if API.search(content):
+        return 'API', 0.9
+    if PERSISTENCE_NAME.search(name):
+        return 'Persistence', 0.9
+    if SECURITY.search(content):
+        return 'Security', 0.85
+    if SERVICE.search(content):
+        return 'Business Logic', 0.85
+    if UTILITY_NAME.search(name):
+        return 'Utilities', 0.85
+    if ENUM.search(content):
+        return 'Data Model', 0.8
+    if PERSISTENCE_CONTEXT.search(content):
+        return 'Persistence', 0.7
+    if CONFIGURATION.search(content):
+        return 'Configuration', 0.7
+    return 'Other', 0.0
+
+
+class ClassificationStats:
+    """Thread-safe count of files classified locally versus by the LLM.
+
+    Counted per path, so a file categorized again (a later batch round) is not counted twice.
+    """
+
+    def __init__(self):
+        self.files = {}   # path -> classified locally
+        self.avoided = set()   # paths whose local category replaced a categorize request of their own
+        self._lock = threading.Lock()
+
+    def record(self, path: str, local: bool, call_avoided: Optional[bool] = None):
+        """`call_avoided` defaults to `local`; it is False for files whose request would have been shared anyway."""
+        if call_avoided is None:
+            call_avoided = local
+        with self._lock:
+            self.files[path] = local
+            if call_avoided:
+                self.avoided.add(path)
+            else:
+                self.avoided.discard(path)
+
+    @property
+    def local(self) -> int:
+        return sum(self.files.values())
+
+    @property
+    def llm(self) -> int:
+        return len(self.files) - self.local
+
+    def summary(self) -> str:
+        total = self.local + self.llm
+        return f"Classifier: {self.local} of {total} files classified locally, {len(self.avoided)} API calls avoided"
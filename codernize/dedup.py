@@ -0,0 +1,161 @@
+"""Within-run reuse of per-file results: copies and near-copies of a file are not sent to the model again."""
+import difflib
+import hashlib
+import os
+import re
+from concurrent.futures import Future
+from typing import Callable, NamedTuple, Optional
+
+from codernize.executor import map_ordered
+from codernize.minhash import band_keys, signature, similarity
+from codernize.routing import routed_chat
+from codernize.scanner import read_text
+from codernize.telemetry import call_site
+
+DEFAULT_NEAR_DUPLICATE_SIMILARITY = 0.9
+SHINGLE_TOKENS = 5
+BANDS = 8  # 8 bands of 8 rows: pairs above 0.9 similarity share a band 99% of the time, pairs at 0.5 3%
+MAX_DIFF_RATIO = 0.3  # A diff touching more of the file than this is not worth a diff prompt
+DIFF_CONTEXT_LINES = 2
+TOKEN = re.compile(r'\w+|[^\w\s]')
+
+NEAR_DUPLICATE_PROMPT = """
+You are given the result produced for one file and a unified diff from that file to another, nearly identical file.
+Update the result so that it describes the other file: reflect what the diff changes, keep everything else as it is,
+and refer to the other file's path. Respond with the updated result only, in the same format.
+"""
+
+
+class Duplicate(NamedTuple):
+    representative: str
+    diff: str  # Unified diff from the representative; empty for an exact copy
+
+    @property
+    def exact(self) -> bool:
+        return not self.diff
+
+
+def _shingles(content: str) -> set:
+    tokens = TOKEN.findall(content)
+    return {' '.join(tokens[i:i + SHINGLE_TOKENS]) for i in range(max(1, len(tokens) - SHINGLE_TOKENS + 1))}
+
+
+def _diff(source: str, target: str, source_content: str, target_content: str) -> Optional[str]:
+    """Unified diff between two files, or None if it changes too much of them to be worth it."""
+    source_lines, target_lines = source_content.splitlines(), target_content.splitlines()
+    diff = list(difflib.unified_diff(source_lines, target_lines, source, target, n=DIFF_CONTEXT_LINES, lineterm=''))
+    changed = sum(1 for line in diff[2:] if line[:1] in '+-')
+    if changed > MAX_DIFF_RATIO * max(len(source_lines), len(target_lines)):
+        return None
+    return '\n'.join(diff)
+
+
+def find_duplicates(file_paths: list, threshold: float = DEFAULT_NEAR_DUPLICATE_SIMILARITY,
+                    exact_only: bool = False) -> dict:
+    """Map every file that is a copy or near-copy of an earlier one to its Duplicate.
+
+    Files missing from the result are processed as usual; the first file of each group is
+    its representative. Copies are found by content hash. A near-copy has the extension of
+    its representative, an estimated similarity of their token 5-grams of at least
+    `threshold`, and a diff short enough for a diff prompt. With `exact_only` or a threshold
+    above 1, only copies are grouped.
+    """
+    duplicates = {}
+    first_by_hash = {}
+    buckets = {}  # (band, rows of the signature) -> representatives
+    signatures = {}
+    for file_path in file_paths:
+        content = read_text(file_path)
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        if digest in first_by_hash:
+            duplicates[file_path] = Duplicate(first_by_hash[digest], '')
+            continue
+        first_by_hash[digest] = file_path
+        if exact_only or threshold > 1:
+            continue
+
+        extension = os.path.splitext(file_path)[1]
+        signatures[file_path] = signature(_shingles(content))
+        keys = [(extension, key) for key in band_keys(signatures[file_path], BANDS)]
+        candidates = {candidate for key in keys for candidate in buckets.get(key, ())}
+        scores = {candidate: similarity(signatures[file_path], signatures[candidate]) for candidate in candidates}
+        similar = sorted((candidate for candidate in candidates if scores[candidate] >= threshold), key=scores.get, reverse=True)
+        for candidate in similar:
+            diff = _diff(candidate, file_path, read_text(candidate), content)
+            if diff is not None:
+                duplicates[file_path] = Duplicate(candidate, diff)
+                break
+        else:
+            # Not a near-copy: a representative for the files that follow
+            for key in keys:
+                buckets.setdefault(key, []).append(file_path)
+    return duplicates
+
+
+def rewrite_paths(result: str, source: str, target: str, root: Optional[str] = None) -> str:
+    """The result of `source` with its path, path relative to `root` and file name replaced by those of `target`."""
+    names = [(source, target), (os.path.basename(source), os.path.basename(target))]
+    if root:
+        names.insert(1, (os.path.relpath(source, root), os.path.relpath(target, root)))
+    for old, new in names:
+        if old != new:
+            result = result.replace(old, new)
+    return result
+
+
+@call_site('target')
+def adapt_result(client, result: str, source: str, target: str, diff: str,
+                 validate: Optional[Callable[[str], bool]] = None) -> str:
+    """Ask for the result of `target` given the result of its near-copy `source` and the diff between them."""
+    return routed_chat(client, task='near-duplicate', messages=adapt_messages(result, source, target, diff),
+                       validate=validate, content=diff)
+
+
+def adapt_messages(result: str, source: str, target: str, diff: str) -> list:
+    return [
+        {"role": "system", "content": NEAR_DUPLICATE_PROMPT},
+        {"role": "user", "content": f"Result for {source}:\n{result}\n\nFile path: {target}\n\nDiff:\n{diff}"},
+    ]
+
+
+def reuse_result(client, file_path: str, duplicate: Duplicate, result: str, root: Optional[str] = None,
+                 validate: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+    """The result of a duplicate from its representative's; None if the answer for a near-copy fails `validate`."""
+    if duplicate.exact:
+        return rewrite_paths(result, duplicate.representative, file_path, root)
+    adapted = adapt_result(client, result, duplicate.representative, file_path, duplicate.diff, validate)
+    return adapted if validate is None or validate(adapted) else None
+
+
+def map_duplicates(duplicates: dict, fn: Callable, concurrency: int, on_done: Optional[Callable] = None):
+    """Run `fn(path, duplicate)` for every duplicate once the representatives are done.
+
+    Near-copies go first, so copies of a near-copy find its result.
+    """
+    for exact in (False, True):
+        paths = [file_path for file_path, duplicate in duplicates.items() if duplicate.exact == exact]
+        map_ordered(lambda file_path: fn(file_path, duplicates[file_path]), paths, concurrency, on_done)
+
+
+def reuse_later(pool, representative: Future, fn: Callable) -> Future:
+    """A future for a duplicate: `fn(result of the representative)` runs on `pool` once that result is in."""
+    future = Future()
+
+    def copy(done: Future):
+        if done.exception() is not None:
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    def start(done: Future):
+        if done.exception() is not None:
+            copy(done)
+        else:
+            pool.submit(fn, done.result()).add_done_callback(copy)
+    representative.add_done_callback(start)
+    return future
+
+
+def duplicates_summary(duplicates: dict) -> str:
+    exact = sum(duplicate.exact for duplicate in duplicates.values())
+    return f"Duplicates: {exact} copies and {len(duplicates) - exact} near-copies reuse the result of another file"
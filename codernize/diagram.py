@@ -0,0 +1,269 @@
+"""In-memory dependency graph, Mermaid parsing/rendering and programmatic simplification."""
+import os
+import re
+
+EXTERNAL_GROUP = 'External'
+DEFAULT_MAX_NODES = 30
+
+DIAGRAM_TYPES = {'flowchart', 'graph', 'classDiagram', 'sequenceDiagram', 'erDiagram', 'stateDiagram', 'stateDiagram-v2'}
+FENCE = re.compile(r'^```(?:mermaid)?\s*$|^```\s*$')
+SKIPPED_STATEMENTS = re.compile(r'^(style|classDef|class\s+[\w,]+\s+\w+$|click|linkStyle|direction|accTitle|accDescr|title|note|Note|loop|alt|else|opt|par|and|rect|autonumber|activate|deactivate)\b')
+FLOW_NODE = re.compile(
+    r'([A-Za-z_][\w.-]*)\s*(\[\[.*?\]\]|\[\(.*?\)\]|\(\[.*?\]\)|\(\(.*?\)\)|\[/.*?/\]|\[.*?\]|\(.*?\)|\{\{.*?\}\}|\{.*?\}|>.*?\])?')
+FLOW_EDGE = re.compile(r'\s*(?:<?(?:-{2,}|={2,}|-\.+-)[->ox]?\s*\|([^|]*)\||<?--\s*([^-|>][^>]*?)\s*-{2,}>|<?(?:-{2,}|={2,}|-\.+-)[->ox]?>?)\s*')
+CLASS_RELATION = re.compile(
+    r'^(\w+)\s*(?:"[^"]*"\s*)?(<\|--|\*--|o--|<--|<\.\.|<\|\.\.|--\|>|--\*|--o|-->|\.\.\|>|\.\.>|--|\.\.)\s*(?:"[^"]*"\s*)?(\w+)\s*(?::\s*(.*))?$')
+CLASS_DECLARATION = re.compile(r'^class\s+(\w+)(?:~[^~]*~)?(?:\s*\["?([^"\]]*)"?\])?\s*(\{)?')
+CLASS_MEMBER = re.compile(r'^(\w+)\s*:\s*')
+SEQUENCE_PARTICIPANT = re.compile(r'^(?:participant|actor)\s+(\w+)(?:\s+as\s+(.*))?$')
+SEQUENCE_MESSAGE = re.compile(r'^(\w+)\s*(?:--?>>|--?>|--?x|--?\))\s*[+-]?(\w+)\s*:\s*(.*)$')
+ER_RELATION = re.compile(r'^([\w-]+)\s+[|}o{]{1,2}(?:--|\.\.)[|}o{]{1,2}\s+([\w-]+)\s*:\s*(.*)$')
+RELATION_LABELS = {'<|--': 'extends', '--|>': 'extends', '<|..': 'implements', '..|>': 'implements',
+                   '*--': 'composition', '--*': 'composition', 'o--': 'aggregation', '--o': 'aggregation',
+                   '..>': 'uses', '<..': 'uses', '..': 'uses'}
+
+
+def node_id(name: str) -> str:
+    """Mermaid-safe identifier for a node name."""
+    return re.sub(r'\W', '_', name)
+
+
+def normalize(identifier: str) -> str:
+    """Key under which nodes of different per-file diagrams are considered the same."""
+    return re.sub(r'[^a-z0-9]', '', identifier.lower())
+
+
+class Graph:
+    """Nodes grouped into subgraphs, with labeled, de-duplicated edges."""
+
+    def __init__(self):
+        self.nodes = {}   # id -> {'label': str, 'group': str}
+        self.edges = {}   # (source id, target id) -> label
+
+    def add_node(self, name: str, label: str = None, group: str = '') -> str:
+        identifier = node_id(name)
+        node = self.nodes.get(identifier)
+        if node is None:
+            self.nodes[identifier] = {'label': label or name, 'group': group}
+        else:
+            # A later definition may carry the label or group an earlier reference lacked
+            if label and node['label'] == name:
+                node['label'] = label
+            if group and not node['group']:
+                node['group'] = group
+        return identifier
+
+    def add_edge(self, source: str, target: str, label: str = ''):
+        """Add an edge between existing node ids; a labeled edge wins over an unlabeled one."""
+        if source == target:
+            return
+        if not self.edges.get((source, target)):
+            self.edges[(source, target)] = label
+
+    def neighbours(self) -> dict:
+        result = {identifier: set() for identifier in self.nodes}
+        for source, target in self.edges:
+            result[source].add(target)
+            result[target].add(source)
+        return result
+
+    def subgraph(self, keep: set) -> 'Graph':
+        graph = Graph()
+        graph.nodes = {identifier: dict(node) for identifier, node in self.nodes.items() if identifier in keep}
+        graph.edges = {edge: label for edge, label in self.edges.items() if edge[0] in keep and edge[1] in keep}
+        return graph
+
+    def to_mermaid(self, direction: str = 'LR') -> str:
+        lines = [f'flowchart {direction}']
+        groups = {}
+        for identifier, node in self.nodes.items():
+            groups.setdefault(node['group'], []).append(identifier)
+        for group in sorted(groups, key=lambda g: (g == EXTERNAL_GROUP, g)):
+            indent = '  '
+            if group:
+                lines.append(f'  subgraph {node_id(group)}["{group}"]')
+                indent = '    '
+            for identifier in sorted(groups[group]):
+                label = self.nodes[identifier]['label'].replace('"', "'")
+                lines.append(f'{indent}{identifier}["{label}"]')
+            if group:
+                lines.append('  end')
+        for (source, target), label in sorted(self.edges.items()):
+            label = label.replace('|', '/').replace('"', "'")
+            arrow = f'-->|{label}|' if label else '-->'
+            lines.append(f'  {source} {arrow} {target}')
+        return '\n'.join(lines)
+
+
+def _clean_label(shape: str) -> str:
+    label = shape.strip('[](){}>/ ')
+    return label.strip('"').strip() if label else ''
+
+
+def parse_mermaid(text: str, group: str = '') -> Graph:
+    """Parse flowchart, classDiagram, sequenceDiagram and erDiagram syntax into a Graph.
+
+    Nodes inside a `subgraph` get its title as group, all others get `group`.
+    Statements that carry no structure (styles, notes, members) are ignored.
+    """
+    graph = Graph()
+    lines = [line.split('%%')[0].strip() for line in text.strip().splitlines()]
+    lines = [line for line in lines if line and not FENCE.match(line)]
+    if not lines:
+        return graph
+    kind = lines[0].split()[0]
+    groups, in_class_body = [], False
+
+    def current_group() -> str:
+        return groups[-1] if groups else group
+
+    for line in lines[1:]:
+        if in_class_body:
+            in_class_body = not line.startswith('}')
+            continue
+        if line.startswith('subgraph'):
+            title = line[len('subgraph'):].strip()
+            match = FLOW_NODE.fullmatch(title)
+            groups.append(_clean_label(match.group(2)) if match and match.group(2) else title.strip('"'))
+            continue
+        if line == 'end':
+            if groups: groups.pop()
+            continue
+        if SKIPPED_STATEMENTS.match(line) or line.startswith('<<'):
+            continue
+
+        if kind == 'classDiagram':
+            declaration = CLASS_DECLARATION.match(line)
+            if declaration:
+                graph.add_node(declaration.group(1), declaration.group(2), current_group())
+                in_class_body = bool(declaration.group(3)) and not line.endswith('}')
+                continue
+            relation = CLASS_RELATION.match(line)
+            if relation:
+                left, arrow, right, label = relation.groups()
+                left_id = graph.add_node(left, group=current_group())
+                right_id = graph.add_node(right, group=current_group())
+                label = (label or RELATION_LABELS.get(arrow, '')).strip()
+                if arrow.startswith('<') or arrow in ('*--', 'o--'):
+                    graph.add_edge(right_id, left_id, label)
+                else:
+                    graph.add_edge(left_id, right_id, label)
+                continue
+            member = CLASS_MEMBER.match(line)
+            if member:
+                graph.add_node(member.group(1), group=current_group())
+            continue
+
+        if kind == 'sequenceDiagram':
+            participant = SEQUENCE_PARTICIPANT.match(line)
+            if participant:
+                graph.add_node(participant.group(1), participant.group(2), current_group())
+                continue
+            message = SEQUENCE_MESSAGE.match(line)
+            if message:
+                source = graph.add_node(message.group(1), group=current_group())
+                target = graph.add_node(message.group(2), group=current_group())
+                graph.add_edge(source, target, message.group(3).strip()[:40])
+            continue
+
+        if kind == 'erDiagram':
+            relation = ER_RELATION.match(line)
+            if relation:
+                source = graph.add_node(relation.group(1), group=current_group())
+                target = graph.add_node(relation.group(2), group=current_group())
+                graph.add_edge(source, target, relation.group(3).strip().strip('"'))
+            continue
+
+        # flowchart / graph / stateDiagram: node (& node)* (edge node (& node)*)*
+        position, previous = 0, []
+        while position < len(line):
+            current = []
+            while True:
+                match = FLOW_NODE.match(line, position)
+                if not match or match.group(1) in ('end', 'subgraph'):
+                    break
+                current.append(graph.add_node(match.group(1), _clean_label(match.group(2) or '') or None, current_group()))
+                position = match.end()
+                ampersand = re.match(r'\s*&\s*', line[position:])
+                if not ampersand:
+                    break
+                position += ampersand.end()
+            if not current:
+                break
+            for source in previous:
+                for target in current:
+                    graph.add_edge(source, target, edge_label)
+            edge = FLOW_EDGE.match(line, position)
+            if not edge or edge.end() == position:
+                break
+            edge_label = (edge.group(1) or edge.group(2) or '').strip().strip('"')
+            previous, position = current, edge.end()
+    return graph
+
+
+def is_valid_mermaid(text: str, min_nodes: int = 1) -> bool:
+    """Whether `text`, fenced or not, is a diagram of a known type declaring at least `min_nodes` nodes."""
+    lines = [line.split('%%')[0].strip() for line in text.strip().splitlines()]
+    lines = [line for line in lines if line and not FENCE.match(line)]
+    return bool(lines) and lines[0].split()[0] in DIAGRAM_TYPES and len(parse_mermaid(text).nodes) >= min_nodes
+
+
+def merge_graphs(graphs: list) -> Graph:
+    """Merge graphs into one, treating nodes with the same normalized identifier as one node."""
+    merged = Graph()
+    canonical = {}
+    for graph in graphs:
+        mapping = {}
+        for identifier, node in graph.nodes.items():
+            key = normalize(identifier)
+            if key not in canonical:
+                canonical[key] = merged.add_node(identifier, node['label'], node['group'])
+            else:
+                merged.add_node(canonical[key], node['label'], node['group'])
+            mapping[identifier] = canonical[key]
+        for (source, target), label in graph.edges.items():
+            merged.add_edge(mapping[source], mapping[target], label)
+    return merged
+
+
+def package_of(file_path: str) -> str:
+    """Java package implied by a source path (or its directory for non-Java files)."""
+    parts = file_path.replace(os.sep, '/').split('/')[:-1]
+    for marker in ('java', 'resources', 'webapp'):
+        if marker in parts:
+            return '.'.join(parts[len(parts) - parts[::-1].index(marker):]) or marker
+    return '/'.join(parts[-2:])
+
+
+def simplify(graph: Graph, max_nodes: int = DEFAULT_MAX_NODES) -> Graph:
+    """Reduce a graph to at most `max_nodes` nodes, deterministically.
+
+    Unconnected nodes are dropped first, then leaf nodes (a single neighbour) are
+    collapsed into their neighbour, whose label records how many it absorbed,
+    starting with the leaves of the best-connected nodes. If the graph is still too
+    large, only the nodes with the highest degree are kept.
+    """
+    if len(graph.nodes) <= max_nodes:
+        return graph
+
+    neighbours = graph.neighbours()
+    isolated = sorted(identifier for identifier, linked in neighbours.items() if not linked)
+    leaves = [(identifier, next(iter(linked))) for identifier, linked in neighbours.items()
+              if len(linked) == 1 and len(neighbours[next(iter(linked))]) > 1]
+    leaves.sort(key=lambda leaf: (-len(neighbours[leaf[1]]), leaf[1], leaf[0]))
+
+    excess = len(graph.nodes) - max_nodes
+    removed = set(isolated[:excess])
+    absorbed = {}
+    for leaf, parent in leaves[:max(0, excess - len(removed))]:
+        removed.add(leaf)
+        absorbed[parent] = absorbed.get(parent, 0) + 1
+    simplified = graph.subgraph(set(graph.nodes) - removed)
+    for identifier, count in absorbed.items():
+        simplified.nodes[identifier]['label'] += f' (+{count})'
+
+    if len(simplified.nodes) > max_nodes:
+        degrees = simplified.neighbours()
+        ranked = sorted(simplified.nodes, key=lambda identifier: (-len(degrees[identifier]), identifier))
+        simplified = simplified.subgraph(set(ranked[:max_nodes]))
+    return simplified
@@ -0,0 +1,31 @@
+"""Concurrent execution of the per-file LLM calls."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, Optional
+
+DEFAULT_CONCURRENCY = 8
+
+
+def map_ordered(fn: Callable, items: Iterable, concurrency: int = DEFAULT_CONCURRENCY,
+                on_done: Optional[Callable] = None) -> list:
+    """Apply `fn` to every item on a thread pool and return the results in input order.
+
+    `on_done(item, result)` is called from the calling thread as each item finishes,
+    so it is safe to use it to advance a rich Progress bar. Errors are expected to be
+    handled inside `fn`, the same way the scripts handle them per file.
+    """
+    items = list(items)
+    results = [None] * len(items)
+
+    if concurrency <= 1:
+        for i, item in enumerate(items):
+            results[i] = fn(item)
+            if on_done: on_done(item, results[i])
+        return results
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(fn, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            if on_done: on_done(items[i], results[i])
+    return results
@@ -0,0 +1,328 @@
+"""Local stand-in for the OpenAI chat completion, file and batch endpoints, for running the tools without network.
+
+    python -m codernize.fake_openai --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake python doc-gen.py /path/to/project --batch
+
+Answers are canned and derived from the prompt, so only the plumbing is exercised,
+not the quality of the output. Batches complete after `--batch-delay` seconds.
+With `--rpm`/`--tpm` the chat endpoint enforces per-model limits over a sliding
+minute and reports them in `x-ratelimit-*` headers, and `--fail-rate` answers a
+share of the requests with a 429 regardless, to exercise the client's retries.
+Streamed requests are answered with server-sent events, about one token per
+chunk, `--token-latency` seconds apart. For benchmarks, `--latency` adds a log-normally distributed delay, `--error-rate`
+answers with 500s, `--invalid-rate` answers with a refusal that fails every output
+validation, and `--response-tokens` pads answers to a realistic size. These
+draws depend only on `--seed`, the request and its attempt number, so runs repeat.
+"""
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import click
+
+REFUSAL = "Sorry, I can't help with that."
+FILLER = ("The class exposes its operations through injected services and keeps the persistence "
+          "details behind a repository, so callers depend on the interface rather than the storage. ")
+
+_ids = itertools.count(1)
+_lock = threading.Lock()
+files = {}     # id -> {'object': file fields, 'content': bytes}
+batches = {}   # id -> batch fields
+usage = {}     # model -> [(time, tokens)] of the last minute
+attempts = {}  # request hash -> number of times it was received
+served = {'chat': 0, 'batch': 0}
+
+
+def filler(tokens: int) -> str:
+    text = FILLER * (tokens * 4 // len(FILLER) + 1)
+    return text[:tokens * 4].strip()
+
+
+def analysis(path: str, padding: str) -> str:
+    return (f"### Field injection in {path}\n\n**Current Pattern:** CDI `@Inject` field injection\n"
+            f"**Modern Alternative:** Spring constructor injection\n**Migration Steps:** Move the fields to the constructor.{padding}")
+
+
+def fake_completion(body: dict, response_tokens: int = 0) -> str:
+    """A deterministic answer of the shape the prompt asks for, padded to about `response_tokens`."""
+    system = body['messages'][0]['content']
+    user = body['messages'][-1]['content']
+    paths = re.findall(r'^\s*File path: (.*)$', user, re.M)
+    padding = f"\n\n{filler(response_tokens)}" if response_tokens else ''
+    if body.get('response_format'):
+        if '"category"' in system:
+            return json.dumps({path: {'category': 'Other', 'doc': f"# {path}{padding}"} for path in paths})
+        if 'Mermaid' in system:
+            return json.dumps({path: 'flowchart LR\n  A --> B' for path in paths})
+        if 'Current Pattern' in system:
+            return json.dumps({path: analysis(path, padding) for path in paths})
+        return json.dumps({path: f"Summary of {path}{padding}" for path in paths})
+    if 'ONLY the category' in system:
+        return 'Other'
+    if 'nearly identical file' in system:
+        # A perfect model: the result of the copy with the other file's path
+        source, result = re.search(r'^Result for (.*?):\n(.*)\n\nFile path: ', user, re.S).groups()
+        return result.replace(source, paths[-1])
+    if 'Mermaid' in system:
+        return 'flowchart LR\n  A --> B'
+    if 'Current Pattern' in system and paths:
+        return analysis(paths[0], padding)
+    if 'migration roadmap' in system:
+        return (f"# Summary\n\nGenerated by {body['model']}.{padding}\n\n## Migration Roadmap\n\n1. Constructor injection\n\n"
+                "## Benefits and Risks\n\nLess boilerplate; the tests must be ported.")
+    return f"# {paths[0] if paths else 'Summary'}\n\nGenerated by {body['model']}.{padding}"
+
+
+def completion_object(body: dict, response_tokens: int = 0, content: str = None) -> dict:
+    content = fake_completion(body, response_tokens) if content is None else content
+    return {
+        'id': f"chatcmpl-{next(_ids)}", 'object': 'chat.completion', 'created': int(time.time()), 'model': body['model'],
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+        'usage': {'prompt_tokens': len(json.dumps(body['messages'])) // 4, 'completion_tokens': len(content) // 4,
+                  'total_tokens': (len(json.dumps(body['messages'])) + len(content)) // 4},
+    }
+
+
+def store_file(content: bytes, filename: str, purpose: str) -> dict:
+    file_id = f"file-{next(_ids)}"
+    fields = {'id': file_id, 'object': 'file', 'bytes': len(content), 'created_at': int(time.time()),
+              'filename': filename, 'purpose': purpose, 'status': 'processed'}
+    with _lock:
+        files[file_id] = {'object': fields, 'content': content}
+    return fields
+
+
+def process_batch(batch_id: str, delay: float):
+    """Answer every request of the input file, after `delay` seconds of 'in_progress'."""
+    with _lock:
+        batch = batches[batch_id]
+        batch['status'] = 'in_progress'
+        lines = files[batch['input_file_id']]['content'].decode('utf-8').splitlines()
+        batch['request_counts']['total'] = len(lines)
+    time.sleep(delay)
+
+    output = []
+    for line in lines:
+        request = json.loads(line)
+        output.append(json.dumps({
+            'id': f"batch_req_{next(_ids)}", 'custom_id': request['custom_id'], 'error': None,
+            'response': {'status_code': 200, 'request_id': f"req_{next(_ids)}",
+                     'body': completion_object(request['body'], Handler.response_tokens)},
+        }))
+    with _lock:
+        served['batch'] += len(lines)
+    output_file = store_file(('\n'.join(output) + '\n').encode('utf-8'), f"{batch_id}_output.jsonl", 'batch_output')
+    with _lock:
+        batch.update(status='completed', output_file_id=output_file['id'], completed_at=int(time.time()))
+        batch['request_counts']['completed'] = len(lines)
+
+
+def admit(model: str, tokens: int, rpm: int, tpm: int) -> tuple:
+    """Record a request against the sliding-minute limits; returns (admitted, rate limit headers)."""
+    now = time.monotonic()
+    with _lock:
+        window = [(at, used) for at, used in usage.get(model, []) if now - at < 60]
+        requests_left = rpm - len(window) if rpm else None
+        tokens_left = tpm - sum(used for _, used in window) if tpm else None
+        admitted = (requests_left is None or requests_left >= 1) and (tokens_left is None or tokens_left >= tokens)
+        if admitted:
+            window.append((now, tokens))
+            requests_left = requests_left - 1 if rpm else None
+            tokens_left = tokens_left - tokens if tpm else None
+        usage[model] = window
+        reset = 60 - (now - window[0][0]) if window else 0.0
+
+    headers = {}
+    if rpm:
+        headers.update({'x-ratelimit-limit-requests': str(rpm), 'x-ratelimit-remaining-requests': str(max(0, requests_left)),
+                        'x-ratelimit-reset-requests': f"{reset:.3f}s"})
+    if tpm:
+        headers.update({'x-ratelimit-limit-tokens': str(tpm), 'x-ratelimit-remaining-tokens': str(max(0, tokens_left)),
+                        'x-ratelimit-reset-tokens': f"{reset:.3f}s"})
+    if not admitted:
+        headers['retry-after-ms'] = str(int(reset * 1000) + 1)
+    return admitted, headers
+
+
+class Handler(BaseHTTPRequestHandler):
+    batch_delay = 2.0
+    rpm = 0
+    tpm = 0
+    fail_rate = 0.0
+    error_rate = 0.0
+    invalid_rate = 0.0
+    latency = 0.0
+    latency_sigma = 0.5
+    response_tokens = 0
+    token_latency = 0.0
+    seed = 0
+
+    def log_message(self, *args):
+        pass
+
+    def send_json(self, payload: dict, status: int = 200, headers: dict = None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def not_found(self):
+        self.send_json({'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}}, 404)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if self.path.endswith('/chat/completions'):
+            self.complete(json.loads(raw))
+        elif self.path.endswith('/files'):
+            # The SDK uploads with multipart/form-data
+            header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8')
+            form = BytesParser(policy=default).parsebytes(header + raw)
+            fields = {part.get_param('name', header='content-disposition'): part for part in form.iter_parts()}
+            upload = fields['file']
+            self.send_json(store_file(upload.get_payload(decode=True), upload.get_filename() or 'upload.jsonl',
+                                      fields['purpose'].get_content().strip()))
+        elif self.path.endswith('/batches'):
+            request = json.loads(raw)
+            batch_id = f"batch_{next(_ids)}"
+            with _lock:
+                batches[batch_id] = {
+                    'id': batch_id, 'object': 'batch', 'endpoint': request['endpoint'], 'errors': None,
+                    'input_file_id': request['input_file_id'], 'completion_window': request['completion_window'],
+                    'status': 'validating', 'output_file_id': None, 'error_file_id': None,
+                    'created_at': int(time.time()), 'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+                }
+                created = dict(batches[batch_id])
+            threading.Thread(target=process_batch, args=(batch_id, self.batch_delay), daemon=True).start()
+            self.send_json(created)
+        else:
+            self.not_found()
+
+    def complete(self, body: dict):
+        # A retried request gets new draws, the same run repeated gets the same ones
+        request_hash = hashlib.sha256(json.dumps(body, sort_keys=True).encode('utf-8')).hexdigest()
+        with _lock:
+            attempt = attempts[request_hash] = attempts.get(request_hash, 0) + 1
+            served['chat'] += 1
+        draws = random.Random(f"{self.seed}:{request_hash}:{attempt}")
+        if self.latency:
+            time.sleep(draws.lognormvariate(math.log(self.latency), self.latency_sigma))
+        if draws.random() < self.error_rate:
+            self.send_json({'error': {'message': 'The server had an error processing your request', 'type': 'server_error'}}, 500)
+            return
+
+        completion = completion_object(body, self.response_tokens)
+        admitted, headers = admit(body['model'], completion['usage']['total_tokens'], self.rpm, self.tpm)
+        if not admitted or draws.random() < self.fail_rate:
+            headers.setdefault('retry-after-ms', '100')
+            self.send_json({'error': {'message': f"Rate limit reached for {body['model']}", 'type': 'requests',
+                                      'code': 'rate_limit_exceeded'}}, 429, headers)
+            return
+        if draws.random() < self.invalid_rate:
+            completion = completion_object(body, content=REFUSAL)
+        if body.get('stream'):
+            self.stream(body, completion, headers)
+            return
+        self.send_json(completion, headers=headers)
+
+    def stream(self, body: dict, completion: dict, headers: dict):
+        content = completion['choices'][0]['message']['content']
+        finish_reason = 'stop'
+        max_tokens = body.get('max_completion_tokens') or body.get('max_tokens')
+        if max_tokens and len(content) > max_tokens * 4:
+            content, finish_reason = content[:max_tokens * 4], 'length'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+
+        def event(choices: list, usage: dict = None):
+            chunk = {'id': completion['id'], 'object': 'chat.completion.chunk', 'created': completion['created'],
+                     'model': completion['model'], 'choices': choices, 'usage': usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+
+        event([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+        for start in range(0, len(content), 4):
+            if self.token_latency:
+                time.sleep(self.token_latency)
+            event([{'index': 0, 'delta': {'content': content[start:start + 4]}, 'finish_reason': None}])
+        event([{'index': 0, 'delta': {}, 'finish_reason': finish_reason}])
+        if (body.get('stream_options') or {}).get('include_usage'):
+            usage = dict(completion['usage'], completion_tokens=len(content) // 4)
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+            event([], usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+    def do_GET(self):
+        match = re.search(r'/batches/([\w-]+)$', self.path)
+        if match and match.group(1) in batches:
+            with _lock:
+                self.send_json(batches[match.group(1)])
+            return
+        match = re.search(r'/files/([\w-]+)/content$', self.path)
+        if match and match.group(1) in files:
+            content = files[match.group(1)]['content']
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        self.not_found()
+
+
+def configure(**settings):
+    """Override Handler attributes (latency, rpm, ...) by name."""
+    for name, value in settings.items():
+        if not hasattr(Handler, name):
+            raise ValueError(f"Unknown fake server setting: {name}")
+        setattr(Handler, name, value)
+
+
+def start_server(host: str = '127.0.0.1', port: int = 0, **settings) -> ThreadingHTTPServer:
+    """Serve in a background thread; port 0 picks a free port, see `server.server_address`."""
+    configure(**settings)
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1', show_default=True)
+@click.option('--port', default=8765, show_default=True)
+@click.option('--batch-delay', default=2.0, show_default=True, help='Seconds before a batch completes')
+@click.option('--rpm', default=0, show_default=True, help='Requests per minute allowed per model (0 for no limit)')
+@click.option('--tpm', default=0, show_default=True, help='Tokens per minute allowed per model (0 for no limit)')
+@click.option('--fail-rate', default=0.0, show_default=True, help='Share of chat requests answered with a 429 at random')
+@click.option('--error-rate', default=0.0, show_default=True, help='Share of chat requests answered with a 500 at random')
+@click.option('--latency', default=0.0, show_default=True, help='Median seconds before a chat request is answered')
+@click.option('--latency-sigma', default=0.5, show_default=True, help='Spread of the log-normal latency distribution')
+@click.option('--invalid-rate', default=0.0, show_default=True, help='Share of chat requests answered with a refusal at random')
+@click.option('--response-tokens', default=0, show_default=True, help='Pad answers to about this many tokens (0 keeps them minimal)')
+@click.option('--token-latency', default=0.0, show_default=True, help='Seconds between the chunks of a streamed answer')
+@click.option('--seed', default=0, show_default=True, help='Seed of the random latency and error draws')
+def main(host: str, port: int, **settings):
+    """Serve a fake OpenAI API for local runs."""
+    configure(**settings)
+    click.echo(f"Fake OpenAI API on http://{host}:{port}/v1")
+    ThreadingHTTPServer((host, port), Handler).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
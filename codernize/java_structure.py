@@ -0,0 +1,225 @@
+"""Deterministic extraction of Java classes, dependencies and persistence wiring."""
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+from typing import NamedTuple
+
+from codernize.diagram import EXTERNAL_GROUP, Graph
+
+COMMENTS_AND_STRINGS = re.compile(r'//[^\n]*|/\*.*?\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'', re.S)
+PACKAGE = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.M)
+IMPORT = re.compile(r'^\s*import\s+(static\s+)?([\w.]+(?:\.\*)?)\s*;', re.M)
+TYPE_DECLARATION = re.compile(r'\b(class|interface|enum|record)\s+([A-Z]\w*)([^{;]*)\{')
+ANNOTATION = re.compile(r'@(\w+)(\s*\([^)]*\))?')
+TYPE_NAME = re.compile(r'\b[A-Z]\w*')
+FIELD = re.compile(r'([\w.<>\[\]?,\s]+?)\s+(\w+)\s*(?:=.*)?$', re.S)
+MODIFIERS = re.compile(r'\b(public|protected|private|static|final|transient|volatile|abstract|synchronized|default)\b')
+UNIT_NAME = re.compile(r'unitName\s*=\s*"([^"]*)"')
+
+INJECTION_ANNOTATIONS = {'Inject', 'EJB', 'Autowired', 'Resource'}
+RELATIONSHIP_ANNOTATIONS = {'OneToMany', 'ManyToOne', 'OneToOne', 'ManyToMany', 'ElementCollection'}
+STEREOTYPES = ['Entity', 'Embeddable', 'Stateless', 'Stateful', 'Singleton', 'MessageDriven', 'Path',
+               'ApplicationPath', 'RestController', 'Controller', 'Service', 'Repository', 'Named', 'Model',
+               'ApplicationScoped', 'RequestScoped', 'SessionScoped', 'WebServlet']
+
+
+class Member(NamedTuple):
+    annotations: list
+    types: list        # type names referenced by the member (field type or injected parameters)
+    unit_name: str
+
+
+class JavaType(NamedTuple):
+    package: str
+    name: str
+    kind: str
+    annotations: list
+    supertypes: list   # (type name, 'extends' | 'implements')
+    members: list
+    imports: list
+
+    @property
+    def qualified_name(self) -> str:
+        return f'{self.package}.{self.name}' if self.package else self.name
+
+
+def _strip(content: str) -> str:
+    """Blank out comments, and braces and semicolons inside literals, so they do not affect parsing."""
+    def replace(match):
+        text = match.group(0)
+        return re.sub(r'[{};()]', ' ', text) if text[0] in '"\'' else ' '
+    return COMMENTS_AND_STRINGS.sub(replace, content)
+
+
+def _class_members(body: str) -> list:
+    """Split a class body into its depth-0 members: (text before ';' or '{', is_block)."""
+    members, depth, start = [], 0, 0
+    for i, char in enumerate(body):
+        if char == '{':
+            if depth == 0:
+                members.append((body[start:i], True))
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                start = i + 1
+        elif char == ';' and depth == 0:
+            members.append((body[start:i], False))
+            start = i + 1
+    return members
+
+
+def _parse_member(text: str, is_block: bool) -> Member:
+    annotations = [name for name, _ in ANNOTATION.findall(text)]
+    unit = UNIT_NAME.search(text)
+    declaration = MODIFIERS.sub(' ', ANNOTATION.sub(' ', text)).strip()
+    if is_block:
+        # Methods and constructors only matter when their parameters are injected
+        if not INJECTION_ANNOTATIONS & set(annotations) or '(' not in declaration:
+            return Member(annotations, [], '')
+        parameters = declaration[declaration.index('(') + 1:declaration.rfind(')')]
+        types = [t for parameter in parameters.split(',') for t in TYPE_NAME.findall(parameter.strip().rsplit(' ', 1)[0])]
+        return Member(annotations, types, '')
+    field = FIELD.match(declaration.split('=', 1)[0].strip())
+    types = TYPE_NAME.findall(field.group(1)) if field else []
+    return Member(annotations, types, unit.group(1) if unit else '')
+
+
+def _raw_types(header: str) -> str:
+    """Drop type parameters and generic arguments, innermost first, so their bounds are not taken for supertypes."""
+    while True:
+        raw = re.sub(r'<[^<>]*>', '', header)
+        if raw == header:
+            return raw
+        header = raw
+
+
+def parse_java(content: str) -> list:
+    """Return the top-level types declared in a Java source file."""
+    code = _strip(content)
+    package = PACKAGE.search(code)
+    package = package.group(1) if package else ''
+    imports = [name for static, name in IMPORT.findall(code) if not static]
+    types = []
+    for match in TYPE_DECLARATION.finditer(code):
+        prefix = code[:match.start()]
+        if prefix.count('{') != prefix.count('}'):
+            continue  # nested type
+        header_start = max(prefix.rfind(';'), prefix.rfind('}')) + 1
+        annotations = [name for name, _ in ANNOTATION.findall(prefix[header_start:])]
+        supertypes = []
+        for keyword in ('extends', 'implements'):
+            clause = re.search(rf'\b{keyword}\s+(.*?)(?=\bimplements\b|\bpermits\b|$)', _raw_types(match.group(3)), re.S)
+            if clause:
+                supertypes += [(name.strip().split('.')[-1], keyword) for name in clause.group(1).split(',') if name.strip()]
+        depth, end = 0, len(code)
+        for i in range(match.end() - 1, len(code)):
+            depth += {'{': 1, '}': -1}.get(code[i], 0)
+            if depth == 0:
+                end = i
+                break
+        members = [_parse_member(text, is_block) for text, is_block in _class_members(code[match.end():end])]
+        types.append(JavaType(package, match.group(2), match.group(1), annotations, supertypes, members, imports))
+    return types
+
+
+def parse_persistence_xml(content: str) -> list:
+    """(unit name, data source JNDI name) for every persistence unit."""
+    root = ElementTree.fromstring(content)
+    units = []
+    for unit in root.iter():
+        if unit.tag.split('}')[-1] != 'persistence-unit':
+            continue
+        data_source = ''
+        for child in unit:
+            if child.tag.split('}')[-1] in ('jta-data-source', 'non-jta-data-source') and child.text:
+                data_source = child.text.strip()
+        units.append((unit.get('name', 'default'), data_source))
+    return units
+
+
+def parse_datasource_xml(content: str) -> list:
+    """(JNDI name, connection URL) for every data source in a *-ds.xml file."""
+    root = ElementTree.fromstring(content)
+    sources = []
+    for element in root.iter():
+        if element.tag.split('}')[-1] not in ('datasource', 'xa-datasource'):
+            continue
+        url = next((child.text.strip() for child in element.iter()
+                    if child.tag.split('}')[-1] == 'connection-url' and child.text), '')
+        sources.append((element.get('jndi-name', element.get('pool-name', 'datasource')), url))
+    return sources
+
+
+def build_graph(files: dict) -> Graph:
+    """Build the class/package dependency graph of a repository from {path: content}."""
+    types, units, data_sources = [], [], []
+    for path, content in files.items():
+        name = os.path.basename(path)
+        try:
+            if path.endswith('.java'):
+                types += parse_java(content)
+            elif name == 'persistence.xml':
+                units += parse_persistence_xml(content)
+            elif name.endswith('-ds.xml'):
+                data_sources += parse_datasource_xml(content)
+        except (ElementTree.ParseError, ValueError):
+            continue
+
+    graph = Graph()
+    by_qualified_name = {t.qualified_name: t for t in types}
+    ids = {}
+    for t in types:
+        stereotype = next((s for s in STEREOTYPES if s in t.annotations), None)
+        label = f'{t.name} «{stereotype}»' if stereotype else t.name
+        ids[t.qualified_name] = graph.add_node(t.qualified_name, label, t.package or 'default package')
+
+    def resolve(owner: JavaType, simple_name: str):
+        """Qualified name of an internal type referenced from `owner`, or None if it is external."""
+        for imported in owner.imports:
+            if imported.endswith('.' + simple_name) and imported in by_qualified_name:
+                return imported
+        candidates = [f'{owner.package}.{simple_name}' if owner.package else simple_name]
+        candidates += [imported[:-1] + simple_name for imported in owner.imports if imported.endswith('.*')]
+        return next((c for c in candidates if c in by_qualified_name), None)
+
+    def external(simple_name: str) -> str:
+        return graph.add_node('ext.' + simple_name, simple_name, EXTERNAL_GROUP)
+
+    unit_ids = {}
+    for unit, data_source in units:
+        unit_ids[unit] = graph.add_node('pu.' + unit, f'Persistence unit: {unit}', 'Persistence')
+        if data_source:
+            graph.add_edge(unit_ids[unit], graph.add_node('ds.' + data_source, f'Data source: {data_source}', 'Persistence'),
+                           'uses')
+    for jndi_name, url in data_sources:
+        graph.add_node('ds.' + jndi_name, f'Data source: {jndi_name}', 'Persistence')
+
+    for t in types:
+        source = ids[t.qualified_name]
+        for name, keyword in t.supertypes:
+            target = resolve(t, name)
+            if target:
+                graph.add_edge(source, ids[target], keyword)
+            elif keyword == 'extends':
+                # External interfaces (Serializable, ...) would only add noise
+                graph.add_edge(source, external(name), keyword)
+        for member in t.members:
+            annotations = set(member.annotations)
+            if 'PersistenceContext' in annotations or 'PersistenceUnit' in annotations:
+                unit = member.unit_name or (units[0][0] if len(units) == 1 else '')
+                graph.add_edge(source, unit_ids[unit] if unit in unit_ids else external('EntityManager'),
+                               'persistence context')
+                continue
+            relationship = next((a for a in member.annotations if a in RELATIONSHIP_ANNOTATIONS), None)
+            injected = bool(INJECTION_ANNOTATIONS & annotations)
+            for name in member.types:
+                target = resolve(t, name)
+                if target:
+                    graph.add_edge(source, ids[target], relationship or ('injects' if injected else ''))
+                elif injected:
+                    graph.add_edge(source, external(name), 'injects')
+        for imported in t.imports:
+            if imported in by_qualified_name:
+                graph.add_edge(source, ids[imported])
+    return graph
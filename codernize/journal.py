@@ -0,0 +1,93 @@
+"""Append-only journal of per-file results, so long runs survive crashes and can resume."""
+import json
+import os
+import threading
+import time
+from typing import Iterable, Iterator
+
+from codernize.manifest import hash_file_content
+
+DEFAULT_FSYNC_EVERY = 64
+DEFAULT_FSYNC_INTERVAL = 1.0
+
+
+class Journal:
+    """JSONL file with one {path, hash, failed, result} record per processed file.
+
+    Every record is flushed as soon as it is appended and the file is fsynced every
+    `fsync_every` records or `fsync_interval` seconds, whichever comes first. Only the
+    offset of the latest record per path is kept in memory; results are read back
+    from disk, in the caller's order, when the combine steps need them.
+    """
+
+    def __init__(self, path: str, resume: bool = False, fsync_every: int = DEFAULT_FSYNC_EVERY,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.offsets = {}   # path -> byte offset of its latest record
+        self.hashes = {}    # path -> content hash of its latest successful record
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
+
+        self._size = 0
+        if resume and os.path.exists(path):
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Torn last record of a crashed run, overwritten below
+                    self._index(record, self._size)
+                    self._size += len(line)
+        self._file = open(path, 'r+b' if resume and os.path.exists(path) else 'w+b')
+        self._file.truncate(self._size)
+        self._file.seek(self._size)
+
+    def is_done(self, path: str, content: str) -> bool:
+        """True if the journal holds a successful result for this exact file content."""
+        return self.hashes.get(path) == hash_file_content(content)
+
+    def append(self, path: str, content: str, result, failed: bool = False):
+        record = {'path': path, 'hash': hash_file_content(content), 'failed': failed, 'result': result}
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self._index(record, self._size)
+            self._size += len(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every or time.monotonic() - self._synced_at >= self.fsync_interval:
+                self._sync()
+
+    def read(self, paths: Iterable[str]) -> Iterator[tuple]:
+        """Yield (path, result) for each of `paths` that has a record, in the given order."""
+        with self._lock:
+            self._sync()
+        with open(self.path, 'rb') as f:
+            for path in paths:
+                offset = self.offsets.get(path)
+                if offset is None:
+                    continue
+                f.seek(offset)
+                yield path, json.loads(f.readline())['result']
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._file.close()
+
+    def _index(self, record: dict, offset: int):
+        self.offsets[record['path']] = offset
+        if record['failed']:
+            self.hashes.pop(record['path'], None)
+        else:
+            self.hashes[record['path']] = record['hash']
+
+    def _sync(self):
+        if self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._synced_at = time.monotonic()
@@ -0,0 +1,167 @@
+"""Single entry point for the chat completion calls made by the scripts."""
+import threading
+from typing import Callable, Optional
+
+from codernize.batch import BatchQueue
+from codernize.cache import ResponseCache, make_key
+from codernize.output import partial_file
+from codernize.ratelimit import DEFAULT_COMPLETION_TOKENS, RateLimiter
+from codernize.telemetry import Call, telemetry
+from codernize.tokens import estimate_tokens
+
+DEFAULT_MAX_OUTPUT_TOKENS = 16000
+
+_cache: Optional[ResponseCache] = None
+_batch: Optional[BatchQueue] = None
+_limiter = RateLimiter.from_env()
+
+
+class OutputTruncatedError(RuntimeError):
+    """The answer reached the output token cap; `content` holds what was received."""
+
+    def __init__(self, content: str, max_tokens: int):
+        super().__init__(f"Answer cut off at the cap of {max_tokens} output tokens")
+        self.content = content
+        self.max_tokens = max_tokens
+
+
+class LazyClient:
+    """Stands in for an OpenAI client, which is only created, and openai only imported, on first use.
+
+    Importing openai takes most of the startup time of the scripts, which `--help`,
+    `--plan` and runs that stop before any request do not need.
+    """
+
+    def __init__(self, **options):
+        self._options = options
+        self._client = None
+        self._lock = threading.Lock()
+
+    def __getattr__(self, name: str):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(**self._options)
+        return getattr(self._client, name)
+
+
+def set_cache(cache: Optional[ResponseCache]):
+    global _cache
+    _cache = cache
+
+
+def set_batch(batch: Optional[BatchQueue]):
+    """Route calls through a BatchQueue (offline mode) until reset with None."""
+    global _batch
+    _batch = batch
+
+
+def set_limiter(limiter: RateLimiter):
+    global _limiter
+    _limiter = limiter
+
+
+def get_limiter() -> RateLimiter:
+    return _limiter
+
+
+def chat(client, model: str, messages: list, temperature: float = 0.3, response_format: dict = None) -> str:
+    """Return the stripped completion text, served from the response cache when possible.
+
+    In batch mode a request without a collected answer is queued and BatchPending is raised.
+    """
+    key = make_key(model, messages, temperature, response_format)
+    if _cache:
+        cached = _cache.get(key)
+        if cached is not None:
+            telemetry.record_cached()
+            return cached
+
+    extra = {'response_format': response_format} if response_format is not None else {}
+    if _batch:
+        content = _batch.complete(key, {'model': model, 'messages': messages, 'temperature': temperature, **extra})
+    else:
+        # Retries are left to the limiter, which knows about every request in flight
+        completions = client.with_options(max_retries=0).chat.completions.with_raw_response
+        estimated_tokens = sum(estimate_tokens(message['content']) for message in messages) + DEFAULT_COMPLETION_TOKENS
+        call = Call(model)
+        try:
+            response = _limiter.call(model, estimated_tokens, lambda: completions.create(
+                model=model, messages=messages, temperature=temperature, **extra), stats=call)
+        except Exception:
+            telemetry.finish(call, failed=True)
+            raise
+        telemetry.finish(call, response.usage)
+        content = response.choices[0].message.content.strip()
+
+    if _cache: _cache.put(key, content)
+    return content
+
+
+def chat_to_file(client, model: str, messages: list, output_file: str, temperature: float = 0.3,
+                 max_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, on_tokens: Optional[Callable[[int], None]] = None) -> str:
+    """Stream the completion into `output_file` as it arrives and return its stripped text.
+
+    The tokens are written to `<output_file>.part`, which replaces `output_file` once the
+    answer is complete. `on_tokens` is called with the number of tokens received so far.
+    An answer longer than `max_tokens` raises OutputTruncatedError and leaves `output_file`
+    untouched, like any other error.
+    """
+    key = make_key(model, messages, temperature, None)
+    content = _cache.get(key) if _cache else None
+    if content is not None:
+        telemetry.record_cached()
+    with partial_file(output_file) as f:
+        if content is None and _batch:
+            content = chat(client, model, messages, temperature)
+        if content is not None:
+            f.write(content)
+            return content
+        content = _stream(client, model, messages, temperature, max_tokens, f, on_tokens)
+
+    if _cache: _cache.put(key, content)
+    return content
+
+
+def _stream(client, model: str, messages: list, temperature: float, max_tokens: int, out, on_tokens) -> str:
+    completions = client.with_options(max_retries=0).chat.completions.with_raw_response
+    estimated_tokens = sum(estimate_tokens(message['content']) for message in messages) + DEFAULT_COMPLETION_TOKENS
+    call = Call(model)
+    parts = []
+    received = 0
+    usage = None
+    truncated = False
+    try:
+        # Only opening the stream is retried; a failure halfway through fails the call
+        stream = _limiter.call(model, estimated_tokens, lambda: completions.create(
+            model=model, messages=messages, temperature=temperature, max_completion_tokens=max_tokens,
+            stream=True, stream_options={'include_usage': True}), stats=call)
+        with stream:
+            for chunk in stream:
+                usage = chunk.usage or usage
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                text = choice.delta.content or ''
+                if not parts:
+                    text = text.lstrip()
+                if text:
+                    out.write(text)
+                    out.flush()
+                    parts.append(text)
+                    # The API sends about one token per chunk
+                    received += 1
+                    if on_tokens: on_tokens(received)
+                if choice.finish_reason == 'length' or received > max_tokens:
+                    truncated = True
+                    break
+    except Exception:
+        telemetry.finish(call, usage, failed=True)
+        raise
+    telemetry.finish(call, usage)
+
+    content = ''.join(parts).strip()
+    if truncated:
+        raise OutputTruncatedError(content, max_tokens)
+    return content
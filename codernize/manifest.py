@@ -0,0 +1,69 @@
+"""File manifest used to make repeated runs incremental."""
+import hashlib
+import json
+import os
+import subprocess
+from typing import Optional
+
+from codernize.scanner import read_text
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def hash_file_content(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def load_manifest(output_dir: str) -> dict:
+    """Return the manifest entries keyed by path relative to the scanned directory."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+
+def save_manifest(output_dir: str, entries: dict):
+    """Write the manifest atomically so an interrupted run never leaves it half-written."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': entries}, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def make_entry(file_path: str, content: str, **fields) -> dict:
+    stat = os.stat(file_path)
+    return {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': hash_file_content(content), **fields}
+
+
+def refresh_stat(entry: dict, file_path: str) -> dict:
+    """Record the current mtime and size of a file whose content is known to be unchanged."""
+    stat = os.stat(file_path)
+    return {**entry, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+
+def is_unchanged(entry: Optional[dict], file_path: str) -> bool:
+    """Cheap stat comparison first, falling back to the content hash when mtime or size moved."""
+    if not entry:
+        return False
+    stat = os.stat(file_path)
+    if stat.st_mtime == entry.get('mtime') and stat.st_size == entry.get('size'):
+        return True
+    return hash_file_content(read_text(file_path)) == entry.get('hash')
+
+
+def git_changed_files(directory: str, base: str) -> set:
+    """Absolute paths of files added, modified or renamed since `base`, according to git."""
+    root = subprocess.run(['git', '-C', directory, 'rev-parse', '--show-toplevel'],
+                          capture_output=True, text=True, check=True).stdout.strip()
+    diff = subprocess.run(['git', '-C', directory, 'diff', '--name-status', base],
+                          capture_output=True, text=True, check=True).stdout
+    changed = set()
+    for line in diff.splitlines():
+        parts = line.split('\t')
+        if parts[0].startswith('D'):
+            continue
+        # Renames and copies list the old and the new path; only the new one matters.
+        changed.add(os.path.abspath(os.path.join(root, parts[-1])))
+    return changed
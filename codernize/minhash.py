@@ -0,0 +1,43 @@
+"""One-permutation MinHash signatures and LSH banding, shared by the near-duplicate detectors."""
+import hashlib
+import operator
+
+NUM_HASHES = 64
+BANDS = 16  # 16 bands of 4 rows: pairs above ~0.5 similarity almost always share a band
+
+
+def signature(shingles: set) -> tuple:
+    """One-permutation MinHash: every shingle is hashed once into one of NUM_HASHES bins.
+
+    Empty bins borrow the minimum of the next filled bin, tagged with the distance, so
+    small sets still get comparable signatures.
+    """
+    bins = [None] * NUM_HASHES
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        index, value = value % NUM_HASHES, value // NUM_HASHES
+        if bins[index] is None or value < bins[index]:
+            bins[index] = value
+    result = [None] * NUM_HASHES
+    borrowed, distance = None, 0
+    for index in reversed(range(2 * NUM_HASHES)):
+        if bins[index % NUM_HASHES] is not None:
+            borrowed, distance = bins[index % NUM_HASHES], 0
+        elif borrowed is not None:
+            distance += 1
+        if index < NUM_HASHES:
+            result[index] = (distance, borrowed)
+    return tuple(result)
+
+
+def similarity(a: tuple, b: tuple) -> float:
+    """Estimated Jaccard similarity of the shingles behind two MinHash signatures."""
+    return sum(map(operator.eq, a, b)) / len(a)
+
+
+def band_keys(signature: tuple, bands: int = BANDS) -> list:
+    """LSH bucket keys; bands take every `bands`-th bin since neighbouring bins of a small set often borrow the same value.
+
+    Fewer bands of more rows only bring together pairs of higher similarity.
+    """
+    return [(band, signature[band::bands]) for band in range(bands)]
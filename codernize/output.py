@@ -0,0 +1,28 @@
+"""Output files that readers never see half-written: text goes to `<file>.part`, which is renamed into place."""
+import os
+from contextlib import contextmanager
+
+PART_SUFFIX = '.part'
+
+
+@contextmanager
+def partial_file(path: str):
+    """Open `<path>.part` for writing; it replaces `path` when the block completes and is removed if it raises.
+
+    Readers that want to start early can follow the `.part` file while it grows.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    part = path + PART_SUFFIX
+    try:
+        with open(part, 'w', encoding='utf-8') as f:
+            yield f
+        os.replace(part, path)
+    except BaseException:
+        if os.path.exists(part):
+            os.remove(part)
+        raise
+
+
+def write_atomically(path: str, text: str):
+    with partial_file(path) as f:
+        f.write(text)
@@ -0,0 +1,111 @@
+"""Packing of small files into multi-file prompts with JSON output keyed by path."""
+import json
+import os
+from typing import Callable, Optional
+
+from codernize.executor import map_ordered
+from codernize.llm import chat
+from codernize.tokens import CHARS_PER_TOKEN
+
+DEFAULT_SMALL_FILE_TOKENS = 400
+DEFAULT_BATCH_TOKEN_BUDGET = 4000
+MAX_FILES_PER_BATCH = 20
+
+BATCH_INSTRUCTIONS = """
+You will receive several files, each introduced by a "File path:" line.
+Handle every file independently, following the instructions above.
+Respond with a single JSON object whose keys are the exact file paths and whose values are {value}.
+"""
+
+
+def pack_small_files(paths: list, small_file_tokens: int = DEFAULT_SMALL_FILE_TOKENS,
+                     batch_token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET) -> tuple:
+    """Bin-pack files below `small_file_tokens` into batches; return (batches, remaining single files).
+
+    File sizes are estimated from bytes on disk so nothing has to be read up front.
+    Batches of one file are returned as singles since packing them would gain nothing.
+    """
+    if small_file_tokens <= 0:
+        return [], list(paths)
+    sizes = {path: os.path.getsize(path) // CHARS_PER_TOKEN + 1 for path in paths}
+    small = sorted((path for path in paths if sizes[path] <= small_file_tokens), key=lambda path: -sizes[path])
+
+    # First-fit decreasing
+    batches, loads = [], []
+    for path in small:
+        for i, batch in enumerate(batches):
+            if loads[i] + sizes[path] <= batch_token_budget and len(batch) < MAX_FILES_PER_BATCH:
+                batch.append(path)
+                loads[i] += sizes[path]
+                break
+        else:
+            batches.append([path])
+            loads.append(sizes[path])
+
+    packed = [batch for batch in batches if len(batch) > 1]
+    in_batches = {path for batch in packed for path in batch}
+    return packed, [path for path in paths if path not in in_batches]
+
+
+def batch_messages(system_prompt: str, value_description: str, files: list, header: str = '') -> list:
+    """The messages of a request for several (path, content) files."""
+    body = "\n\n".join(f"File path: {path}\n\nContent:\n{content}" for path, content in files)
+    return [
+        {"role": "system", "content": system_prompt + BATCH_INSTRUCTIONS.format(value=value_description)},
+        {"role": "user", "content": header + body},
+    ]
+
+
+def complete_batch(client, model: str, system_prompt: str, value_description: str, files: list,
+                   validate: Callable, header: str = '', temperature: float = 0.3) -> dict:
+    """Send several (path, content) files in one request and return {path: value} for valid entries.
+
+    Entries that are missing or rejected by `validate` are left out so the caller can retry
+    those files on their own. A request that fails altogether returns an empty dict.
+    """
+    try:
+        response = chat(
+            client,
+            model=model,
+            messages=batch_messages(system_prompt, value_description, files, header),
+            temperature=temperature,
+            response_format={"type": "json_object"},
+        )
+        parsed = json.loads(response)
+    except Exception:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+    return {path: parsed[path] for path, _ in files if path in parsed and validate(parsed[path])}
+
+
+def map_packed(paths: list, process_single: Callable, process_batch: Callable, concurrency: int,
+               on_done: Optional[Callable] = None, small_file_tokens: int = DEFAULT_SMALL_FILE_TOKENS,
+               batch_token_budget: int = DEFAULT_BATCH_TOKEN_BUDGET) -> list:
+    """Like `map_ordered`, but small files go through `process_batch(paths) -> {path: result}`.
+
+    Files a batch did not return a result for are retried with `process_single`.
+    `on_done(path, result)` is called once per file.
+    """
+    batches, singles = pack_small_files(paths, small_file_tokens, batch_token_budget)
+
+    def run(unit: tuple) -> dict:
+        kind, payload = unit
+        if kind == 'single':
+            return {payload: process_single(payload)}
+        results = process_batch(payload)
+        for path in payload:
+            if path not in results:
+                results[path] = process_single(path)
+        return results
+
+    def unit_done(unit: tuple, results: dict):
+        if on_done:
+            for path, result in results.items():
+                on_done(path, result)
+
+    units = [('batch', batch) for batch in batches] + [('single', path) for path in singles]
+    merged = {}
+    for results in map_ordered(run, units, concurrency, on_done=unit_done):
+        merged.update(results)
+    return [merged[path] for path in paths]
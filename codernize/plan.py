@@ -0,0 +1,125 @@
+"""Dry runs: the requests a run would send, counted locally, with their projected cost and wall time."""
+from typing import NamedTuple, Optional
+
+from codernize.cache import ResponseCache, make_key
+from codernize.routing import estimate_complexity, get_router
+from codernize.telemetry import estimate_cost
+from codernize.tokens import count_tokens, estimate_tokens
+
+# Typical answer sizes of the default prompts, in tokens; answers feed the prompts of later stages
+COMPLETION_TOKENS = {
+    'categorize': 2,
+    'short-doc': 350,
+    'file-diagram': 300,
+    'analysis': 700,
+    'near-duplicate': 350,
+    'combine-docs': 1500,
+    'report': 2500,
+}
+# Latency model of one request: time to the first token, then the answer at a steady rate
+FIRST_TOKEN_SECONDS = 0.6
+OUTPUT_TOKENS_PER_SECOND = 80
+JSON_FORMAT = {"type": "json_object"}
+
+
+class PlannedRequest(NamedTuple):
+    stage: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    cached: bool
+
+
+def stand_in(tokens: int) -> str:
+    """Text of about `tokens` tokens, in place of an answer that is not known before the run."""
+    return ' tok' * tokens
+
+
+def format_duration(seconds: float) -> str:
+    seconds = round(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}h {seconds % 3600 // 60:02d}m"
+    if seconds >= 60:
+        return f"{seconds // 60}m {seconds % 60:02d}s"
+    return f"{seconds}s"
+
+
+class Plan:
+    """Collects the requests of a dry run, stage by stage.
+
+    Requests whose answer is already in `cache` are counted as free, and their cached
+    answer stands in for the real one in later stages. Stages are assumed to run one
+    after the other.
+    """
+
+    def __init__(self, cache: Optional[ResponseCache] = None):
+        self.cache = cache
+        self.stage = 'per-file'
+        self.requests = []
+
+    def begin(self, stage: str):
+        """Add the following requests to `stage`."""
+        self.stage = stage
+
+    def add(self, task: str, messages: list, content: Optional[str] = None, category: Optional[str] = None,
+            model: Optional[str] = None, response_format: Optional[dict] = None,
+            completion_tokens: Optional[int] = None) -> str:
+        """Record the request a run would send for `task` and return a stand-in for its answer.
+
+        Routed requests go to the first tier they fit, as if no answer had to be escalated.
+        """
+        if model is None:
+            text = content if content is not None else messages[-1]['content']
+            tier = get_router().tiers(task, estimate_tokens(text), estimate_complexity(content) if content else 0, category)[0]
+            model = tier.model
+        answer = self.cache.peek(make_key(model, messages, 0.3, response_format)) if self.cache else None
+        if completion_tokens is None:
+            completion_tokens = COMPLETION_TOKENS[task]
+        prompt_tokens = sum(count_tokens(message['content']) for message in messages)
+        self.requests.append(PlannedRequest(self.stage, model, prompt_tokens, completion_tokens, answer is not None))
+        return answer if answer is not None else stand_in(completion_tokens)
+
+    def projection(self, concurrency: int, rpm: Optional[float] = None, tpm: Optional[float] = None) -> dict:
+        """{stage: requests, cached, tokens, cost and seconds} for `concurrency` requests in flight under the rate limits."""
+        stages = {}
+        for request in self.requests:
+            stages.setdefault(request.stage, []).append(request)
+        return {stage: _project(requests, concurrency, rpm, tpm) for stage, requests in stages.items()}
+
+    def summary(self, concurrency: int, rpm: Optional[float] = None, tpm: Optional[float] = None) -> list:
+        """Lines with the totals of the run and of each stage."""
+        stages = self.projection(concurrency, rpm, tpm)
+        total = {key: sum(stage[key] for stage in stages.values())
+                 for key in ('requests', 'cached', 'prompt_tokens', 'completion_tokens', 'cost', 'seconds')}
+        limits = ''.join(f", {value:g} {name}" for name, value in (('RPM', rpm), ('TPM', tpm)) if value)
+        lines = [f"Plan: {total['requests']} requests ({total['cached']} answered by the cache), "
+                 f"{total['prompt_tokens']:,} input tokens, ~{total['completion_tokens']:,} output tokens, "
+                 f"~${total['cost']:.2f}, ~{format_duration(total['seconds'])} at concurrency {concurrency}{limits}"]
+        lines += [f"  {stage}: {projected['requests']} requests ({projected['cached']} cached), "
+                  f"{projected['prompt_tokens']:,} input tokens, ~${projected['cost']:.2f}, ~{format_duration(projected['seconds'])}"
+                  for stage, projected in stages.items()]
+        return lines
+
+
+def _project(requests: list, concurrency: int, rpm: Optional[float], tpm: Optional[float]) -> dict:
+    sent = [request for request in requests if not request.cached]
+    latencies = [FIRST_TOKEN_SECONDS + request.completion_tokens / OUTPUT_TOKENS_PER_SECOND for request in sent]
+    # The stage takes as long as the slowest of its bounds: the pool of requests in flight or a model's budgets
+    seconds = max(sum(latencies) / max(1, concurrency), max(latencies, default=0))
+    by_model = {}
+    for request in sent:
+        by_model.setdefault(request.model, []).append(request)
+    for model_requests in by_model.values():
+        if rpm:
+            seconds = max(seconds, len(model_requests) * 60 / rpm)
+        if tpm:
+            seconds = max(seconds, sum(request.prompt_tokens + request.completion_tokens for request in model_requests) * 60 / tpm)
+    costs = [estimate_cost(request.model, request.prompt_tokens, request.completion_tokens) for request in sent]
+    return {
+        'requests': len(requests),
+        'cached': len(requests) - len(sent),
+        'prompt_tokens': sum(request.prompt_tokens for request in sent),
+        'completion_tokens': sum(request.completion_tokens for request in sent),
+        'cost': sum(cost for cost in costs if cost is not None),
+        'seconds': seconds,
+    }
@@ -0,0 +1,234 @@
+"""Client-side scheduling of OpenAI requests: rate limits, retries and a circuit breaker per model."""
+import os
+import random
+import re
+import threading
+import time
+from typing import Callable, Optional
+
+DEFAULT_HEADROOM = 0.95
+DEFAULT_COMPLETION_TOKENS = 500
+DEFAULT_MAX_RETRIES = 6
+BASE_DELAY = 1.0
+MAX_DELAY = 60.0
+BREAKER_THRESHOLD = 5
+BREAKER_COOLDOWN = 30.0
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a model whose recent requests kept failing."""
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """Seconds in an `x-ratelimit-reset-*` value such as '1s', '6m0s' or '20ms'."""
+    parts = re.findall(r'([\d.]+)(ms|h|m|s)', value or '')
+    if not parts:
+        return None
+    scale = {'h': 3600, 'm': 60, 's': 1, 'ms': 0.001}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+
+class TokenBucket:
+    """Classic token bucket; an unknown capacity (None) never blocks."""
+
+    def __init__(self, capacity: Optional[float] = None, per_seconds: float = 60.0):
+        self.capacity = capacity
+        self.per_seconds = per_seconds
+        self.level = capacity or 0.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / self.per_seconds)
+        self.updated = now
+
+    def acquire(self, amount: float):
+        """Block until `amount` is available, then take it. Amounts above the capacity wait for a full bucket."""
+        while True:
+            with self._lock:
+                self._refill()
+                if not self.capacity:
+                    return
+                needed = min(amount, self.capacity)
+                if self.level >= needed:
+                    self.level -= amount
+                    return
+                wait = (needed - self.level) * self.per_seconds / self.capacity
+            time.sleep(wait)
+
+    def give_back(self, amount: float):
+        with self._lock:
+            self._refill()
+            if self.capacity:
+                self.level = min(self.capacity, self.level + amount)
+
+    def learn(self, limit: Optional[float], remaining: Optional[float], headroom: float):
+        """Adopt the limit reported by the server and never assume more than it says is left."""
+        with self._lock:
+            self._refill()
+            if limit:
+                capacity = limit * headroom
+                if not self.capacity:
+                    self.level = capacity
+                self.capacity = capacity
+            if remaining is not None and self.capacity:
+                self.level = min(self.level, remaining - (1 - headroom) * (limit or self.capacity))
+
+    def drain(self):
+        """Empty the bucket, so every thread pauses after a 429."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, 0.0)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive failures; after `cooldown` seconds one trial request is let through."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.cooldown or self.trial:
+                return False
+            self.trial = True
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class ModelLimits:
+    def __init__(self, rpm: Optional[float], tpm: Optional[float]):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.breaker = CircuitBreaker()
+
+
+class RateLimiter:
+    """Schedules calls under per-model requests- and tokens-per-minute budgets.
+
+    Budgets start from `rpm`/`tpm` (unlimited when None) and follow the
+    `x-ratelimit-*` headers of every response, keeping `headroom` of the reported
+    limits. Rate limits, timeouts, connection and server errors are retried with
+    exponential backoff and full jitter; a model whose requests keep failing is
+    short-circuited for a while.
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None, headroom: float = DEFAULT_HEADROOM,
+                 max_retries: int = DEFAULT_MAX_RETRIES):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.headroom = headroom
+        self.max_retries = max_retries
+        self.models = {}
+        self.retries = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RateLimiter':
+        rpm, tpm = os.getenv('CODERNIZE_RPM'), os.getenv('CODERNIZE_TPM')
+        return cls(float(rpm) if rpm else None, float(tpm) if tpm else None)
+
+    def limits(self, model: str) -> ModelLimits:
+        with self._lock:
+            if model not in self.models:
+                self.models[model] = ModelLimits(self.rpm and self.rpm * self.headroom, self.tpm and self.tpm * self.headroom)
+            return self.models[model]
+
+    def call(self, model: str, estimated_tokens: int, request: Callable, stats=None):
+        """Run `request()`, which returns a raw response (with headers and `.parse()`), and return the parsed result.
+
+        When given, `stats.queue_time` and `stats.retries` are increased by the time spent
+        waiting for the budgets or a backoff, and by the number of retries.
+        """
+        import openai  # Deferred like the client itself, see LazyClient
+        retryable = (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+        limits = self.limits(model)
+        for attempt in range(self.max_retries + 1):
+            if not limits.breaker.allow():
+                raise CircuitOpenError(f"Too many failed requests to {model}, pausing calls for {limits.breaker.cooldown:.0f}s")
+            waiting_since = time.perf_counter()
+            limits.requests.acquire(1)
+            limits.tokens.acquire(estimated_tokens)
+            if stats: stats.queue_time += time.perf_counter() - waiting_since
+            try:
+                raw = request()
+            except retryable as e:
+                if isinstance(e, openai.RateLimitError):
+                    with self._lock: self.rate_limited += 1
+                    limits.requests.drain()
+                    limits.tokens.drain()
+                else:
+                    limits.breaker.failure()
+                headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+                self._learn(limits, headers)
+                if attempt == self.max_retries:
+                    raise
+                with self._lock: self.retries += 1
+                delay = self._backoff(attempt, headers)
+                if stats:
+                    stats.retries += 1
+                    stats.queue_time += delay
+                time.sleep(delay)
+                continue
+            except openai.APIStatusError:
+                # The model answered, the request itself is wrong: not a reason to open the circuit
+                limits.breaker.success()
+                raise
+
+            limits.breaker.success()
+            self._learn(limits, raw.headers)
+            response = raw.parse()
+            usage = getattr(response, 'usage', None)
+            if usage and usage.total_tokens < estimated_tokens:
+                limits.tokens.give_back(estimated_tokens - usage.total_tokens)
+            return response
+
+    def summary(self) -> str:
+        return f"Rate limiter: {self.retries} retries, {self.rate_limited} rate-limited responses"
+
+    def _learn(self, limits: ModelLimits, headers):
+        def number(name: str) -> Optional[float]:
+            value = headers.get(name)
+            try:
+                return float(value) if value is not None else None
+            except ValueError:
+                return None
+        limits.requests.learn(number('x-ratelimit-limit-requests'), number('x-ratelimit-remaining-requests'), self.headroom)
+        limits.tokens.learn(number('x-ratelimit-limit-tokens'), number('x-ratelimit-remaining-tokens'), self.headroom)
+
+    @staticmethod
+    def _backoff(attempt: int, headers) -> float:
+        """Full-jitter exponential backoff, but never shorter than what the server asked for."""
+        delay = random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt))
+        retry_after = headers.get('retry-after-ms')
+        if retry_after:
+            return max(delay, float(retry_after) / 1000)
+        retry_after = headers.get('retry-after')
+        if retry_after:
+            try:
+                return max(delay, float(retry_after))
+            except ValueError:
+                return max(delay, parse_duration(retry_after) or 0)
+        return delay
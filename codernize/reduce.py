@@ -0,0 +1,71 @@
+"""Hierarchical (map-reduce) combination of per-file documents."""
+import os
+from typing import Callable
+
+from codernize.executor import map_ordered
+from codernize.tokens import estimate_tokens
+
+DEFAULT_FAN_IN = 8
+DEFAULT_NODE_TOKEN_BUDGET = 16000
+
+
+def _pack(items: list, fan_in: int, token_budget: int) -> list:
+    """Split consecutive (label, text) items into groups bounded by `fan_in` and `token_budget`.
+
+    A group always takes at least two items when available so every level shrinks.
+    """
+    groups, current, tokens = [], [], 0
+    for label, text in items:
+        size = estimate_tokens(text)
+        if current and (len(current) >= fan_in or (tokens + size > token_budget and len(current) >= 2)):
+            groups.append(current)
+            current, tokens = [], 0
+        current.append((label, text))
+        tokens += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def _common_label(labels: list) -> str:
+    common = os.path.commonpath(labels) if all(labels) else ''
+    return common or '.'
+
+
+def tree_reduce(leaves: list, combine: Callable[[str, list], str], fan_in: int = DEFAULT_FAN_IN,
+                token_budget: int = DEFAULT_NODE_TOKEN_BUDGET, concurrency: int = 1,
+                on_level: Callable = None) -> str:
+    """Reduce (path, text) leaves to one text by combining them bottom-up.
+
+    Leaves are first grouped by their directory, then neighbouring groups are merged
+    level by level until one node is left. `combine(scope, texts)` is called for every
+    node with more than one child; nodes on the same level run in parallel. Since the
+    inputs of an untouched subtree are identical between runs, its combine calls are
+    answered by the response cache.
+    """
+    if not leaves:
+        return ''
+    # Groups of one item would never shrink a level
+    fan_in = max(2, fan_in)
+
+    by_directory = {}
+    for path, text in leaves:
+        by_directory.setdefault(os.path.dirname(path), []).append(text)
+    level = []
+    for directory in sorted(by_directory):
+        level.extend(_pack([(directory, text) for text in by_directory[directory]], fan_in, token_budget))
+
+    depth = 0
+    while True:
+        def reduce_group(group: list) -> tuple:
+            scope = _common_label([label for label, _ in group])
+            if len(group) == 1:
+                return group[0]
+            return scope, combine(scope, [text for _, text in group])
+
+        if on_level: on_level(depth, len(level))
+        nodes = map_ordered(reduce_group, level, concurrency)
+        if len(nodes) == 1:
+            return nodes[0][1]
+        level = _pack(nodes, fan_in, token_budget)
+        depth += 1
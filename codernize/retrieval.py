@@ -0,0 +1,92 @@
+"""Local BM25 index over the sections of a Markdown document."""
+import math
+import re
+from collections import Counter
+from pathlib import Path
+
+from codernize.tokens import count_tokens
+
+DEFAULT_TOP_K = 4
+DEFAULT_CONTEXT_TOKENS = 2000
+
+HEADING = re.compile(r'^#{1,6}\s')
+WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+')
+DECLARATION = re.compile(r'\b(?:class|interface|enum|record|@interface)\s+(\w+)')
+IMPORT = re.compile(r'^\s*import\s+(?:static\s+)?([\w.]+)', re.M)
+ANNOTATION = re.compile(r'@(\w+)')
+STOPWORDS = {'the', 'and', 'for', 'with', 'this', 'that', 'from', 'java', 'javax', 'jakarta', 'org', 'com',
+             'src', 'main', 'public', 'private', 'class', 'import', 'return', 'void', 'new'}
+
+
+def tokenize(text: str) -> list:
+    """Lower-cased words, with camelCase and snake_case identifiers split into their parts."""
+    return [word for word in (w.lower() for w in WORD.findall(text)) if len(word) > 2 and word not in STOPWORDS]
+
+
+def split_sections(document: str) -> list:
+    """Split a Markdown document into sections, each starting at a heading."""
+    sections, current = [], []
+    for line in document.splitlines():
+        if HEADING.match(line) and current:
+            sections.append('\n'.join(current).strip())
+            current = []
+        current.append(line)
+    if current:
+        sections.append('\n'.join(current).strip())
+    return [section for section in sections if section]
+
+
+def file_query(file_path: str, content: str) -> list:
+    """Query terms describing a file: its path, declared types, imports and annotations."""
+    parts = list(Path(file_path).parts[-4:])
+    parts += DECLARATION.findall(content)
+    parts += [name.split('.')[-1] for name in IMPORT.findall(content)]
+    parts += ANNOTATION.findall(content)
+    return tokenize(' '.join(parts))
+
+
+class DocIndex:
+    """BM25 ranking of documentation sections, so each prompt only carries the relevant ones."""
+
+    def __init__(self, document: str, top_k: int = DEFAULT_TOP_K, max_tokens: int = DEFAULT_CONTEXT_TOKENS,
+                 k1: float = 1.5, b: float = 0.75):
+        self.sections = split_sections(document)
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+        self.k1 = k1
+        self.b = b
+        self._terms = [Counter(tokenize(section)) for section in self.sections]
+        self._lengths = [sum(terms.values()) for terms in self._terms]
+        self._average_length = sum(self._lengths) / len(self._lengths) if self._lengths else 0
+        document_frequency = Counter(term for terms in self._terms for term in terms)
+        n = len(self.sections)
+        self._idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in document_frequency.items()}
+
+    def score(self, index: int, query: list) -> float:
+        terms, length = self._terms[index], self._lengths[index]
+        score = 0.0
+        for term in set(query):
+            tf = terms.get(term, 0)
+            if tf:
+                norm = self.k1 * (1 - self.b + self.b * length / (self._average_length or 1))
+                score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return score
+
+    def search(self, query: list) -> list:
+        """Indices of the best matching sections, within `top_k` and a total of `max_tokens`."""
+        ranked = sorted(((self.score(i, query), i) for i in range(len(self.sections))), reverse=True)
+        selected, tokens = [], 0
+        for score, i in ranked:
+            if score <= 0 or len(selected) >= self.top_k:
+                break
+            size = count_tokens(self.sections[i])
+            if tokens + size > self.max_tokens:
+                continue
+            selected.append(i)
+            tokens += size
+        return sorted(selected)
+
+    def context_for(self, file_path: str, content: str) -> str:
+        """The documentation sections relevant to a file, in document order."""
+        selected = self.search(file_query(file_path, content))
+        return "\n\n".join(self.sections[i] for i in selected)
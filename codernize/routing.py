@@ -0,0 +1,170 @@
+"""Model routing: every request starts on the cheapest model fit for it and moves up a tier when its answer fails validation."""
+import json
+import os
+import re
+import threading
+from typing import Callable, NamedTuple, Optional
+
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, chat, chat_to_file
+from codernize.telemetry import telemetry
+from codernize.tokens import estimate_tokens
+
+DEFAULT_MODELS_FILE = 'codernize-models.json'
+
+# Task -> tiers, cheapest first. A tier with limits is skipped for requests above them.
+DEFAULT_TIERS = {
+    'categorize': [{'model': 'gpt-4.1-nano'}, {'model': 'gpt-4.1-mini'}],
+    'short-doc': [{'model': 'gpt-4.1-nano'}, {'model': 'gpt-4.1-mini'}],
+    'file-diagram': [{'model': 'gpt-4.1-nano'}, {'model': 'gpt-4.1-mini'}],
+    'analysis': [{'model': 'gpt-4.1-nano', 'max_tokens': 1500, 'max_complexity': 15}, {'model': 'gpt-4.1-mini'}],
+    'near-duplicate': [{'model': 'gpt-4.1-nano'}, {'model': 'gpt-4.1-mini'}],
+    'combine-docs': [{'model': 'gpt-4o-mini'}, {'model': 'gpt-4.1-mini'}],
+    'cleanup': [{'model': 'gpt-4o-mini'}, {'model': 'gpt-4.1-mini'}],
+    'report': [{'model': 'gpt-4.1-mini'}, {'model': 'gpt-4.1'}],
+    'refine-diagram': [{'model': 'gpt-4.1-mini'}, {'model': 'gpt-4.1'}],
+}
+
+# Branches and loops, a cheap stand-in for cyclomatic complexity
+DECISION = re.compile(r'\b(?:if|for|while|case|catch)\b|&&|\|\|')
+
+
+class ModelsFileError(ValueError):
+    """Raised when the models file is not valid JSON or does not describe tiers; names the file and the bad entry."""
+
+
+class Tier(NamedTuple):
+    model: str
+    max_tokens: Optional[int] = None      # Largest request (file or chunk) this tier starts on
+    max_complexity: Optional[int] = None  # Most branches and loops this tier starts on
+    categories: Optional[tuple] = None    # Only start on files of these categories
+
+    def fits(self, tokens: int, complexity: int, category: Optional[str]) -> bool:
+        return ((self.max_tokens is None or tokens <= self.max_tokens)
+                and (self.max_complexity is None or complexity <= self.max_complexity)
+                and (self.categories is None or category is None or category in self.categories))
+
+
+def estimate_complexity(content: str) -> int:
+    return len(DECISION.findall(content))
+
+
+class Router:
+    """The model tiers of each task, from the built-in defaults overridden by a JSON file."""
+
+    def __init__(self, tasks: dict):
+        self.tasks = {task: [Tier(**{**tier, 'categories': tuple(tier['categories']) if tier.get('categories') else None})
+                             for tier in tiers]
+                      for task, tiers in tasks.items()}
+
+    @classmethod
+    def from_file(cls, path: Optional[str] = None) -> 'Router':
+        """Read `path`, $CODERNIZE_MODELS_FILE or ./codernize-models.json if it exists; tasks not listed keep their defaults."""
+        path = path or os.getenv('CODERNIZE_MODELS_FILE', DEFAULT_MODELS_FILE)
+        tasks = dict(DEFAULT_TIERS)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                try:
+                    overrides = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise ModelsFileError(f"{path} is not valid JSON: {e}") from e
+            _validate(path, overrides)
+            tasks.update(overrides)
+        return cls(tasks)
+
+    def tiers(self, task: str, tokens: int = 0, complexity: int = 0, category: Optional[str] = None) -> list:
+        """The tiers to try in order: from the first one the request fits, the last one always."""
+        tiers = self.tasks[task]
+        for i, tier in enumerate(tiers):
+            if tier.fits(tokens, complexity, category):
+                return tiers[i:]
+        return tiers[-1:]
+
+    def model_for(self, task: str) -> str:
+        """The cheapest model of a task, for packed requests of small files."""
+        return self.tasks[task][0].model
+
+
+def _validate(path: str, tasks):
+    """Raise ModelsFileError unless `tasks` maps known tasks to lists of tier objects."""
+    if not isinstance(tasks, dict):
+        raise ModelsFileError(f"{path} must hold a JSON object of task names to tier lists")
+    for task, tiers in tasks.items():
+        if task not in DEFAULT_TIERS:
+            raise ModelsFileError(f"{path}: unknown task '{task}' (known tasks: {', '.join(DEFAULT_TIERS)})")
+        if not isinstance(tiers, list) or not tiers:
+            raise ModelsFileError(f"{path}: '{task}' must be a non-empty list of tiers")
+        for i, tier in enumerate(tiers):
+            where = f"{path}: {task}[{i}]"
+            if not isinstance(tier, dict):
+                raise ModelsFileError(f"{where} must be an object with a 'model'")
+            for key in tier:
+                if key not in Tier._fields:
+                    raise ModelsFileError(f"{where}: unknown key '{key}' (expected {', '.join(Tier._fields)})")
+            if not isinstance(tier.get('model'), str):
+                raise ModelsFileError(f"{where}: 'model' must be a model name")
+            for key in ('max_tokens', 'max_complexity'):
+                if tier.get(key) is not None and (not isinstance(tier[key], int) or isinstance(tier[key], bool)):
+                    raise ModelsFileError(f"{where}: '{key}' must be a whole number")
+            categories = tier.get('categories')
+            if categories is not None and (not isinstance(categories, list) or not all(isinstance(c, str) for c in categories)):
+                raise ModelsFileError(f"{where}: 'categories' must be a list of category names")
+
+
+# Loaded on first use, so a broken models file does not break importing the scripts (or their --help)
+_router: Optional[Router] = None
+_router_lock = threading.Lock()
+
+
+def set_router(router: Router):
+    global _router
+    _router = router
+
+
+def get_router() -> Router:
+    """The router of this run, read from the models file on first use; raises ModelsFileError if that file is invalid."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = Router.from_file()
+    return _router
+
+
+def _tiers(task: str, messages: list, content: Optional[str], category: Optional[str]) -> list:
+    text = content if content is not None else messages[-1]['content']
+    return get_router().tiers(task, estimate_tokens(text), estimate_complexity(content) if content else 0, category)
+
+
+def routed_chat(client, task: str, messages: list, validate: Optional[Callable[[str], bool]] = None,
+                temperature: float = 0.3, content: Optional[str] = None, category: Optional[str] = None) -> str:
+    """`chat` on the first tier fit for the request, escalating while `validate` rejects the answer.
+
+    `content` is the file (or chunk) the request is about, used to estimate its size and
+    complexity. When every tier fails validation, the last answer is returned.
+    """
+    tiers = _tiers(task, messages, content, category)
+    for i, tier in enumerate(tiers):
+        answer = chat(client, tier.model, messages, temperature)
+        valid = validate is None or validate(answer)
+        if valid or i == len(tiers) - 1:
+            telemetry.record_route(task, tier.model, escalations=i, valid=valid)
+            return answer
+
+
+def routed_chat_to_file(client, task: str, messages: list, output_file: str,
+                        validate: Optional[Callable[[str], bool]] = None, temperature: float = 0.3,
+                        max_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, on_tokens=None) -> str:
+    """`chat_to_file` with escalation; the answer of a stronger tier replaces a rejected one in `output_file`."""
+    tiers = _tiers(task, messages, None, None)
+    for i, tier in enumerate(tiers):
+        answer = chat_to_file(client, tier.model, messages, output_file, temperature, max_tokens, on_tokens)
+        valid = validate is None or validate(answer)
+        if valid or i == len(tiers) - 1:
+            telemetry.record_route(task, tier.model, escalations=i, valid=valid)
+            return answer
+
+
+def routing_summary() -> str:
+    """One line with the escalation rate of each task routed so far; empty if none was."""
+    rates = [f"{task} {stats['escalation_rate']:.0%} of {stats['requests']}" for task, stats in telemetry.routing().items()]
+    return f"Routing: escalated {', '.join(rates)}" if rates else ''
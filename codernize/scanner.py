@@ -0,0 +1,169 @@
+"""Shared repository scanner: one directory walk with ignore rules and parallel reads."""
+import fnmatch
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+IGNORE_FILE = '.codernizeignore'
+ALWAYS_IGNORED = {'.git', '.hg', '.svn', 'node_modules', '.idea', '.gradle', '.mvn', '.venv', 'venv', '__pycache__'}
+# Output directories are only pruned next to the build file that writes them; elsewhere these are package names
+BUILD_OUTPUT_DIRS = {'target', 'build'}
+BUILD_FILES = ('pom.xml', 'build.gradle', 'build.gradle.kts')
+DEFAULT_MAX_FILE_BYTES = 2 * 1024 * 1024
+DEFAULT_READ_WORKERS = 16
+BINARY_SNIFF_BYTES = 8192
+
+
+class FileRecord(NamedTuple):
+    path: str
+    size: int
+    mtime: float
+    hash: str
+    text: str
+
+
+class IgnoreRules:
+    """Subset of .gitignore semantics: globs, `!` negation, trailing `/` for directories, leading `/` anchors."""
+
+    def __init__(self, rules: Optional[list] = None):
+        self.rules = rules or []
+
+    def extended(self, base: str, ignore_file: str) -> 'IgnoreRules':
+        """Rules with the patterns of `ignore_file` (relative to `base`) appended, if it exists."""
+        if not os.path.isfile(ignore_file):
+            return self
+        rules = list(self.rules)
+        with open(ignore_file, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                line = line.rstrip('\n').strip()
+                if not line or line.startswith('#'):
+                    continue
+                negate = line.startswith('!')
+                pattern = line[1:] if negate else line
+                dir_only = pattern.endswith('/')
+                pattern = pattern.rstrip('/')
+                # A leading or middle slash anchors the pattern to `base`, a trailing one does not
+                anchored = '/' in pattern
+                rules.append((base, pattern.lstrip('/'), negate, dir_only, anchored))
+        return IgnoreRules(rules)
+
+    def ignored(self, path: str, is_dir: bool) -> bool:
+        result = False
+        for base, pattern, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            relative = os.path.relpath(path, base).replace(os.sep, '/')
+            if relative.startswith('..'):
+                continue
+            target = relative if anchored else os.path.basename(path)
+            if fnmatch.fnmatchcase(target, pattern) or (anchored and fnmatch.fnmatchcase(target, pattern + '/**')):
+                result = not negate
+        return result
+
+
+class ScanSnapshot:
+    """The decoded files of one scan, shared by every tool that needs them."""
+
+    def __init__(self, directory: str, records: list):
+        self.directory = directory
+        self.records = {record.path: record for record in records}
+
+    def paths(self, extensions: Optional[set] = None) -> list:
+        return [path for path in self.records if extensions is None or os.path.splitext(path)[1] in extensions]
+
+    def filter(self, extensions: set) -> 'ScanSnapshot':
+        return ScanSnapshot(self.directory, [self.records[path] for path in self.paths(extensions)])
+
+    def get(self, path: str) -> Optional[FileRecord]:
+        return self.records.get(path)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+
+def is_build_output(directory: str) -> bool:
+    """Whether `directory` is the `target/` or `build/` directory of a Maven or Gradle module."""
+    parent, name = os.path.split(os.path.normpath(directory))
+    return name in BUILD_OUTPUT_DIRS and any(os.path.isfile(os.path.join(parent, build_file)) for build_file in BUILD_FILES)
+
+
+def _walk(directory: str, extensions: set, max_file_bytes: int, rules: IgnoreRules) -> list:
+    """Return (path, size, mtime) for candidate files, in a stable order."""
+    candidates = []
+    stack = [(directory, rules.extended(directory, os.path.join(directory, IGNORE_FILE)))]
+    while stack:
+        current, current_rules = stack.pop()
+        current_rules = current_rules.extended(current, os.path.join(current, '.gitignore'))
+        try:
+            entries = sorted(os.scandir(current), key=lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if (entry.name not in ALWAYS_IGNORED and not is_build_output(entry.path)
+                        and not current_rules.ignored(entry.path, True)):
+                    subdirectories.append((entry.path, current_rules))
+            elif entry.is_file(follow_symlinks=False) and os.path.splitext(entry.name)[1] in extensions:
+                if current_rules.ignored(entry.path, False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_size <= max_file_bytes:
+                    candidates.append((entry.path, stat.st_size, stat.st_mtime))
+        stack.extend(reversed(subdirectories))
+    return candidates
+
+
+def _read(candidate: tuple) -> Optional[FileRecord]:
+    path, size, mtime = candidate
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if b'\0' in data[:BINARY_SNIFF_BYTES]:
+            return None
+        return FileRecord(path, size, mtime, hashlib.sha256(data).hexdigest(), data.decode('utf-8'))
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def scan(directory: str, extensions: set, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES,
+         workers: int = DEFAULT_READ_WORKERS, previous: Optional[ScanSnapshot] = None) -> ScanSnapshot:
+    """Walk `directory` once and read every matching text file on a thread pool.
+
+    Honors `.gitignore` files at every level and a project-level `.codernizeignore`,
+    and skips build output directories, binary, non-UTF-8 and oversized files.
+    Files whose size and mtime match their record in `previous` are not read again.
+    """
+    candidates = _walk(directory, extensions, max_file_bytes, IgnoreRules())
+
+    def read(candidate: tuple) -> Optional[FileRecord]:
+        record = previous.get(candidate[0]) if previous else None
+        if record is not None and (record.size, record.mtime) == candidate[1:]:
+            return record
+        return _read(candidate)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        records = [record for record in pool.map(read, candidates) if record is not None]
+    return ScanSnapshot(directory, records)
+
+
+def stat_files(directory: str, extensions: set, max_file_bytes: int = DEFAULT_MAX_FILE_BYTES) -> dict:
+    """{path: (size, mtime)} of the files `scan` would read, without reading them."""
+    return {path: (size, mtime) for path, size, mtime in _walk(directory, extensions, max_file_bytes, IgnoreRules())}
+
+
+_snapshot: Optional[ScanSnapshot] = None
+
+
+def set_snapshot(snapshot: Optional[ScanSnapshot]):
+    global _snapshot
+    _snapshot = snapshot
+
+
+def read_text(path: str) -> str:
+    """File content from the current scan snapshot, reading from disk only for files outside it."""
+    record = _snapshot.get(path) if _snapshot else None
+    if record is not None:
+        return record.text
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
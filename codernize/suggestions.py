@@ -0,0 +1,167 @@
+"""Local aggregation of per-file modernization analyses: near-duplicate suggestions are merged before the report."""
+import os
+import re
+from typing import Iterable
+
+from codernize.minhash import band_keys, signature, similarity
+
+DEFAULT_SIMILARITY = 0.5
+MAX_LISTED_FILES = 20
+SHINGLE_WORDS = 2
+UNSTRUCTURED_WORDS = 300
+
+FIELDS = {
+    'current pattern': 'current',
+    'modern alternative': 'alternative',
+    'spring boot alternative': 'alternative',
+    'migration steps': 'steps',
+    'benefits': 'benefits',
+    'potential challenges': 'challenges',
+}
+LABEL = re.compile(r'^\s*(#{1,6}\s*)?(?:\d+[.)]\s*)?(?:[-*]\s+)?(\*\*|__)?\s*(' + '|'.join(FIELDS) +
+                   r')\s*(?:\*\*|__)?\s*(:)?\s*(?:\*\*|__)?\s*(.*)$', re.I)
+HEADING = re.compile(r'^\s*#{1,6}\s+(.*?)\s*#*\s*$')
+WORD = re.compile(r'[a-z0-9@_.]+')
+STOPWORDS = {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'into', 'is', 'it', 'its', 'of',
+             'on', 'or', 'that', 'the', 'this', 'to', 'use', 'uses', 'using', 'with'}
+
+class Suggestion:
+    """One piece of advice of one file's analysis, with its labelled fields (current, alternative, ...)."""
+
+    def __init__(self, file_path: str, title: str, text: str, fields: dict):
+        self.file_path = file_path
+        self.title = title
+        self.text = text
+        self.fields = fields
+        self.signature = None
+
+    def signature_text(self) -> str:
+        # What is replaced by what identifies the advice; steps and benefits vary in wording
+        core = ' '.join(self.fields.get(name, '') for name in ('current', 'alternative')).strip()
+        text = core or ' '.join(self.text.split()[:UNSTRUCTURED_WORDS])
+        # The same advice for another file mostly differs by the file's own class name
+        name = os.path.splitext(os.path.basename(self.file_path))[0]
+        return re.sub(re.escape(name), ' ', text, flags=re.I) if name else text
+
+
+def _label(line: str):
+    """(field, rest of the line) if the line is a field label such as '**Current Pattern:** ...'."""
+    match = LABEL.match(line)
+    if not match:
+        return None
+    heading, bold, _, colon, rest = match.groups()
+    if not (heading or bold or colon):
+        return None  # Prose that happens to start with 'Benefits'
+    return FIELDS[match.group(3).lower()], rest.strip(' *_')
+
+
+def parse_analysis(file_path: str, analysis: str) -> list:
+    """Split an analysis into suggestions, each starting at a heading or a new 'Current Pattern' label.
+
+    An analysis without any labelled fields becomes a single suggestion holding all of it.
+    """
+    suggestions = []
+    title, lines, fields, field = '', [], {}, None
+
+    def flush():
+        if fields:
+            suggestions.append(Suggestion(file_path, title, '\n'.join(lines).strip(),
+                                          {name: ' '.join(value.split()) for name, value in fields.items()}))
+
+    for line in analysis.splitlines():
+        label = _label(line)
+        heading = HEADING.match(line) if label is None else None
+        if heading or (label and label[0] == 'current' and 'current' in fields):
+            flush()
+            lines, fields, field = [], {}, None
+            if heading:
+                title = re.sub(r'^\d+[.)]\s*', '', heading.group(1)).strip('*_ ')
+                continue
+        if label:
+            field = label[0]
+            fields[field] = fields.get(field, '') + ' ' + label[1]
+        elif field:
+            fields[field] += ' ' + line.strip()
+        lines.append(line)
+    flush()
+
+    if not suggestions and analysis.strip():
+        suggestions.append(Suggestion(file_path, '', analysis.strip(), {}))
+    return suggestions
+
+
+def has_suggestions(analysis: str) -> bool:
+    """Whether an analysis names at least one current pattern together with its modern alternative."""
+    return any('current' in suggestion.fields and 'alternative' in suggestion.fields
+               for suggestion in parse_analysis('', analysis))
+
+
+def shingles(text: str) -> set:
+    words = [word for word in WORD.findall(text.lower()) if word not in STOPWORDS]
+    if len(words) <= SHINGLE_WORDS:
+        return {' '.join(words)}
+    return {' '.join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+
+def minhash(text: str) -> tuple:
+    return signature(shingles(text))
+
+
+class Cluster:
+    def __init__(self):
+        self.suggestions = []
+
+    @property
+    def files(self) -> list:
+        return list(dict.fromkeys(suggestion.file_path for suggestion in self.suggestions))
+
+    @property
+    def representative(self) -> Suggestion:
+        # The most complete wording: most labelled fields, then the longest text
+        return max(self.suggestions, key=lambda suggestion: (len(suggestion.fields), len(suggestion.text)))
+
+    @property
+    def title(self) -> str:
+        representative = self.representative
+        return representative.title or representative.fields.get('current', '')[:80] or 'Suggestion'
+
+
+def cluster_suggestions(suggestions: Iterable[Suggestion], threshold: float = DEFAULT_SIMILARITY) -> list:
+    """Group near-duplicate suggestions; largest clusters first. A threshold above 1 keeps each on its own.
+
+    Each cluster is led by its first suggestion, and a suggestion joins the most similar
+    leader among those sharing one of its LSH bands. Comparing with leaders only keeps
+    chains of slightly different wordings from merging unrelated advice.
+    """
+    buckets = {}     # (band, rows of the signature) -> leaders
+    signatures = {}  # Identical wording is hashed once
+    clusters = []
+    for suggestion in suggestions:
+        text = suggestion.signature_text()
+        suggestion.signature = signatures.get(text) or signatures.setdefault(text, minhash(text))
+        keys = band_keys(suggestion.signature)
+
+        best, best_score = None, threshold
+        seen = set()
+        for key in keys:
+            for index in buckets.get(key, ()):
+                if index in seen:
+                    continue
+                seen.add(index)
+                score = similarity(suggestion.signature, clusters[index].suggestions[0].signature)
+                if score >= best_score:
+                    best, best_score = index, score
+        if best is None:
+            best = len(clusters)
+            clusters.append(Cluster())
+            for key in keys:
+                buckets.setdefault(key, []).append(best)
+        clusters[best].suggestions.append(suggestion)
+    return sorted(clusters, key=lambda cluster: -len(cluster.files))
+
+
+def render_cluster(cluster: Cluster, max_files: int = MAX_LISTED_FILES) -> str:
+    """Markdown of a cluster: its most complete wording and the files it applies to."""
+    files = cluster.files
+    listed = ', '.join(files[:max_files]) + (f" and {len(files) - max_files} more" if len(files) > max_files else '')
+    return f"## {cluster.title}\n\nApplies to {len(files)} file(s): {listed}\n\n{cluster.representative.text}"
@@ -0,0 +1,237 @@
+"""Timing, token and cost records of every OpenAI call and pipeline stage, reported at the end of a run."""
+import contextvars
+import functools
+import inspect
+import json
+import math
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+from codernize.output import write_atomically
+
+# USD per million (prompt, completion) tokens
+PRICES = {
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4o-mini': (0.15, 0.60),
+}
+SLOWEST_FILES = 10
+QUANTILES = (0.5, 0.95, 0.99)
+
+_site = contextvars.ContextVar('telemetry_site', default=('other', None))
+
+
+def call_site(file_arg: Optional[str] = None):
+    """Decorator for functions that call the API: their calls are reported under the function's name.
+
+    `file_arg` names the parameter holding the file the call is about, for the slowest-files list.
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            file_path = signature.bind(*args, **kwargs).arguments.get(file_arg) if file_arg else None
+            token = _site.set((fn.__name__, file_path))
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _site.reset(token)
+        return wrapper
+    return decorate
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> Optional[float]:
+    # Dated snapshots ('gpt-4.1-mini-2025-04-14') cost the same as their alias
+    price = PRICES.get(model) or PRICES.get(re.sub(r'-\d{4}-\d{2}-\d{2}$', '', model))
+    if price is None:
+        return None
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+
+def percentiles(values: list) -> dict:
+    """Nearest-rank p50/p95/p99 and max of a list of seconds."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {f"p{int(q * 100)}": round(ordered[max(0, math.ceil(q * len(ordered)) - 1)], 4) for q in QUANTILES}
+    result['max'] = round(ordered[-1], 4)
+    return result
+
+
+class Call:
+    """One API call in progress; the rate limiter adds its waiting time and retries."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.site, self.file = _site.get()
+        self.started = time.perf_counter()
+        self.wall = 0.0
+        self.queue_time = 0.0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.failed = False
+
+
+class Telemetry:
+    """Thread-safe collector of call records and stage timings."""
+
+    def __init__(self):
+        self.calls = []
+        self.cached = 0
+        self.stages = {}
+        self.routes = {}  # task -> requests, escalated, invalid and answers per model
+        self.started = time.time()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Start a new reporting period, for modes that run more than once per process."""
+        with self._lock:
+            self.calls = []
+            self.cached = 0
+            self.stages = {}
+            self.routes = {}
+            self.started = time.time()
+
+    def finish(self, call: Call, usage=None, failed: bool = False):
+        call.wall = time.perf_counter() - call.started
+        call.failed = failed
+        if usage is not None:
+            call.prompt_tokens = usage.prompt_tokens or 0
+            call.completion_tokens = usage.completion_tokens or 0
+        with self._lock:
+            self.calls.append(call)
+
+    def record_cached(self):
+        with self._lock:
+            self.cached += 1
+
+    def record_route(self, task: str, model: str, escalations: int, valid: bool):
+        """A routed request answered by `model` after `escalations` rejected answers of cheaper models."""
+        with self._lock:
+            stats = self.routes.setdefault(task, {'requests': 0, 'escalated': 0, 'invalid': 0, 'by_model': {}})
+            stats['requests'] += 1
+            stats['escalated'] += escalations > 0
+            stats['invalid'] += not valid
+            stats['by_model'][model] = stats['by_model'].get(model, 0) + 1
+
+    def routing(self) -> dict:
+        with self._lock:
+            return {task: {**stats, 'by_model': dict(stats['by_model']),
+                           'escalation_rate': round(stats['escalated'] / stats['requests'], 4)}
+                    for task, stats in sorted(self.routes.items())}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def report(self, tool: str) -> dict:
+        with self._lock:
+            calls, stages, cached = list(self.calls), dict(self.stages), self.cached
+
+        def summarize(group: list) -> dict:
+            costs = [estimate_cost(call.model, call.prompt_tokens, call.completion_tokens) for call in group]
+            return {
+                'calls': len(group),
+                'failed': sum(call.failed for call in group),
+                'retries': sum(call.retries for call in group),
+                'prompt_tokens': sum(call.prompt_tokens for call in group),
+                'completion_tokens': sum(call.completion_tokens for call in group),
+                'estimated_cost_usd': round(sum(cost for cost in costs if cost is not None), 6),
+                'latency_seconds': percentiles([call.wall for call in group]),
+                'queue_seconds': percentiles([call.queue_time for call in group]),
+            }
+
+        def grouped(key) -> dict:
+            groups = {}
+            for call in calls:
+                groups.setdefault(key(call), []).append(call)
+            return {name: summarize(group) for name, group in sorted(groups.items())}
+
+        # Chunks of one file are reported as that file
+        per_file = {}
+        for call in calls:
+            if call.file:
+                file_path = re.sub(r' \(part \d+ of \d+\)$', '', call.file)
+                seconds, count = per_file.get(file_path, (0.0, 0))
+                per_file[file_path] = (seconds + call.wall, count + 1)
+        slowest = sorted(per_file.items(), key=lambda item: -item[1][0])[:SLOWEST_FILES]
+
+        return {
+            'tool': tool,
+            'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'duration_seconds': round(time.time() - self.started, 3),
+            'stages_seconds': {name: round(seconds, 3) for name, seconds in stages.items()},
+            'cached_calls': cached,
+            'totals': summarize(calls),
+            'by_site': grouped(lambda call: call.site),
+            'by_model': grouped(lambda call: call.model),
+            'routing': self.routing(),
+            'slowest_files': [{'file': file_path, 'seconds': round(seconds, 3), 'calls': count}
+                              for file_path, (seconds, count) in slowest],
+        }
+
+    def write_report(self, path: str, tool: str, prometheus_file: Optional[str] = None) -> dict:
+        report = self.report(tool)
+        write_atomically(path, json.dumps(report, indent=2))
+        if prometheus_file:
+            # The textfile collector may read at any moment, so never expose a half-written file
+            write_atomically(prometheus_file, to_prometheus(report))
+        return report
+
+
+def to_prometheus(report: dict) -> str:
+    """Render a run report in the Prometheus text format, for the node exporter's textfile collector."""
+    tool = report['tool']
+    lines = [
+        '# HELP codernize_run_duration_seconds Duration of the last run.',
+        '# TYPE codernize_run_duration_seconds gauge',
+        f'codernize_run_duration_seconds{{tool="{tool}"}} {report["duration_seconds"]}',
+        '# HELP codernize_stage_duration_seconds Duration of each stage of the last run.',
+        '# TYPE codernize_stage_duration_seconds gauge',
+    ]
+    lines += [f'codernize_stage_duration_seconds{{tool="{tool}",stage="{stage}"}} {seconds}'
+              for stage, seconds in report['stages_seconds'].items()]
+    lines += [
+        '# HELP codernize_cached_calls Calls answered by the response cache in the last run.',
+        '# TYPE codernize_cached_calls gauge',
+        f'codernize_cached_calls{{tool="{tool}"}} {report["cached_calls"]}',
+    ]
+    metrics = [
+        ('api_calls', 'calls', 'API calls in the last run.'),
+        ('api_failed_calls', 'failed', 'API calls that failed after all retries in the last run.'),
+        ('api_retries', 'retries', 'Retried API requests in the last run.'),
+        ('prompt_tokens', 'prompt_tokens', 'Prompt tokens used in the last run.'),
+        ('completion_tokens', 'completion_tokens', 'Completion tokens used in the last run.'),
+        ('estimated_cost_usd', 'estimated_cost_usd', 'Estimated API cost of the last run.'),
+    ]
+    for name, field, help_text in metrics:
+        lines += [f'# HELP codernize_{name} {help_text}', f'# TYPE codernize_{name} gauge']
+        lines += [f'codernize_{name}{{tool="{tool}",site="{site}"}} {summary[field]}'
+                  for site, summary in report['by_site'].items()]
+    lines += ['# HELP codernize_route_escalation_rate Share of routed requests escalated to a stronger model in the last run.',
+              '# TYPE codernize_route_escalation_rate gauge']
+    lines += [f'codernize_route_escalation_rate{{tool="{tool}",task="{task}"}} {stats["escalation_rate"]}'
+              for task, stats in report.get('routing', {}).items()]
+    lines += ['# HELP codernize_api_latency_seconds API call latency quantiles in the last run.',
+              '# TYPE codernize_api_latency_seconds gauge']
+    for site, summary in report['by_site'].items():
+        for quantile, name in zip(QUANTILES, ('p50', 'p95', 'p99')):
+            if name in summary['latency_seconds']:
+                lines.append(f'codernize_api_latency_seconds{{tool="{tool}",site="{site}",quantile="{quantile}"}} '
+                             f'{summary["latency_seconds"][name]}')
+    return '\n'.join(lines) + '\n'
+
+
+telemetry = Telemetry()
@@ -0,0 +1,27 @@
+"""Token estimates used for prompt budgeting."""
+import functools
+
+# Rough average for English prose and source code with OpenAI tokenizers
+CHARS_PER_TOKEN = 4
+
+
+@functools.cache
+def _encoding():
+    """The tiktoken encoding, loaded on the first exact count since loading it takes a while."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding('o200k_base')
+    except Exception:  # tiktoken is optional; fall back to the character estimate
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_tokens(text: str) -> int:
+    """Exact token count when tiktoken is installed, the character estimate otherwise."""
+    encoding = _encoding()
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
@@ -0,0 +1,14 @@
+"""Access to the hyphenated tool scripts from the pipelines built on them."""
+import importlib.util
+import os
+
+TOOLS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_tool(file_name: str):
+    """Import one of the hyphenated tool scripts as a module."""
+    module_name = file_name.replace('-', '_').removesuffix('.py')
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(TOOLS_DIR, file_name))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
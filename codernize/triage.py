@@ -0,0 +1,193 @@
+"""Local, rule-based triage of Java EE patterns used before sending files to the modernization analysis."""
+import re
+from typing import NamedTuple
+
+JAVA = r'\.java$'
+
+
+class Rule(NamedTuple):
+    name: str
+    files: str         # regex on the path the rule applies to
+    pattern: str       # regex on the content; an empty pattern matches any file the rule applies to
+    current: str
+    alternative: str
+    steps: str
+    complex: bool = False  # a pattern the rules cannot resolve: the file goes to the model
+
+
+RULES = [
+    # Well-known patterns, answered by the rule itself
+    Rule('CDI injection', JAVA, r'@Inject\b',
+         'CDI `@Inject` field injection', 'Spring constructor injection',
+         'Replace injected fields with `final` fields set by the constructor; Spring injects a single constructor without `@Autowired`.'),
+    Rule('CDI scopes and names', JAVA, r'@(ApplicationScoped|RequestScoped|SessionScoped|ConversationScoped|Dependent|Model|Named)\b',
+         'CDI scope annotations and `@Named` beans', 'Spring stereotypes (`@Component`, `@Service`) with `@RequestScope`/`@SessionScope`',
+         'Annotate the class with the matching Spring stereotype; singleton is the Spring default, add `@RequestScope` or `@SessionScope` where needed.'),
+    Rule('CDI producers', JAVA, r'^import\s+(javax|jakarta)\.enterprise\.inject\.Produces;',
+         'CDI producer methods (`@Produces`)', '`@Bean` methods in a `@Configuration` class',
+         'Move producer methods into a `@Configuration` class as `@Bean` methods; drop producers of beans Spring Boot auto-configures (`EntityManager`, `Logger`).'),
+    Rule('CDI events', JAVA, r'^import\s+(javax|jakarta)\.enterprise\.event\.',
+         'CDI events (`Event<T>.fire`, `@Observes`)', 'Spring `ApplicationEventPublisher` and `@EventListener`',
+         'Inject `ApplicationEventPublisher` instead of `Event<T>` and replace `@Observes` parameters with `@EventListener` methods.'),
+    Rule('Stateless EJB', JAVA, r'@(Stateless|Singleton)\b',
+         'Stateless or singleton session beans (`@Stateless`, `@Singleton`)', 'Spring `@Service` beans with `@Transactional`',
+         'Replace the EJB annotation with `@Service` and add `@Transactional` where the container managed transactions.'),
+    Rule('JPA entities', JAVA, r'@(Entity|Embeddable|MappedSuperclass)\b',
+         'JPA entities', 'The same entities with Spring Data JPA (`spring-boot-starter-data-jpa`)',
+         'Keep the `jakarta.persistence` annotations; Spring Boot scans entities below the application class.'),
+    Rule('EntityManager repositories', JAVA, r'(?:@PersistenceContext|EntityManager)\b',
+         'Hand-written data access with `EntityManager` and criteria queries', 'Spring Data JPA repository interfaces',
+         'Replace the class with an interface extending `JpaRepository`, using derived query methods such as `findAllByOrderByIdAsc`.'),
+    Rule('JAX-RS resources', JAVA, r'^import\s+(javax|jakarta)\.ws\.rs\.(?!core\.Application;|ApplicationPath;)',
+         'JAX-RS resources (`@Path`, `@GET`, `@Produces`)', 'Spring MVC `@RestController` with `@GetMapping`/`@PostMapping`',
+         'Map `@Path` to `@RequestMapping`, HTTP method annotations to `@GetMapping`/`@PostMapping`, `@PathParam` to `@PathVariable` and `Response` to `ResponseEntity`.'),
+    Rule('JAX-RS activator', JAVA, r'@ApplicationPath\b',
+         'JAX-RS `Application` subclass with `@ApplicationPath`', 'Spring Boot auto-configured DispatcherServlet',
+         'Delete the class; set a common prefix with `spring.mvc.servlet.path` or `@RequestMapping` if needed.'),
+    Rule('JSF backing beans', JAVA, r'^import\s+(javax|jakarta)\.faces\.',
+         'JSF backing beans using `FacesContext` and `FacesMessage`', 'Spring MVC controllers with Thymeleaf, or JSF on Spring Boot with JoinFaces',
+         'Turn actions into controller methods returning views and replace `FacesMessage` with model attributes or flash attributes.'),
+    Rule('Bean Validation', JAVA, r'^import\s+(javax|jakarta)\.validation\.',
+         'Bean Validation constraints', 'The same constraints with `spring-boot-starter-validation` and `@Valid`',
+         'Add `spring-boot-starter-validation` and `@Valid` on controller parameters; replace manual `Validator` calls.'),
+    Rule('JAXB', JAVA, r'^import\s+(javax|jakarta)\.xml\.bind\.',
+         'JAXB annotations for XML binding (`@XmlRootElement`)', 'Jackson JSON binding (Spring Boot default)',
+         'Remove `@XmlRootElement` unless XML output is required, in which case add `jackson-dataformat-xml`.'),
+    Rule('java.util.logging', JAVA, r'java\.util\.logging\.Logger\b',
+         '`java.util.logging.Logger` injected through a CDI producer', 'SLF4J `Logger` from `LoggerFactory` (Spring Boot default)',
+         'Declare `private static final Logger log = LoggerFactory.getLogger(...)` and drop the producer.'),
+    Rule('Arquillian tests', JAVA, r'org\.jboss\.arquillian\b',
+         'Arquillian in-container tests with ShrinkWrap deployments', '`@SpringBootTest` or `@DataJpaTest` slices',
+         'Replace `@RunWith(Arquillian.class)` and the `@Deployment` method with `@SpringBootTest`; use `@DataJpaTest` or `@WebMvcTest` for faster slices.'),
+    Rule('persistence.xml', r'(^|/)persistence\.xml$', r'',
+         '`persistence.xml` persistence unit with a JTA data source', '`spring.datasource` and `spring.jpa` properties in `application.yml`',
+         'Move the data source and Hibernate properties to `application.yml` and delete `persistence.xml`.'),
+    Rule('Data source descriptors', r'-ds\.xml$', r'',
+         'Server-specific data source descriptor (`*-ds.xml`)', '`spring.datasource` properties',
+         'Copy the URL, driver and credentials into `spring.datasource.*` and delete the descriptor.'),
+    Rule('beans.xml', r'(^|/)beans\.xml$', r'',
+         'CDI `beans.xml` descriptor', 'Spring component scanning',
+         'Delete `beans.xml`; classes below the `@SpringBootApplication` package are scanned.'),
+    Rule('faces-config.xml', r'(^|/)faces-config\.xml$', r'',
+         'JSF `faces-config.xml`', 'Spring MVC view configuration, or JoinFaces for JSF on Spring Boot',
+         'Move navigation rules to controllers and delete the file, or keep it under JoinFaces.'),
+    Rule('web.xml', r'(^|/)web\.xml$', r'<(servlet|filter|listener|context-param|welcome-file-list)\b',
+         '`web.xml` servlet, filter and listener registrations', 'Spring Boot auto-configuration and `ServletRegistrationBean`/`FilterRegistrationBean` beans',
+         'Register remaining servlets and filters as beans and delete `web.xml`.'),
+    Rule('Arquillian configuration', r'(^|/)arquillian\.xml$', r'',
+         '`arquillian.xml` container configuration', 'Spring Boot test configuration',
+         'Delete the file together with the Arquillian dependencies.'),
+    Rule('Jakarta EE build', r'(^|/)pom\.xml$', r'<packaging>\s*war\s*</packaging>|jakarta|javaee|jboss|wildfly',
+         'WAR packaging with Jakarta EE and application server dependencies', '`spring-boot-starter-parent` with starters and an executable JAR',
+         'Inherit from `spring-boot-starter-parent`, replace the Jakarta EE API and server plugins with starters and `spring-boot-maven-plugin`.'),
+    Rule('JSF views', r'\.x?html$', r'jakarta\.faces|java\.sun\.com/jsf|xmlns\.jcp\.org/jsf|#\{',
+         'JSF Facelets views with EL expressions', 'Thymeleaf templates, or the same views with JoinFaces',
+         'Rewrite `h:` components as HTML with `th:` attributes bound to model attributes, or keep Facelets under JoinFaces.'),
+    Rule('import.sql', r'(^|/)import\.sql$', r'',
+         'Hibernate `import.sql` seed data', 'Spring Boot `data.sql`',
+         'Rename to `data.sql` and set `spring.jpa.defer-datasource-initialization=true`.'),
+
+    # Patterns that need the model's judgement
+    Rule('JNDI lookups', r'\.(java|properties|ya?ml)$|(?<!persistence)\.xml$', r'InitialContext\b|\.lookup\(|java:(comp|global|app|module|jboss)/',
+         'JNDI lookups of server resources', 'Injected Spring beans and externalized configuration', '', True),
+    Rule('Messaging', JAVA, r'@MessageDriven\b|(javax|jakarta)\.jms\.',
+         'JMS and message-driven beans', '`@JmsListener` with Spring JMS or Spring Cloud Stream', '', True),
+    Rule('Stateful EJB', JAVA, r'@Stateful\b',
+         'Stateful session beans', 'Session-scoped beans or explicit state storage', '', True),
+    Rule('Remote EJB', JAVA, r'@(Remote|Local)\b',
+         'Remote or local EJB business interfaces', 'REST or messaging endpoints, plain interfaces', '', True),
+    Rule('EJB timers', JAVA, r'(?:@Schedules?|TimerService)\b',
+         'EJB timers', '`@Scheduled` with `@EnableScheduling`', '', True),
+    Rule('Container transactions', JAVA, r'(?:UserTransaction|@TransactionAttribute|@TransactionManagement)\b',
+         'Container or bean managed transactions', '`@Transactional` propagation settings or `TransactionTemplate`', '', True),
+    Rule('Interceptors and decorators', JAVA, r'@(Interceptor|InterceptorBinding|AroundInvoke|AroundTimeout|Decorator|Interceptors)\b',
+         'CDI/EJB interceptors and decorators', 'Spring AOP aspects', '', True),
+    Rule('CDI extensions', JAVA, r'(?:javax|jakarta)\.enterprise\.inject\.spi\.(?:Extension|AfterBeanDiscovery|BeforeBeanDiscovery|ProcessAnnotatedType)\b',
+         'Portable CDI extensions', 'Spring `BeanFactoryPostProcessor` or auto-configuration', '', True),
+    Rule('Security', r'\.(java|xml)$', r'@(RolesAllowed|DeclareRoles|RunAs|PermitAll|DenyAll)\b|(javax|jakarta)\.security\.(?!auth\.x500)|<(security-constraint|login-config)>',
+         'Container-managed security', 'Spring Security', '', True),
+    Rule('Asynchronous EJB', JAVA, r'(?:@Asynchronous|Managed(Scheduled)?ExecutorService)\b',
+         'Asynchronous EJB methods and managed executors', '`@Async` with a `TaskExecutor`', '', True),
+    Rule('Server descriptors', r'(^|/)(ejb-jar|jboss-[\w-]+|weblogic[\w-]*|ibm-[\w-]+)\.xml$', r'',
+         'Application server deployment descriptors', 'Spring Boot configuration', '', True),
+]
+
+# Java EE packages the rules above fully cover; other javax.*/jakarta.* imports go to the model
+KNOWN_PACKAGES = re.compile(
+    r'^(javax|jakarta)\.(inject|enterprise\.(context|inject|event)|persistence|ws\.rs|ejb\.(Stateless|Singleton)'
+    r'|faces|validation|xml\.bind|annotation\.(PostConstruct|PreDestroy|Priority))\b')
+# Java SE packages in the javax namespace
+JAVA_SE_PACKAGES = re.compile(
+    r'^javax\.(annotation\.processing|crypto|imageio|lang\.model|management|net|print|script|security\.auth\.x500'
+    r'|sound|sql|swing|tools|xml\.(parsers|transform|stream|xpath|namespace|datatype|validation|catalog|crypto))\b')
+EE_IMPORT = re.compile(r'^\s*import\s+(?:static\s+)?((?:javax|jakarta)\.[\w.]+)', re.M)
+
+_compiled = [(rule, re.compile(rule.files), re.compile(rule.pattern, re.M) if rule.pattern else None) for rule in RULES]
+
+
+class Triage(NamedTuple):
+    findings: list    # rules matching the file
+    unresolved: list  # why the model is needed: complex patterns and unknown Java EE imports
+
+    @property
+    def needs_llm(self) -> bool:
+        return bool(self.unresolved)
+
+    @property
+    def relevant(self) -> bool:
+        return bool(self.findings or self.unresolved)
+
+
+def triage_file(file_path: str, content: str) -> Triage:
+    """Match the rules against a file; a file without findings needs no modernization analysis."""
+    path = file_path.replace('\\', '/')
+    findings, unresolved = [], []
+    for rule, files, pattern in _compiled:
+        if files.search(path) and (pattern is None or pattern.search(content)):
+            findings.append(rule)
+            if rule.complex:
+                unresolved.append(rule.name)
+    if path.endswith('.java'):
+        unknown = sorted({name for name in EE_IMPORT.findall(content)
+                          if not KNOWN_PACKAGES.match(name) and not JAVA_SE_PACKAGES.match(name)})
+        unresolved += [f"import {name}" for name in unknown]
+    return Triage(findings, unresolved)
+
+
+def rule_analysis(triage: Triage) -> str:
+    """The analysis of a file resolved by the rules, in the same labelled format as the model's analyses."""
+    return "\n\n".join(
+        f"### {rule.name}\n\n**Current Pattern:** {rule.current}\n**Modern Alternative:** {rule.alternative}\n"
+        f"**Migration Steps:** {rule.steps}"
+        for rule in triage.findings)
+
+
+def inventory(results: dict, repo_directory: str = None) -> str:
+    """Markdown migration inventory of {path: Triage}: patterns by frequency and the files needing the model."""
+    def relative(file_path: str) -> str:
+        return file_path[len(repo_directory):].lstrip('/\\') if repo_directory and file_path.startswith(repo_directory) else file_path
+
+    by_rule = {}
+    for file_path, triage in results.items():
+        for rule in triage.findings:
+            by_rule.setdefault(rule, []).append(relative(file_path))
+    needs_llm = {file_path: triage for file_path, triage in results.items() if triage.needs_llm}
+    resolved = sum(1 for triage in results.values() if triage.relevant and not triage.needs_llm)
+
+    lines = [
+        "# Migration Inventory", "",
+        f"{len(results)} files triaged: {resolved} resolved by rules, {len(needs_llm)} need analysis, "
+        f"{len(results) - resolved - len(needs_llm)} without Java EE patterns.", "",
+        "## Patterns", "",
+        "| Pattern | Current | Spring Boot alternative | Files | Needs analysis |",
+        "|---|---|---|---|---|",
+    ]
+    for rule, file_paths in sorted(by_rule.items(), key=lambda item: -len(item[1])):
+        lines.append(f"| {rule.name} | {rule.current} | {rule.alternative} | {len(file_paths)} | {'yes' if rule.complex else 'no'} |")
+    if needs_llm:
+        lines += ["", "## Files Needing Analysis", ""]
+        lines += [f"- `{relative(file_path)}`: {', '.join(triage.unresolved)}" for file_path, triage in needs_llm.items()]
+    lines += ["", "## Files by Pattern"]
+    for rule, file_paths in sorted(by_rule.items(), key=lambda item: item[0].name):
+        lines += ["", f"### {rule.name}", ""] + [f"- `{file_path}`" for file_path in file_paths]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,92 @@
+"""Change detection for long-running modes: debounced polling of file stats, woken early by file system events."""
+import os
+import threading
+import time
+from typing import NamedTuple, Optional
+
+from codernize.scanner import DEFAULT_MAX_FILE_BYTES, stat_files
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # Without watchdog (inotify, FSEvents, ...), changes are found by polling alone
+    Observer = None
+
+DEFAULT_POLL_INTERVAL = 2.0
+DEFAULT_DEBOUNCE = 1.0
+DEFAULT_MAX_DELAY = 10.0
+
+
+class Changes(NamedTuple):
+    changed: list  # Added or modified files
+    removed: list
+
+
+class Watcher:
+    """Reports the files of a directory that changed, once a burst of changes has settled.
+
+    The stats of the matching files are compared every `poll_interval` seconds; with
+    watchdog installed, a file system event triggers the comparison right away instead.
+    Files under one of the `exclude` directories are not watched.
+    """
+
+    def __init__(self, directory: str, extensions: set, poll_interval: float = DEFAULT_POLL_INTERVAL,
+                 debounce: float = DEFAULT_DEBOUNCE, max_delay: float = DEFAULT_MAX_DELAY,
+                 exclude: tuple = (), max_file_bytes: int = DEFAULT_MAX_FILE_BYTES):
+        self.directory = directory
+        self.extensions = extensions
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.exclude = tuple(os.path.join(os.path.abspath(path), '') for path in exclude)
+        self.max_file_bytes = max_file_bytes
+        self.stats = self._stat()
+        self._woken = threading.Event()
+        self._observer = None
+        if Observer is not None:
+            handler = FileSystemEventHandler()
+            handler.on_any_event = lambda event: self._woken.set()
+            self._observer = Observer()
+            self._observer.schedule(handler, directory, recursive=True)
+            self._observer.start()
+
+    @property
+    def mode(self) -> str:
+        return 'file system events' if self._observer is not None else f'polling every {self.poll_interval:g}s'
+
+    def _stat(self) -> dict:
+        stats = stat_files(self.directory, self.extensions, self.max_file_bytes)
+        return {path: stat for path, stat in stats.items() if not os.path.abspath(path).startswith(self.exclude)}
+
+    def _poll(self) -> tuple[set, set]:
+        current = self._stat()
+        changed = {path for path, stat in current.items() if self.stats.get(path) != stat}
+        removed = set(self.stats) - set(current)
+        self.stats = current
+        return changed, removed
+
+    def wait(self, stop: Optional[threading.Event] = None) -> Changes:
+        """Block until files changed and then stayed quiet for `debounce` seconds, or `max_delay` passed.
+
+        Returns empty Changes as soon as `stop` is set.
+        """
+        changed, removed = set(), set()
+        first = last = None
+        while stop is None or not stop.is_set():
+            self._woken.wait(self.debounce if first else self.poll_interval)
+            self._woken.clear()
+            new_changed, new_removed = self._poll()
+            now = time.monotonic()
+            if new_changed or new_removed:
+                changed = (changed - new_removed) | new_changed
+                removed = (removed - new_changed) | new_removed
+                first = first or now
+                last = now
+            if first and (now - last >= self.debounce or now - first >= self.max_delay):
+                return Changes(sorted(changed), sorted(removed))
+        return Changes([], [])
+
+    def close(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
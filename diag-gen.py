@@ -1,43 +1,52 @@
 import os
+import re
+from typing import Iterable
 import click
-from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from codernize.batch import DEFAULT_POLL_INTERVAL, BatchQueue
+from codernize.cache import open_cache
+from codernize.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAX_FILE_TOKENS, chunk_label, filter_skipped, split_content
+from codernize.dedup import (DEFAULT_NEAR_DUPLICATE_SIMILARITY, adapt_messages, duplicates_summary, find_duplicates, map_duplicates,
+                             reuse_result, rewrite_paths)
+from codernize.diagram import DEFAULT_MAX_NODES, is_valid_mermaid, merge_graphs, package_of, parse_mermaid, simplify
+from codernize.executor import DEFAULT_CONCURRENCY, map_ordered
+from codernize.java_structure import build_graph
+from codernize.journal import Journal
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, LazyClient, OutputTruncatedError, get_limiter, set_batch, set_cache
+from codernize.output import write_atomically
+from codernize.packing import (DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_FILE_TOKENS, batch_messages, complete_batch, map_packed,
+                              pack_small_files)
+from codernize.plan import COMPLETION_TOKENS, JSON_FORMAT, Plan, stand_in
+from codernize.routing import ModelsFileError, get_router, routed_chat, routed_chat_to_file, routing_summary
+from codernize.scanner import read_text, scan, set_snapshot
+from codernize.telemetry import call_site, telemetry
+from codernize.tokens import count_tokens
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = LazyClient(api_key=os.getenv("OPENAI_API_KEY"))
 console = Console(width=200, force_terminal=True)
 
+RUN_REPORT_FILE = 'diag-gen-run-report.json'
+JOURNAL_FILE = 'diag-gen-journal.jsonl'
+
 RELEVANT_EXTENSIONS = {
     '.java',        # Core source code: classes, controllers, services, models, etc.
     '.xml',         # Configuration files (e.g., Spring beans, persistence.xml, pom.xml)
     '.sql',         # Database schema definitions or migration scripts
     '.xhtml',
-    '.xml',
 }
 
 def scan_codebase(directory: str, debug: bool) -> list:
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            if Path(filename).suffix in RELEVANT_EXTENSIONS:
-                files.append(os.path.join(root, filename))
-    if debug: console.print(f"[cyan]Found {len(files)} relevant files in the codebase[/cyan]")
-    return files
-
-def generate_file_diagram(file_path: str, debug: bool) -> str:
-    """Generate a Mermaid diagram for a single file."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    snapshot = scan(directory, RELEVANT_EXTENSIONS)
+    set_snapshot(snapshot)
+    if debug: console.print(f"[cyan]Found {len(snapshot)} relevant files in the codebase[/cyan]")
+    return snapshot.paths()
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content": """
+FILE_DIAGRAM_PROMPT = """
                 You are a code analysis expert. Analyze the provided code file and generate a Mermaid diagram that shows:
                 1. The main components/classes/functions
                 2. Their relationships and dependencies
@@ -52,142 +61,367 @@ def generate_file_diagram(file_path: str, debug: bool) -> str:
                 Focus on the most important relationships and avoid cluttering the diagram.
                  
                 Return Mermaid code only.
-                """},
-                {"role": "user", "content": f"""
+                """
+FILE_DIAGRAMS_VALUE = "strings with the Mermaid code for that file"
+
+
+def generate_file_diagram(file_path: str, debug: bool, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> str:
+    """Generate a Mermaid diagram for a single file."""
+    try:
+        content = read_text(file_path)
+    except Exception as e:
+        console.print(f"[red]Error generating diagram for {file_path}: {str(e)}[/red]")
+        return f"Error generating diagram for {file_path}: {str(e)}"
+
+    # Oversized files are diagrammed chunk by chunk in parallel
+    chunks = split_content(file_path, content, chunk_tokens)
+    diagrams = map_ordered(lambda i: generate_diagram(chunk_label(file_path, i, len(chunks)), chunks[i], debug),
+                           range(len(chunks)), len(chunks))
+    return merge_chunk_diagrams(diagrams)
+
+def merge_chunk_diagrams(diagrams: list) -> str:
+    """Merge the diagrams of a file's chunks into one when they share the same diagram type."""
+    bodies = [re.sub(r'^```(mermaid)?\s*|\s*```$', '', diagram.strip()).splitlines() for diagram in diagrams]
+    bodies = [body for body in bodies if body]
+    if len(bodies) <= 1 or len({body[0].strip() for body in bodies}) > 1:
+        return "\n\n".join("\n".join(body) for body in bodies)
+    return "\n".join(bodies[0] + [line for body in bodies[1:] for line in body[1:]])
+
+def diagram_messages(file_path: str, content: str) -> list:
+    return [
+        {"role": "system", "content": FILE_DIAGRAM_PROMPT},
+        {"role": "user", "content": f"""
                 File path: {file_path}
                 
                 Content:
                 {content}
                 """}
-            ],
+    ]
+
+@call_site('file_path')
+def generate_diagram(file_path: str, content: str, debug: bool) -> str:
+    """Ask the model for the Mermaid diagram of one file (or one chunk of it)."""
+    try:
+        response = routed_chat(
+            client,
+            task='file-diagram',
+            messages=diagram_messages(file_path, content),
+            validate=is_valid_mermaid,
             temperature=0.3,
+            content=content,
         )
         
         if debug: console.print(f"[cyan]Diagram generated for {file_path}[/cyan]")
-        return response.choices[0].message.content.strip()
+        return response
     
     except Exception as e:
         console.print(f"[red]Error generating diagram for {file_path}: {str(e)}[/red]")
         return f"Error generating diagram for {file_path}: {str(e)}"
 
-def combine_diagrams(diagrams: list, output_file: str, debug: bool):
-    """Combine all individual diagrams into a comprehensive system diagram."""
+@call_site()
+def generate_file_diagrams(file_paths: list, debug: bool) -> dict:
+    """Generate Mermaid diagrams for several small files in one request; returns {path: diagram} for the files answered properly."""
+    try:
+        files = []
+        for file_path in file_paths:
+            files.append((file_path, read_text(file_path)))
+
+        diagrams = complete_batch(
+            client,
+            model=get_router().model_for('file-diagram'),
+            system_prompt=FILE_DIAGRAM_PROMPT,
+            value_description=FILE_DIAGRAMS_VALUE,
+            files=files,
+            validate=lambda value: isinstance(value, str) and is_valid_mermaid(value),
+        )
+        if debug: console.print(f"[cyan]Batch of {len(files)} diagrams generated, {len(diagrams)} answered[/cyan]")
+        return {file_path: diagram.strip() for file_path, diagram in diagrams.items()}
+
+    except Exception as e:
+        console.print(f"[red]Error generating diagrams for batch: {str(e)}[/red]")
+        return {}
+
+def combine_diagrams(diagrams: Iterable[tuple], output_file: str, debug: bool):
+    """Merge the per-file diagrams, (path, mermaid) pairs, into one system diagram grouped by package."""
     if debug: console.print("[blue]Combining diagrams into system diagram...[/blue]")
-    
+
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": """
-                You are a system architecture expert. Create a comprehensive system diagram by combining the provided individual file diagrams.
-                
-                Guidelines:
-                - Use a hierarchical structure to show system organization
-                - Maintain clear relationships between components
-                - Use appropriate Mermaid diagram types
-                - Include a legend if needed
-                - Keep the diagram clean and readable
-                - Focus on the most important system-wide relationships
-                 
+        # Nodes of different files with the same normalized name are the same component
+        graph = merge_graphs([parse_mermaid(diagram, package_of(file_path)) for file_path, diagram in diagrams])
+        if debug: console.print(f"[cyan]{len(graph.nodes)} nodes and {len(graph.edges)} edges after merging[/cyan]")
+
+        write_atomically(output_file, graph.to_mermaid())
+
+        if debug:
+            console.print(f"[green]Combined diagram generated successfully: {output_file}[/green]")
+
+    except Exception as e:
+        console.print(f"[red]Error combining diagrams: {str(e)}[/red]")
+
+def write_static_diagram(file_paths: list, output_file: str, llm_layout: bool, debug: bool,
+                         max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, on_tokens=None):
+    """Build the system diagram from the classes, injections, inheritance and persistence wiring found in the code."""
+    if debug: console.print("[blue]Extracting the code structure...[/blue]")
+    graph = build_graph({file_path: read_text(file_path) for file_path in file_paths})
+    if debug: console.print(f"[cyan]{len(graph.nodes)} nodes and {len(graph.edges)} edges extracted[/cyan]")
+    diagram = graph.to_mermaid()
+    if llm_layout:
+        refine_diagram(diagram, output_file, max_output_tokens, debug, on_tokens)
+    else:
+        write_atomically(output_file, diagram)
+
+    if debug:
+        console.print(f"[green]Combined diagram generated successfully: {output_file}[/green]")
+
+def refine_messages(diagram: str) -> list:
+    return [
+        {"role": "system", "content": """
+                You are a system architecture expert. Improve the provided Mermaid diagram, which was generated from the source code:
+                - Use clear, concise labels for nodes, subgraphs and relationships
+                - Choose a layout direction and subgraph arrangement that keeps the diagram readable
+                - Keep every node and relationship; do not invent new ones
+                - Ensure the diagram remains valid Mermaid syntax
+
                 Return Mermaid code only.
                 """},
-                {"role": "user", "content": "\n\n".join(diagrams)}
-            ],
+        {"role": "user", "content": diagram}
+    ]
+
+@call_site()
+def refine_diagram(diagram: str, output_file: str, max_output_tokens: int, debug: bool, on_tokens=None):
+    """Let the model improve labels and layout of a generated diagram without changing its structure.
+
+    The refined diagram is streamed into the output file; the extracted one is written if refining fails.
+    """
+    if debug: console.print("[blue]Refining diagram labels and layout...[/blue]")
+
+    # The refined diagram must keep every extracted node
+    nodes = len(parse_mermaid(diagram).nodes)
+    try:
+        refined = routed_chat_to_file(
+            client,
+            task='refine-diagram',
+            messages=refine_messages(diagram),
+            output_file=output_file,
+            validate=lambda refined: is_valid_mermaid(refined, nodes),
             temperature=0.3,
+            max_tokens=max_output_tokens,
+            on_tokens=on_tokens,
         )
-        
-        combined_diagram = response.choices[0].message.content.strip()
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(combined_diagram)
-            
-        if debug:
-            console.print(f"[green]Combined diagram generated successfully: {output_file}[/green]")
-            
+        if not is_valid_mermaid(refined, nodes):
+            console.print("[yellow]The refined diagram lost nodes or is not valid Mermaid, keeping the extracted diagram[/yellow]")
+            write_atomically(output_file, diagram)
+
+    except OutputTruncatedError as e:
+        # A cut-off diagram is not valid Mermaid
+        console.print(f"[yellow]{str(e)}, keeping the extracted diagram[/yellow]")
+        write_atomically(output_file, diagram)
     except Exception as e:
-        console.print(f"[red]Error combining diagrams: {str(e)}[/red]")
+        console.print(f"[red]Error refining diagram: {str(e)}[/red]")
+        write_atomically(output_file, diagram)
 
-def simplify_diagram(diagram_file: str, debug: bool):
+def simplify_diagram(diagram_file: str, max_nodes: int, debug: bool):
     """Simplify the final diagram to keep only the most important elements."""
     if debug: console.print("[blue]Simplifying the final diagram...[/blue]")
-    
+
     try:
         with open(diagram_file, 'r', encoding='utf-8') as f:
-            diagram_content = f.read()
-
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": """
-                You are a system architecture expert. Simplify the provided Mermaid diagram by:
-                1. Keeping only the most critical components and relationships
-                2. Removing redundant or less important connections
-                3. Simplifying complex hierarchies while maintaining the core architecture
-                4. Using clear, concise labels
-                5. Ensuring the diagram remains valid Mermaid syntax
-                
-                Focus on making the diagram more readable while preserving the essential system structure.
-                Return Mermaid code only.
-                """},
-                {"role": "user", "content": diagram_content}
-            ],
-            temperature=0.3,
-        )
-        
-        simplified_diagram = response.choices[0].message.content.strip()
-        
+            graph = parse_mermaid(f.read())
+
+        simplified = simplify(graph, max_nodes)
+        if debug: console.print(f"[cyan]{len(graph.nodes)} nodes reduced to {len(simplified.nodes)}[/cyan]")
+
         # Save the simplified diagram with a new name
         simplified_file = diagram_file.replace('.mermaid', '_simplified.mermaid')
-        with open(simplified_file, 'w', encoding='utf-8') as f:
-            f.write(simplified_diagram)
-            
+        write_atomically(simplified_file, simplified.to_mermaid())
+
         if debug:
             console.print(f"[green]Simplified diagram generated successfully: {simplified_file}[/green]")
-            
+
     except Exception as e:
         console.print(f"[red]Error simplifying diagram: {str(e)}[/red]")
 
+def plan_diagrams(plan: Plan, files: list, per_file_llm: bool, llm_layout: bool, directory: str, chunk_tokens: int,
+                  small_file_tokens: int, batch_token_budget: int, near_duplicate_similarity: float, max_output_tokens: int):
+    """Add the requests a run would send for `files` to `plan`; merging and extracting diagrams needs none."""
+    if not per_file_llm:
+        if llm_layout:
+            diagram = build_graph({file_path: read_text(file_path) for file_path in files}).to_mermaid()
+            plan.begin('extract')
+            plan.add('refine-diagram', refine_messages(diagram), content=diagram,
+                     completion_tokens=min(count_tokens(diagram), max_output_tokens))
+        return
+
+    duplicates = find_duplicates(files, near_duplicate_similarity)
+    originals = [file_path for file_path in files if file_path not in duplicates]
+    diagrams = {}
+
+    plan.begin('per-file')
+    batches, singles = pack_small_files(originals, small_file_tokens, batch_token_budget)
+    for batch in batches:
+        plan.add('file-diagram', batch_messages(FILE_DIAGRAM_PROMPT, FILE_DIAGRAMS_VALUE, [(file_path, read_text(file_path)) for file_path in batch]),
+                 model=get_router().model_for('file-diagram'), response_format=JSON_FORMAT,
+                 completion_tokens=COMPLETION_TOKENS['file-diagram'] * len(batch))
+        diagrams.update((file_path, stand_in(COMPLETION_TOKENS['file-diagram'])) for file_path in batch)
+    for file_path in singles:
+        chunks = split_content(file_path, read_text(file_path), chunk_tokens)
+        diagrams[file_path] = "\n\n".join(
+            plan.add('file-diagram', diagram_messages(chunk_label(file_path, i, len(chunks)), chunk), content=chunk)
+            for i, chunk in enumerate(chunks))
+
+    plan.begin('near-duplicates')
+    # Near-copies first, so copies of a near-copy find its diagram
+    for file_path, duplicate in sorted(duplicates.items(), key=lambda item: item[1].exact):
+        representative_diagram = diagrams[duplicate.representative]
+        if duplicate.exact:
+            diagrams[file_path] = rewrite_paths(representative_diagram, duplicate.representative, file_path, directory)
+        else:
+            diagrams[file_path] = plan.add('near-duplicate', content=duplicate.diff, messages=adapt_messages(
+                representative_diagram, duplicate.representative, file_path, duplicate.diff))
+
 @click.command()
 @click.argument('repo-directory', required=True, type=click.Path(exists=True))
 @click.option('--output', '-o', default='docs', help='Output directory for diagrams')
 @click.option('--combined-diagram-file', '-diagram', default='system-diagram.mermaid', help='Output file for combined diagram')
 @click.option('--debug', '-d', is_flag=True, help='Enable debug output')
-def main(repo_directory: str, output: str, combined_diagram_file: str, debug: bool):
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True, help='Number of files processed in parallel')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the response cache')
+@click.option('--refresh', is_flag=True, help='Ignore cached responses and overwrite them with fresh ones')
+@click.option('--small-file-tokens', default=DEFAULT_SMALL_FILE_TOKENS, show_default=True, help='Files up to this many tokens are packed into shared requests (0 disables packing)')
+@click.option('--batch-token-budget', default=DEFAULT_BATCH_TOKEN_BUDGET, show_default=True, help='Maximum tokens of files packed into one request')
+@click.option('--chunk-tokens', default=DEFAULT_CHUNK_TOKENS, show_default=True, help='Larger files are split into chunks of this many tokens')
+@click.option('--max-file-tokens', default=DEFAULT_MAX_FILE_TOKENS, show_default=True, help='Files larger than this many tokens are skipped')
+@click.option('--per-file-llm', is_flag=True, help='Ask the model for a diagram of every file instead of extracting the structure locally')
+@click.option('--llm-layout', is_flag=True, help='Let the model refine labels and layout of the extracted diagram (one call)')
+@click.option('--max-nodes', default=DEFAULT_MAX_NODES, show_default=True, help='Maximum number of nodes in the simplified diagram')
+@click.option('--batch', 'batch_mode', is_flag=True, help='Send the per-file requests through the OpenAI Batch API (cheaper, asynchronous, resumable)')
+@click.option('--batch-dir', default=None, help='Directory holding the batch requests, state and results (default: <output>/batch)')
+@click.option('--batch-poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True, help='Seconds between batch status checks')
+@click.option('--resume', is_flag=True, help='Skip files whose result is already in the journal of an interrupted run')
+@click.option('--prometheus-file', default=None, help='Also write the run metrics to this file for the Prometheus textfile collector')
+@click.option('--max-output-tokens', default=DEFAULT_MAX_OUTPUT_TOKENS, show_default=True, help='Cap on the tokens of the streamed --llm-layout answer')
+@click.option('--near-duplicate-similarity', default=DEFAULT_NEAR_DUPLICATE_SIMILARITY, show_default=True, help='With --per-file-llm, similarity above which a file reuses the diagram of a near-copy (above 1 only reuses exact copies)')
+@click.option('--plan', 'plan_only', is_flag=True, help='Print the requests, tokens, cost and time of the run without calling the model')
+def main(repo_directory: str, output: str, combined_diagram_file: str, debug: bool, concurrency: int, no_cache: bool, refresh: bool,
+         small_file_tokens: int, batch_token_budget: int, chunk_tokens: int, max_file_tokens: int, per_file_llm: bool,
+         llm_layout: bool, max_nodes: int, batch_mode: bool, batch_dir: str, batch_poll_interval: float,
+         resume: bool, prometheus_file: str, max_output_tokens: int, near_duplicate_similarity: float,
+         plan_only: bool):
     """Generate Mermaid diagrams for code files and combine them into a system diagram."""
-    if not os.getenv("OPENAI_API_KEY"):
+    if not plan_only and not os.getenv("OPENAI_API_KEY"):
         console.print("[red]Error: OPENAI_API_KEY environment variable not set[/red]")
         return
+    try:
+        get_router()
+    except ModelsFileError as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return
+
+    cache = open_cache(no_cache, refresh)
+    set_cache(cache)
+    batch_queue = BatchQueue(
+        client, batch_dir or os.path.join(output, 'batch'), batch_poll_interval,
+        on_status=lambda batch_id, status, detail: console.print(f"[cyan]Batch {batch_id}: {status} {detail}[/cyan]")
+    ) if batch_mode else None
     
     console.print("[yellow]Scanning codebase for relevant files...[/yellow]")
-    files = scan_codebase(repo_directory, debug)
+    with telemetry.stage('scan'):
+        files = scan_codebase(repo_directory, debug)
     
     if not files:
         console.print("[red]No relevant files found in the repository[/red]")
         return
     
-    diagrams = []
-    
-    with Progress() as progress:
-        task = progress.add_task("[green]Generating diagrams...", total=len(files))
-        
-        for file_path in files:
-            diagram = generate_file_diagram(file_path, debug)
-            diagrams.append(f"## Diagram for {file_path}\n\n```mermaid\n{diagram}\n```")
-            progress.update(task, advance=1)
-    
+    files = filter_skipped(
+        files, max_file_tokens,
+        on_skip=lambda file_path, reason: console.print(f"[yellow]Skipping {file_path}: {reason}[/yellow]"),
+        root=repo_directory)
+
+    if plan_only:
+        plan = Plan(cache)
+        plan_diagrams(plan, files, per_file_llm, llm_layout, repo_directory, chunk_tokens, small_file_tokens,
+                      batch_token_budget, near_duplicate_similarity, max_output_tokens)
+        for line in plan.summary(concurrency, get_limiter().rpm, get_limiter().tpm):
+            console.print(f"[cyan]{line}[/cyan]")
+        return
+
     os.makedirs(output, exist_ok=True)
-    
-    if debug: # Save individual diagrams
-        for i, diagram in enumerate(diagrams):
-            file_name = f"diagram_{i+1}.mermaid"
-            with open(os.path.join(output, file_name), 'w', encoding='utf-8') as f:
-                f.write(diagram)
-    
-    # Generate and save combined diagram
     combined_path = os.path.join(output, combined_diagram_file)
-    combine_diagrams(diagrams, combined_path, debug)
 
-    simplify_diagram(combined_path, debug)
+    if per_file_llm:
+        # Every diagram is journaled as soon as it arrives, so an interrupted run can resume
+        journal = Journal(os.path.join(output, JOURNAL_FILE), resume)
+        pending_files = [file_path for file_path in files if not journal.is_done(file_path, read_text(file_path))]
+        if resume: console.print(f"[yellow]Resuming: {len(files) - len(pending_files)} files already diagrammed[/yellow]")
+
+        # Copies of a file reuse its diagram; near-copies get it updated from their diff, which batch mode cannot wait for
+        duplicates = find_duplicates(pending_files, near_duplicate_similarity, exact_only=batch_mode)
+        if duplicates: console.print(f"[cyan]{duplicates_summary(duplicates)}[/cyan]")
+        originals = [file_path for file_path in pending_files if file_path not in duplicates]
+
+        def process_duplicate(file_path: str, duplicate) -> str:
+            representative = duplicate.representative
+            if journal.is_done(representative, read_text(representative)):
+                try:
+                    diagram = reuse_result(client, file_path, duplicate, next(journal.read([representative]))[1],
+                                           repo_directory, validate=is_valid_mermaid)
+                    if diagram is not None:
+                        return diagram
+                except Exception as e:
+                    console.print(f"[red]Error generating diagram for {file_path}: {str(e)}[/red]")
+            return generate_file_diagram(file_path, debug, chunk_tokens)
+
+        def finish_file(file_path: str, diagram: str):
+            journal.append(file_path, read_text(file_path), diagram, failed=diagram.startswith("Error generating diagram"))
+            progress.update(task, advance=1)
+
+        with telemetry.stage('per-file'), Progress() as progress:
+            task = progress.add_task("[green]Generating diagrams...", total=len(pending_files))
+        
+            if batch_queue:
+                set_batch(batch_queue)
+                batch_queue.run(
+                    originals, lambda file_path: generate_file_diagram(file_path, debug, chunk_tokens),
+                    on_done=finish_file)
+                set_batch(None)
+            else:
+                map_packed(
+                    originals,
+                    lambda file_path: generate_file_diagram(file_path, debug, chunk_tokens),
+                    lambda file_paths: generate_file_diagrams(file_paths, debug),
+                    concurrency, on_done=finish_file,
+                    small_file_tokens=small_file_tokens, batch_token_budget=batch_token_budget)
+            map_duplicates(duplicates, process_duplicate, concurrency, on_done=finish_file)
+
+        if debug: # Save individual diagrams
+            for i, (file_path, diagram) in enumerate(journal.read(files)):
+                file_name = f"diagram_{i+1}.mermaid"
+                with open(os.path.join(output, file_name), 'w', encoding='utf-8') as f:
+                    f.write(f"%% {file_path}\n{diagram}")
+    
+        # Generate and save combined diagram
+        with telemetry.stage('combine'):
+            combine_diagrams(journal.read(files), combined_path, debug)
+        journal.close()
+    else:
+        if batch_queue: console.print("[yellow]--batch only applies with --per-file-llm, the extracted diagram needs no requests[/yellow]")
+        console.print("[blue]Building system diagram from the code structure...[/blue]")
+        with telemetry.stage('extract'), Progress(disable=not llm_layout) as progress:
+            task = progress.add_task("[green]Refining diagram...", total=max_output_tokens)
+            write_static_diagram(
+                files, combined_path, llm_layout, debug, max_output_tokens,
+                on_tokens=lambda tokens: progress.update(task, completed=tokens, description=f"[green]Refining diagram: {tokens} tokens"))
+
+    with telemetry.stage('simplify'):
+        simplify_diagram(combined_path, max_nodes, debug)
+
+    if routing_summary(): console.print(f"[cyan]{routing_summary()}[/cyan]")
+    if cache: console.print(f"[cyan]{cache.summary()}[/cyan]")
+    if get_limiter().retries: console.print(f"[cyan]{get_limiter().summary()}[/cyan]")
+
+    run_report_path = os.path.join(output, RUN_REPORT_FILE)
+    telemetry.write_report(run_report_path, 'diag-gen', prometheus_file)
+    console.print(f"[cyan]Run report saved to '{run_report_path}'[/cyan]")
 
 if __name__ == '__main__':
     main()
@@ -1,15 +1,34 @@
 import os
+import re
 import click
-from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress
-from openai import OpenAI
 from dotenv import load_dotenv
 import hashlib
 
+from codernize.batch import DEFAULT_POLL_INTERVAL, BatchQueue
+from codernize.cache import open_cache
+from codernize.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAX_FILE_TOKENS, chunk_label, filter_skipped, split_content
+from codernize.classifier import DEFAULT_MIN_CONFIDENCE, ClassificationStats, classify_locally
+from codernize.dedup import (DEFAULT_NEAR_DUPLICATE_SIMILARITY, adapt_messages, duplicates_summary, find_duplicates, map_duplicates,
+                             reuse_result, rewrite_paths)
+from codernize.executor import DEFAULT_CONCURRENCY, map_ordered
+from codernize.journal import Journal
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, LazyClient, OutputTruncatedError, get_limiter, set_batch, set_cache
+from codernize.manifest import git_changed_files, is_unchanged, load_manifest, make_entry, refresh_stat, save_manifest
+from codernize.output import write_atomically
+from codernize.packing import (DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_FILE_TOKENS, batch_messages, complete_batch, map_packed,
+                              pack_small_files)
+from codernize.plan import COMPLETION_TOKENS, JSON_FORMAT, Plan, stand_in
+from codernize.reduce import DEFAULT_FAN_IN, DEFAULT_NODE_TOKEN_BUDGET, tree_reduce
+from codernize.routing import ModelsFileError, get_router, routed_chat, routed_chat_to_file, routing_summary
+from codernize.scanner import read_text, scan, set_snapshot
+from codernize.telemetry import call_site, telemetry
+from codernize.tokens import count_tokens, estimate_tokens
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = LazyClient(api_key=os.getenv("OPENAI_API_KEY"))
 
 console = Console(width=200, force_terminal=True)
 
@@ -26,6 +45,9 @@ RELEVANT_EXTENSIONS = {
     '.html',
 }
 
+RUN_REPORT_FILE = 'doc-gen-run-report.json'
+JOURNAL_FILE = 'doc-gen-journal.jsonl'
+
 VALID_CATEGORIES = {
     'API',
     'Data Model',
@@ -38,22 +60,45 @@ VALID_CATEGORIES = {
     'Documentation',
     'Other'
 }
+HEADING = re.compile(r'^#{1,6} ', re.M)
+SMALL_FILES_VALUE = 'objects with a "category" string and a "doc" Markdown string'
+
+classification_stats = ClassificationStats()
+
 def scan_codebase(directory: str, debug: bool) -> list:
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            if Path(filename).suffix in RELEVANT_EXTENSIONS:
-                files.append(os.path.join(root, filename))
-    if debug: console.print(f"[cyan]Found {len(files)} relevant files in the codebase[/cyan]")
-    return files
+    snapshot = scan(directory, RELEVANT_EXTENSIONS)
+    set_snapshot(snapshot)
+    if debug: console.print(f"[cyan]Found {len(snapshot)} relevant files in the codebase[/cyan]")
+    return snapshot.paths()
+
 
+@call_site('file_path')
+def categorize_file(file_path: str, file_content: str, min_confidence: float = DEFAULT_MIN_CONFIDENCE) -> str:
+    category, confidence = classify_locally(file_path, file_content)
+    if confidence >= min_confidence:
+        classification_stats.record(file_path, local=True)
+        return category
 
-def categorize_file(file_path: str, file_content: str) -> str:
+    classification_stats.record(file_path, local=False)
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content":
+        category = routed_chat(
+            client,
+            task='categorize',
+            messages=categorize_messages(file_path, file_content),
+            validate=lambda answer: answer in VALID_CATEGORIES,
+            temperature=0.3,
+            content=file_content,
+        )
+        # console.print(f"[cyan]Category for {file_path}: {category}[/cyan]")
+        return category if category in VALID_CATEGORIES else 'Other'
+    except Exception as e:
+        console.print(f"[red]Error categorizing {file_path}: {str(e)}[/red]")
+        return 'Other'
+
+
+def categorize_messages(file_path: str, file_content: str) -> list:
+    return [
+        {"role": "system", "content":
                     """
                     - API: REST controllers, routes, request handlers
                     - Data Model: Entity classes, value objects, enums
@@ -69,26 +114,37 @@ def categorize_file(file_path: str, file_content: str) -> str:
                     Respond with ONLY the category name, nothing else.
                     """},
 
-                {"role": "user", "content":
+        {"role": "user", "content":
                     f"""
                     File path: {file_path}
                     
                     Content:
                     {file_content}
                     """
-                }
-            ],
+        }
+    ]
+
+
+@call_site('file_path')
+def generate_short_doc(file_path: str, file_content: str, category: str, debug: bool) -> str:
+    try:
+        response = routed_chat(
+            client,
+            task='short-doc',
+            messages=short_doc_messages(file_path, file_content, category),
+            validate=lambda doc: doc.strip() != '',
             temperature=0.3,
+            content=file_content,
+            category=category,
         )
-        category = response.choices[0].message.content.strip()
-        # console.print(f"[cyan]Category for {file_path}: {category}[/cyan]")
-        return category if category in VALID_CATEGORIES else 'Other'
+        if debug: console.print(f"[cyan]Short doc generated for {file_path}[/cyan]")
+        return response
     except Exception as e:
-        console.print(f"[red]Error categorizing {file_path}: {str(e)}[/red]")
-        return 'Other'
+        console.print(f"[red]Error documenting {file_path}: {str(e)}[/red]")
+        return f"// Error documenting {file_path}"
 
 
-def generate_short_doc(file_path: str, file_content: str, category: str, debug: bool) -> str:
+def short_doc_messages(file_path: str, file_content: str, category: str) -> list:
     if category in ["API", "Data Model", "Business Logic"]:
         sys_prompt = """
             You are a documentation expert. Given a file and its category, generate a Markdown section documentation describing the file.
@@ -130,12 +186,9 @@ def generate_short_doc(file_path: str, file_content: str, category: str, debug:
         - Be structured and schematic.
         - Write only Markdown output.
         """
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-nano",
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content":
+    return [
+        {"role": "system", "content": sys_prompt},
+        {"role": "user", "content":
                     f"""
                     File path: {file_path}
                     Category: {category}
@@ -143,25 +196,91 @@ def generate_short_doc(file_path: str, file_content: str, category: str, debug:
                     Content:
                     {file_content}
                     """
-                }
-            ],
+        }
+    ]
+
+
+def document_file(file_path: str, content: str, min_confidence: float, chunk_tokens: int, debug: bool) -> tuple[str, str]:
+    """Categorize and document one file, chunk by chunk if it is oversized; returns (category, short_doc)."""
+    # The first chunk carries the package, imports and class declaration
+    chunks = split_content(file_path, content, chunk_tokens)
+    category = categorize_file(file_path, chunks[0], min_confidence)
+    short_docs = map_ordered(
+        lambda i: generate_short_doc(chunk_label(file_path, i, len(chunks)), chunks[i], category, debug),
+        range(len(chunks)), len(chunks))
+    return category, "\n\n".join(short_docs)
+
+
+@call_site()
+def document_small_files(files: list[tuple[str, str]], min_confidence: float, debug: bool) -> dict:
+    """Categorize and document several small (path, content) files in a single request.
+
+    Returns {path: (category, short_doc)} for the files the model answered properly;
+    the caller retries the others one by one.
+    """
+    local_categories, sys_prompt, entries = small_files_request(files, min_confidence)
+    results = complete_batch(
+        client,
+        model=get_router().model_for('short-doc'),
+        system_prompt=sys_prompt,
+        value_description=SMALL_FILES_VALUE,
+        files=entries,
+        validate=lambda value: isinstance(value, dict) and value.get('category') in VALID_CATEGORIES
+                               and isinstance(value.get('doc'), str) and value['doc'].strip() != '',
+    )
+    for file_path in results:
+        # The shared request is sent either way, so no call of the file's own is avoided
+        classification_stats.record(file_path, local=file_path in local_categories, call_avoided=False)
+    if debug: console.print(f"[cyan]Batch of {len(files)} files documented, {len(results)} answered[/cyan]")
+    return {file_path: (local_categories.get(file_path, value['category']), value['doc'].strip())
+            for file_path, value in results.items()}
+
+
+def small_files_request(files: list[tuple[str, str]], min_confidence: float) -> tuple[dict, str, list]:
+    """The local categories, system prompt and (path, entry) pairs of a request for several small files."""
+    local_categories = {}
+    for file_path, file_content in files:
+        category, confidence = classify_locally(file_path, file_content)
+        if confidence >= min_confidence:
+            local_categories[file_path] = category
+
+    sys_prompt = f"""
+        You are a documentation expert. For each file, pick its category and generate a short Markdown section summarizing the file.
+
+        Categories: {', '.join(sorted(VALID_CATEGORIES))}.
+
+        Guidelines:
+        - Focus only on public-facing parts (e.g., method names, class signatures, config sections); DO NOT INCLUDE CODE IMPLEMENTATION.
+        - Keep it short and clear.
+        - Be structured and schematic.
+        - Keep the category given for a file, if any.
+        """
+    entries = [(file_path, (f"Category: {local_categories[file_path]}\n" if file_path in local_categories else "") + file_content)
+               for file_path, file_content in files]
+    return local_categories, sys_prompt, entries
+
+
+@call_site()
+def generate_combined_documentation_summary(short_docs: list[str], debug: bool, scope: str = None) -> str:
+    """Use GPT to summarize and structure the documentation from combined short docs."""
+    if debug: console.print(f"[blue]Generating a documentation summary from {len(short_docs)} docs{f' in {scope}' if scope else ''}...[/blue]")
+    try:
+        response = routed_chat(
+            client,
+            task='combine-docs',
+            messages=combine_messages(short_docs, scope),
+            validate=has_heading,
             temperature=0.3,
         )
-        if debug: console.print(f"[cyan]Short doc generated for {file_path}[/cyan]")
-        return response.choices[0].message.content.strip()
+        return response
     except Exception as e:
-        console.print(f"[red]Error documenting {file_path}: {str(e)}[/red]")
-        return f"// Error documenting {file_path}"
+        console.print(f"[red]Error generating combined documentation summary: {str(e)}[/red]")
+        return "\n\n".join(short_docs)
 
 
-def generate_combined_documentation_summary(short_docs: list[str], debug: bool) -> str:
-    """Use GPT to summarize and structure the documentation from combined short docs."""
-    if debug: console.print("[blue]Generating a documentation summary from all short docs...[/blue]")
-    try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # Or other reasoning models
-            messages=[
-                {"role": "system", "content": """
+def combine_messages(short_docs: list[str], scope: str = None) -> list:
+    return [
+        {"role": "system", "content": """
                 Given a list of small documentation snippets of a project, combine them into a single big documentation file.
                 
                 Guidelines:
@@ -169,54 +288,162 @@ def generate_combined_documentation_summary(short_docs: list[str], debug: bool)
                 - Be structured and schematic.
                 - Reserve all technical detail—add nothing, omit nothing.
                 """},
-                {"role": "user", "content": "\n\n".join(short_docs)}
-            ],
-            temperature=0.3,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        console.print(f"[red]Error generating combined documentation summary: {str(e)}[/red]")
-        return "\n\n".join(short_docs)
+        {"role": "user", "content": (f"Scope: {scope}\n\n" if scope else "") + "\n\n".join(short_docs)}
+    ]
+
+
+def has_heading(doc: str) -> bool:
+    return HEADING.search(doc) is not None
 
 
 def hash_content(content: str) -> str:
     return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
-def clean_up_documentation(raw_doc: str, debug: bool) -> str:
-    """Use GPT to clean up and format the final Markdown content."""
+@call_site()
+def clean_up_documentation(raw_doc: str, output_file: str, max_output_tokens: int, debug: bool, on_tokens=None):
+    """Use GPT to clean up and format the final Markdown content, streaming it into the output file."""
     if debug: console.print("[blue]Running final cleanup on documentation...[/blue]")
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini", # Or other reasoning models
-            messages=[
-                {"role": "system", "content": """
+        routed_chat_to_file(
+            client,
+            task='cleanup',
+            messages=cleanup_messages(raw_doc),
+            output_file=output_file,
+            validate=has_heading,
+            temperature=0.3,
+            max_tokens=max_output_tokens,
+            on_tokens=on_tokens,
+        )
+    except OutputTruncatedError as e:
+        # A cut-off cleanup would lose information, the raw doc keeps it all
+        console.print(f"[yellow]{str(e)}, saving the documentation without cleanup[/yellow]")
+        write_atomically(output_file, raw_doc)
+    except Exception as e:
+        console.print(f"[red]Error cleaning up final documentation: {str(e)}[/red]")
+        write_atomically(output_file, raw_doc)  # Fallback to raw if something fails
+
+def cleanup_messages(raw_doc: str) -> list:
+    return [
+        {"role": "system", "content": """
                 Given a Markdown document that serves as a project’s documentation, re-organize its content to improve the overall structure, sectioning, and flow.
                 Your goal is to make the document more logically organized, readable, and suitable for publication.
                 
                 - Write only Markdown output.
                 - Do not remove any information.
                 """},
-                {"role": "user", "content": f"""Here is the generated documentation:
+        {"role": "user", "content": f"""Here is the generated documentation:
                 {raw_doc}
                 """}
-            ],
-            temperature=0.3,
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        console.print(f"[red]Error cleaning up final documentation: {str(e)}[/red]")
-        return raw_doc  # Fallback to raw if something fails
+    ]
+
+def combine_short_docs(leaves: list, fan_in: int, node_token_budget: int, concurrency: int, debug: bool) -> str:
+    """Combine (path, short_doc) pairs bottom-up, package by package, into one document."""
+    return tree_reduce(
+        leaves, lambda scope, docs: generate_combined_documentation_summary(docs, debug, scope),
+        fan_in, node_token_budget, concurrency,
+        on_level=(lambda depth, nodes: console.print(f"[cyan]Combine level {depth}: {nodes} nodes[/cyan]")) if debug else None)
+
+def clean_up_within_budget(combined_doc: str, node_token_budget: int, output_file: str, max_output_tokens: int,
+                           debug: bool, on_tokens=None):
+    if estimate_tokens(combined_doc) > node_token_budget:
+        # The cleanup prompt would exceed the budget and fall back to the raw doc anyway
+        console.print("[yellow]Combined documentation exceeds the node token budget, skipping cleanup[/yellow]")
+        write_atomically(output_file, combined_doc)
+        return
+    console.print("[blue]Cleaning up final documentation...[/blue]")
+    clean_up_documentation(combined_doc, output_file, max_output_tokens, debug, on_tokens)
+
+def plan_documentation(plan: Plan, files: list, stale_files: list, unchanged_docs: dict, directory: str,
+                       min_confidence: float, chunk_tokens: int, small_file_tokens: int, batch_token_budget: int,
+                       near_duplicate_similarity: float, fan_in: int, node_token_budget: int, max_output_tokens: int):
+    """Add the requests a run would send for `stale_files` to `plan`; the other files keep their `unchanged_docs`."""
+    duplicates = find_duplicates(stale_files, near_duplicate_similarity)
+    originals = [file_path for file_path in stale_files if file_path not in duplicates]
+    short_docs = {}
+
+    plan.begin('per-file')
+    batches, singles = pack_small_files(originals, small_file_tokens, batch_token_budget)
+    for batch in batches:
+        _, sys_prompt, entries = small_files_request([(file_path, read_text(file_path)) for file_path in batch], min_confidence)
+        plan.add('short-doc', batch_messages(sys_prompt, SMALL_FILES_VALUE, entries), model=get_router().model_for('short-doc'),
+                 response_format=JSON_FORMAT, completion_tokens=COMPLETION_TOKENS['short-doc'] * len(batch))
+        short_docs.update((file_path, stand_in(COMPLETION_TOKENS['short-doc'])) for file_path in batch)
+    for file_path in singles:
+        chunks = split_content(file_path, read_text(file_path), chunk_tokens)
+        category, confidence = classify_locally(file_path, chunks[0])
+        if confidence < min_confidence:
+            plan.add('categorize', categorize_messages(file_path, chunks[0]), content=chunks[0])
+        short_docs[file_path] = "\n\n".join(
+            plan.add('short-doc', short_doc_messages(chunk_label(file_path, i, len(chunks)), chunk, category),
+                     content=chunk, category=category)
+            for i, chunk in enumerate(chunks))
+
+    plan.begin('near-duplicates')
+    # Near-copies first, so copies of a near-copy find its short doc
+    for file_path, duplicate in sorted(duplicates.items(), key=lambda item: item[1].exact):
+        representative_doc = short_docs[duplicate.representative]
+        if duplicate.exact:
+            short_docs[file_path] = rewrite_paths(representative_doc, duplicate.representative, file_path, directory)
+        else:
+            short_docs[file_path] = plan.add('near-duplicate', content=duplicate.diff, messages=adapt_messages(
+                representative_doc, duplicate.representative, file_path, duplicate.diff))
+
+    leaves = [(os.path.relpath(file_path, directory), short_docs.get(file_path, unchanged_docs.get(file_path)))
+              for file_path in files if file_path in short_docs or file_path in unchanged_docs]
+    combined_doc = tree_reduce(
+        leaves, lambda scope, docs: plan.add('combine-docs', combine_messages(docs, scope)), fan_in, node_token_budget,
+        on_level=lambda depth, nodes: plan.begin(f'combine level {depth + 1}'))
+
+    plan.begin('cleanup')
+    if estimate_tokens(combined_doc) <= node_token_budget:
+        plan.add('cleanup', cleanup_messages(combined_doc), completion_tokens=min(count_tokens(combined_doc), max_output_tokens))
 
 @click.command()
 @click.argument('directory', required=False, default='/Users/dre/dev/jboss-eap-quickstarts/kitchensink', type=click.Path(exists=True))
 @click.option('--output', '-o', default='docs', help='Output directory for documentation')
 @click.option('--doc-file', '-doc', default='project.md', help='Name of the documentation file')
 @click.option('--debug', '-d', is_flag=True, help='Enable debug output')
-def main(directory: str, output: str, doc_file: str, debug: bool):
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True, help='Number of files processed in parallel')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the response cache')
+@click.option('--refresh', is_flag=True, help='Ignore cached responses and overwrite them with fresh ones')
+@click.option('--since', default=None, help='Only regenerate files changed since this git revision')
+@click.option('--full', is_flag=True, help='Ignore the manifest and regenerate every file')
+@click.option('--min-confidence', default=DEFAULT_MIN_CONFIDENCE, show_default=True, help='Confidence needed to accept the local file classifier (above 1 always asks the LLM)')
+@click.option('--small-file-tokens', default=DEFAULT_SMALL_FILE_TOKENS, show_default=True, help='Files up to this many tokens are packed into shared requests (0 disables packing)')
+@click.option('--batch-token-budget', default=DEFAULT_BATCH_TOKEN_BUDGET, show_default=True, help='Maximum tokens of files packed into one request')
+@click.option('--chunk-tokens', default=DEFAULT_CHUNK_TOKENS, show_default=True, help='Larger files are split into chunks of this many tokens')
+@click.option('--max-file-tokens', default=DEFAULT_MAX_FILE_TOKENS, show_default=True, help='Files larger than this many tokens are skipped')
+@click.option('--fan-in', default=DEFAULT_FAN_IN, show_default=True, type=click.IntRange(min=2), help='Maximum number of docs combined in one summary call')
+@click.option('--node-token-budget', default=DEFAULT_NODE_TOKEN_BUDGET, show_default=True, help='Maximum input tokens of one summary call')
+@click.option('--batch', 'batch_mode', is_flag=True, help='Send the per-file requests through the OpenAI Batch API (cheaper, asynchronous, resumable)')
+@click.option('--batch-dir', default=None, help='Directory holding the batch requests, state and results (default: <output>/batch)')
+@click.option('--batch-poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True, help='Seconds between batch status checks')
+@click.option('--resume', is_flag=True, help='Skip files whose result is already in the journal of an interrupted run')
+@click.option('--prometheus-file', default=None, help='Also write the run metrics to this file for the Prometheus textfile collector')
+@click.option('--max-output-tokens', default=DEFAULT_MAX_OUTPUT_TOKENS, show_default=True, help='Cap on the tokens of the streamed cleanup answer')
+@click.option('--near-duplicate-similarity', default=DEFAULT_NEAR_DUPLICATE_SIMILARITY, show_default=True, help='Similarity above which a file reuses the short doc of a near-copy (above 1 only reuses exact copies)')
+@click.option('--plan', 'plan_only', is_flag=True, help='Print the requests, tokens, cost and time of the run without calling the model')
+def main(directory: str, output: str, doc_file: str, debug: bool, concurrency: int, no_cache: bool, refresh: bool,
+         since: str, full: bool, min_confidence: float, small_file_tokens: int, batch_token_budget: int,
+         chunk_tokens: int, max_file_tokens: int, fan_in: int, node_token_budget: int, batch_mode: bool, batch_dir: str,
+         batch_poll_interval: float, resume: bool, prometheus_file: str, max_output_tokens: int,
+         near_duplicate_similarity: float, plan_only: bool):
     """Generate and maintain documentation for a codebase."""
-    if not os.getenv("OPENAI_API_KEY"):
+    if not plan_only and not os.getenv("OPENAI_API_KEY"):
         console.print("[red]Error: OPENAI_API_KEY environment variable not set[/red]")
         return
+    try:
+        get_router()
+    except ModelsFileError as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return
+
+    cache = open_cache(no_cache, refresh)
+    set_cache(cache)
+    batch_queue = BatchQueue(
+        client, batch_dir or os.path.join(output, 'batch'), batch_poll_interval,
+        on_status=lambda batch_id, status, detail: console.print(f"[cyan]Batch {batch_id}: {status} {detail}[/cyan]")
+    ) if batch_mode else None
 
     debug_dir = os.path.join(output, "debug")
     short_doc_dir = os.path.join(debug_dir, "short_docs")
@@ -226,54 +453,161 @@ def main(directory: str, output: str, doc_file: str, debug: bool):
     doc_path = os.path.join(output, doc_file)
 
     console.print("[yellow]Scanning codebase...[/yellow]")
-    files = scan_codebase(directory, debug)
+    with telemetry.stage('scan'):
+        files = scan_codebase(directory, debug)
 
     if not files:
         console.print("[red]No relevant files found in the specified directory[/red]")
         return
     
-    short_docs = []
-
-    with Progress() as progress:
-        task = progress.add_task("[green]Generating documentation for files...", total=len(files))
-
-        # Step 1: Short doc generation per file
-        for file_path in files:
-            try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    content = f.read()
-
-                category = categorize_file(file_path, content)
-                short_doc = generate_short_doc(file_path, content, category, debug)
+    # Files already in the manifest and untouched since the last run keep their short doc
+    manifest = {} if full else load_manifest(output)
+    changed = git_changed_files(directory, since) if since and not full else None
+
+    def relative(file_path: str) -> str:
+        return os.path.relpath(file_path, directory)
+
+    def needs_update(file_path: str) -> bool:
+        entry = manifest.get(relative(file_path))
+        if entry is None:
+            return True
+        if changed is not None:
+            return os.path.abspath(file_path) in changed
+        return not is_unchanged(entry, file_path)
+
+    stale_files = [file_path for file_path in files if needs_update(file_path)]
+    console.print(f"[yellow]{len(stale_files)} new or modified files, {len(files) - len(stale_files)} unchanged[/yellow]")
+
+    def finish_file(file_path: str, content: str, category: str, short_doc: str) -> dict:
+        if debug: # Save short doc for debugging
+            short_doc_filename = hash_content(file_path) + "_short.md"
+            with open(os.path.join(short_doc_dir, short_doc_filename), 'w', encoding='utf-8') as f:
+                f.write(short_doc)
+
+        return make_entry(file_path, content, category=category, short_doc=short_doc)
+
+    def process_file(file_path: str):
+        try:
+            content = read_text(file_path)
+
+            category, short_doc = document_file(file_path, content, min_confidence, chunk_tokens, debug)
+            return finish_file(file_path, content, category, short_doc)
+
+        except Exception as e:
+            console.print(f"[red]Error processing {file_path}: {str(e)}[/red]")
+            return None
+
+    def process_batch(file_paths: list) -> dict:
+        try:
+            contents = {}
+            for file_path in file_paths:
+                contents[file_path] = read_text(file_path)
+
+            documented = document_small_files(list(contents.items()), min_confidence, debug)
+            return {file_path: finish_file(file_path, contents[file_path], category, short_doc)
+                    for file_path, (category, short_doc) in documented.items()}
+
+        except Exception as e:
+            console.print(f"[red]Error processing batch: {str(e)}[/red]")
+            return {}
+
+    files_to_process = filter_skipped(
+        stale_files, max_file_tokens,
+        on_skip=lambda file_path, reason: console.print(f"[yellow]Skipping {file_path}: {reason}[/yellow]"),
+        root=directory)
+
+    if plan_only:
+        plan = Plan(cache)
+        unchanged_docs = {file_path: manifest[relative(file_path)]['short_doc'] for file_path in files if file_path not in stale_files}
+        plan_documentation(plan, files, files_to_process, unchanged_docs, directory, min_confidence, chunk_tokens,
+                           small_file_tokens, batch_token_budget, near_duplicate_similarity, fan_in, node_token_budget,
+                           max_output_tokens)
+        for line in plan.summary(concurrency, get_limiter().rpm, get_limiter().tpm):
+            console.print(f"[cyan]{line}[/cyan]")
+        return
 
-                if debug: # Save short doc for debugging
-                    short_doc_filename = hash_content(file_path) + "_short.md"
-                    with open(os.path.join(short_doc_dir, short_doc_filename), 'w', encoding='utf-8') as f:
-                        f.write(short_doc)
+    # Every manifest entry is journaled as soon as it arrives, so an interrupted run can resume
+    journal = Journal(os.path.join(output, JOURNAL_FILE), resume)
+    pending_files = [file_path for file_path in files_to_process if not journal.is_done(file_path, read_text(file_path))]
+    if resume: console.print(f"[yellow]Resuming: {len(files_to_process) - len(pending_files)} files already documented[/yellow]")
 
-                short_docs.append(short_doc)
-                progress.update(task, advance=1)
+    # Copies of a file reuse its short doc; near-copies get it updated from their diff, which batch mode cannot wait for
+    duplicates = find_duplicates(pending_files, near_duplicate_similarity, exact_only=batch_mode)
+    if duplicates: console.print(f"[cyan]{duplicates_summary(duplicates)}[/cyan]")
+    originals = [file_path for file_path in pending_files if file_path not in duplicates]
 
+    def process_duplicate(file_path: str, duplicate) -> dict:
+        representative = duplicate.representative
+        if journal.is_done(representative, read_text(representative)):
+            entry = next(journal.read([representative]))[1]
+            try:
+                short_doc = reuse_result(client, file_path, duplicate, entry['short_doc'], directory,
+                                         validate=lambda doc: doc.strip() != '')
+                if short_doc is not None:
+                    return finish_file(file_path, read_text(file_path), entry['category'], short_doc)
             except Exception as e:
                 console.print(f"[red]Error processing {file_path}: {str(e)}[/red]")
-                progress.update(task, advance=1)  # Still advance to not block progress bar
-                continue
+        return process_file(file_path)
+
+    def journal_file(file_path: str, entry: dict):
+        failed = entry is None or entry['short_doc'].startswith("// Error documenting")
+        journal.append(file_path, read_text(file_path), entry, failed=failed)
+        progress.update(task, advance=1)
+
+    with telemetry.stage('per-file'), Progress() as progress:
+        task = progress.add_task("[green]Generating documentation for files...", total=len(pending_files))
+
+        # Step 1: Short doc generation per file, small files packed into shared requests
+        if batch_queue:
+            set_batch(batch_queue)
+            batch_queue.run(originals, process_file, on_done=journal_file)
+            set_batch(None)
+        else:
+            map_packed(originals, process_file, process_batch, concurrency, on_done=journal_file,
+                       small_file_tokens=small_file_tokens, batch_token_budget=batch_token_budget)
+        map_duplicates(duplicates, process_duplicate, concurrency, on_done=journal_file)
+
+    # Deleted files drop out here because only the current scan is carried over
+    updated = dict.fromkeys(stale_files)
+    updated.update(journal.read(files_to_process))
+    journal.close()
+    entries = {}
+    leaves = []
+    for file_path in files:
+        entry = updated[file_path] if file_path in updated else refresh_stat(manifest[relative(file_path)], file_path)
+        if entry is None:
+            continue
+        leaves.append((relative(file_path), entry['short_doc']))
+        if not entry['short_doc'].startswith("// Error documenting"):
+            entries[relative(file_path)] = entry
+    save_manifest(output, entries)
 
     # Step 2: Combine documentation
     console.print("[blue]Combining documentation snippets into a single document...[/blue]")
-    combined_doc = generate_combined_documentation_summary(short_docs, debug)
+    with telemetry.stage('combine'):
+        combined_doc = combine_short_docs(leaves, fan_in, node_token_budget, concurrency, debug)
     if debug:
         raw_doc_debug_path = os.path.join(debug_dir, 'raw_' + doc_file)
         with open(raw_doc_debug_path, 'w', encoding='utf-8') as f:
             f.write(combined_doc)
 
-    # Step 3: Clean up final doc
-    console.print("[blue]Cleaning up final documentation...[/blue]")
-    cleaned_doc = clean_up_documentation(combined_doc, debug)
-    with open(doc_path, 'w', encoding='utf-8') as f:
-        f.write(cleaned_doc)
+    # Step 3: Clean up final doc, written to the doc file as it streams in
+    with telemetry.stage('cleanup'), Progress() as progress:
+        task = progress.add_task("[green]Cleaning up documentation...", total=max_output_tokens)
+        clean_up_within_budget(
+            combined_doc, node_token_budget, doc_path, max_output_tokens, debug,
+            on_tokens=lambda tokens: progress.update(task, completed=tokens, description=f"[green]Cleaning up documentation: {tokens} tokens"))
 
     console.print(f"[green]Documentation saved to '{doc_path}'[/green]")
 
+    console.print(f"[cyan]{classification_stats.summary()}[/cyan]")
+    if routing_summary(): console.print(f"[cyan]{routing_summary()}[/cyan]")
+    if cache: console.print(f"[cyan]{cache.summary()}[/cyan]")
+    if get_limiter().retries: console.print(f"[cyan]{get_limiter().summary()}[/cyan]")
+
+    run_report_path = os.path.join(output, RUN_REPORT_FILE)
+    telemetry.write_report(run_report_path, 'doc-gen', prometheus_file)
+    console.print(f"[cyan]Run report saved to '{run_report_path}'[/cyan]")
+
 if __name__ == '__main__':
     main()
\ No newline at end of file
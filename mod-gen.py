@@ -1,16 +1,42 @@
 import os
+import re
+from typing import Iterable
 import click
-from pathlib import Path
 from rich.console import Console
 from rich.progress import Progress
-from openai import OpenAI
 from dotenv import load_dotenv
 
+from codernize.batch import DEFAULT_POLL_INTERVAL, BatchQueue
+from codernize.cache import open_cache
+from codernize.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAX_FILE_TOKENS, chunk_label, filter_skipped, split_content
+from codernize.dedup import (DEFAULT_NEAR_DUPLICATE_SIMILARITY, adapt_messages, duplicates_summary, find_duplicates, map_duplicates,
+                             reuse_result, rewrite_paths)
+from codernize.executor import DEFAULT_CONCURRENCY, map_ordered
+from codernize.journal import Journal
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, LazyClient, OutputTruncatedError, get_limiter, set_batch, set_cache
+from codernize.output import write_atomically
+from codernize.packing import (DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_FILE_TOKENS, batch_messages, complete_batch, map_packed,
+                              pack_small_files)
+from codernize.plan import COMPLETION_TOKENS, JSON_FORMAT, Plan, stand_in
+from codernize.retrieval import DEFAULT_CONTEXT_TOKENS, DEFAULT_TOP_K, DocIndex
+from codernize.routing import ModelsFileError, get_router, routed_chat, routed_chat_to_file, routing_summary
+from codernize.scanner import read_text, scan, set_snapshot
+from codernize.suggestions import DEFAULT_SIMILARITY, cluster_suggestions, has_suggestions, parse_analysis, render_cluster
+from codernize.telemetry import call_site, telemetry
+from codernize.triage import inventory, rule_analysis, triage_file
+
 load_dotenv()
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+client = LazyClient(api_key=os.getenv("OPENAI_API_KEY"))
 console = Console(width=200, force_terminal=True)
 
+RUN_REPORT_FILE = 'mod-gen-run-report.json'
+JOURNAL_FILE = 'mod-gen-journal.jsonl'
+INVENTORY_FILE = 'migration-inventory.md'
+REPORT_SECTIONS = ('roadmap', 'benefit', 'risk')
+HEADING = re.compile(r'^#{1,6} (.*)$', re.M)
+ANALYSIS_VALUE = "Markdown strings with the analysis of that file"
+
 RELEVANT_EXTENSIONS = {
     '.java',        # Core source code: classes, controllers, services, models, etc.
     '.xml',         # Configuration files (e.g., Spring beans, persistence.xml, pom.xml)
@@ -23,24 +49,12 @@ RELEVANT_EXTENSIONS = {
 }
 
 def scan_codebase(directory: str, debug: bool) -> list:
-    files = []
-    for root, _, filenames in os.walk(directory):
-        for filename in filenames:
-            if Path(filename).suffix in RELEVANT_EXTENSIONS:
-                files.append(os.path.join(root, filename))
-    if debug: console.print(f"[cyan]Found {len(files)} relevant files in the codebase[/cyan]")
-    return files
-
-def analyze_java_file(doc_file: str, file_path: str, debug: bool) -> str:
-    """Analyze a Java file and suggest Spring Boot modernization opportunities."""
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
+    snapshot = scan(directory, RELEVANT_EXTENSIONS)
+    set_snapshot(snapshot)
+    if debug: console.print(f"[cyan]Found {len(snapshot)} relevant files in the codebase[/cyan]")
+    return snapshot.paths()
 
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": """
+ANALYSIS_PROMPT = """
                 You are a Java modernization expert. Analyze the provided Java file and suggest specific modernization opportunities for Spring Boot migration.
                 
                 For each suggestion, provide:
@@ -58,35 +72,149 @@ def analyze_java_file(doc_file: str, file_path: str, debug: bool) -> str:
                 - Database access patterns
                 - Security implementations
                 - Testing approaches
-                """},
-                {"role": "user", "content": f"""
-                Documentation of the project: {doc_file}
-                File path: {file_path}
-                
-                Content:
-                {content}
-                """}
-            ],
+                """
+
+
+def analyze_java_file(doc_index: DocIndex, file_path: str, debug: bool, chunk_tokens: int = DEFAULT_CHUNK_TOKENS) -> str:
+    """Analyze a Java file and suggest Spring Boot modernization opportunities."""
+    try:
+        content = read_text(file_path)
+    except Exception as e:
+        console.print(f"[red]Error analyzing {file_path}: {str(e)}[/red]")
+        return f"Error analyzing {file_path}: {str(e)}"
+
+    # Oversized files are analyzed chunk by chunk in parallel
+    chunks = split_content(file_path, content, chunk_tokens)
+    analyses = map_ordered(lambda i: analyze_content(doc_index.context_for(file_path, chunks[i]),
+                                                     chunk_label(file_path, i, len(chunks)), chunks[i], debug),
+                           range(len(chunks)), len(chunks))
+    return "\n\n".join(analyses)
+
+@call_site('file_path')
+def analyze_content(doc_file: str, file_path: str, content: str, debug: bool) -> str:
+    """Ask the model for the modernization opportunities in one file (or one chunk of it)."""
+    try:
+        response = routed_chat(
+            client,
+            task='analysis',
+            messages=analysis_messages(doc_file, file_path, content),
+            validate=has_suggestions,
             temperature=0.3,
+            content=content,
         )
         
         if debug: console.print(f"[cyan]Analysis completed for {file_path}[/cyan]")
-        return response.choices[0].message.content.strip()
+        return response
     
     except Exception as e:
         console.print(f"[red]Error analyzing {file_path}: {str(e)}[/red]")
         return f"Error analyzing {file_path}: {str(e)}"
 
-def generate_modernization_report(analyses: list, output_file: str, debug: bool):
-    """Generate a combined modernization report from all analyses."""
+def analysis_messages(doc_file: str, file_path: str, content: str) -> list:
+    return [
+        {"role": "system", "content": ANALYSIS_PROMPT},
+        {"role": "user", "content": f"""
+                Documentation of the project: {doc_file}
+                File path: {file_path}
+                
+                Content:
+                {content}
+                """}
+    ]
+
+@call_site()
+def analyze_java_files(doc_index: DocIndex, file_paths: list, debug: bool) -> dict:
+    """Analyze several small files in one request; returns {path: analysis} for the files answered properly."""
+    try:
+        files = []
+        for file_path in file_paths:
+            files.append((file_path, read_text(file_path)))
+
+        analyses = complete_batch(
+            client,
+            model=get_router().model_for('analysis'),
+            system_prompt=ANALYSIS_PROMPT,
+            value_description=ANALYSIS_VALUE,
+            files=files,
+            validate=lambda value: isinstance(value, str) and has_suggestions(value),
+            header=packed_header(doc_index, files),
+        )
+        if debug: console.print(f"[cyan]Batch of {len(files)} files analyzed, {len(analyses)} answered[/cyan]")
+        return {file_path: analysis.strip() for file_path, analysis in analyses.items()}
+
+    except Exception as e:
+        console.print(f"[red]Error analyzing batch: {str(e)}[/red]")
+        return {}
+
+def packed_header(doc_index: DocIndex, files: list) -> str:
+    """The documentation sections relevant to several (path, content) files, ahead of them in one request."""
+    doc_context = doc_index.context_for(" ".join(file_path for file_path, _ in files), "\n".join(content for _, content in files))
+    return f"Documentation of the project: {doc_context}\n\n"
+
+def triage_files(file_paths: list, repo_directory: str, inventory_file: str) -> dict:
+    """Match the triage rules against every file and write the migration inventory; returns {path: Triage}."""
+    triaged = {file_path: triage_file(file_path, read_text(file_path)) for file_path in file_paths}
+    write_atomically(inventory_file, inventory(triaged, repo_directory))
+    needs_llm = sum(triage.needs_llm for triage in triaged.values())
+    resolved = sum(triage.relevant and not triage.needs_llm for triage in triaged.values())
+    console.print(f"[cyan]Triage: {needs_llm} files need analysis, {resolved} resolved by rules, "
+                  f"{len(triaged) - needs_llm - resolved} without Java EE patterns[/cyan]")
+    console.print(f"[cyan]Migration inventory saved to '{inventory_file}'[/cyan]")
+    return triaged
+
+def aggregate_analyses(analyses: Iterable[tuple], similarity: float, debug: bool) -> list:
+    """Merge the near-duplicate suggestions of the (path, analysis) pairs; returns one Markdown section per cluster."""
+    suggestions = []
+    analyzed = 0
+    for file_path, analysis in analyses:
+        if analysis.startswith("Error analyzing"):
+            continue
+        analyzed += 1
+        suggestions.extend(parse_analysis(file_path, analysis))
+    clusters = cluster_suggestions(suggestions, similarity)
+    console.print(f"[cyan]{len(suggestions)} suggestions from {analyzed} files merged into {len(clusters)}[/cyan]")
+    if debug:
+        for cluster in clusters[:10]:
+            console.print(f"[cyan]  {len(cluster.files)} files: {cluster.title}[/cyan]")
+    return [render_cluster(cluster) for cluster in clusters]
+
+def has_report_sections(report: str) -> bool:
+    """Whether the report has the roadmap, benefits and risks sections the prompt asks for."""
+    headings = ' '.join(HEADING.findall(report)).lower()
+    return all(section in headings for section in REPORT_SECTIONS)
+
+@call_site()
+def generate_modernization_report(analyses: Iterable[str], output_file: str, debug: bool,
+                                  max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS, on_tokens=None):
+    """Generate a combined modernization report from all analyses, streaming it into the output file."""
     if debug: console.print("[blue]Generating modernization report...[/blue]")
     
     try:
-        response = client.chat.completions.create(
-            model="gpt-4.1-mini",
-            messages=[
-                {"role": "system", "content": """
+        routed_chat_to_file(
+            client,
+            task='report',
+            messages=report_messages(analyses),
+            output_file=output_file,
+            validate=has_report_sections,
+            temperature=0.3,
+            max_tokens=max_output_tokens,
+            on_tokens=on_tokens,
+        )
+            
+        if debug:
+            console.print(f"[green]Report generated successfully: {output_file}[/green]")
+            
+    except OutputTruncatedError as e:
+        console.print(f"[yellow]{str(e)}, the modernization report is incomplete[/yellow]")
+        write_atomically(output_file, e.content)
+    except Exception as e:
+        console.print(f"[red]Error generating modernization report: {str(e)}[/red]")
+
+def report_messages(analyses: Iterable[str]) -> list:
+    return [
+        {"role": "system", "content": """
                 You are a technical documentation expert. Create a comprehensive modernization report from the provided analyses.
+                Each suggestion lists the files it applies to; the same advice for several files was merged into one suggestion.
                 
                 Guidelines:
                 - Organize suggestions by category (e.g., DI, Security, Testing)
@@ -95,21 +223,47 @@ def generate_modernization_report(analyses: list, output_file: str, debug: bool)
                 - Add a summary of benefits and risks
                 - Format in clear Markdown with proper sections
                 """},
-                {"role": "user", "content": "\n\n".join(analyses)}
-            ],
-            temperature=0.3,
-        )
-        
-        report = response.choices[0].message.content.strip()
-        
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(report)
-            
-        if debug:
-            console.print(f"[green]Report generated successfully: {output_file}[/green]")
-            
-    except Exception as e:
-        console.print(f"[red]Error generating modernization report: {str(e)}[/red]")
+        {"role": "user", "content": "\n\n".join(analyses)}
+    ]
+
+def plan_analysis(plan: Plan, doc_index: DocIndex, pending_files: list, rule_analyses: dict, directory: str,
+                  chunk_tokens: int, small_file_tokens: int, batch_token_budget: int, similarity: float,
+                  near_duplicate_similarity: float, max_output_tokens: int):
+    """Add the requests a run would send for `pending_files` to `plan`; the rules answer `rule_analyses`."""
+    duplicates = find_duplicates(pending_files, near_duplicate_similarity)
+    originals = [file_path for file_path in pending_files if file_path not in duplicates]
+    analyses = {}
+
+    plan.begin('per-file')
+    batches, singles = pack_small_files(originals, small_file_tokens, batch_token_budget)
+    for batch in batches:
+        files = [(file_path, read_text(file_path)) for file_path in batch]
+        plan.add('analysis', batch_messages(ANALYSIS_PROMPT, ANALYSIS_VALUE, files, packed_header(doc_index, files)),
+                 model=get_router().model_for('analysis'), response_format=JSON_FORMAT,
+                 completion_tokens=COMPLETION_TOKENS['analysis'] * len(batch))
+        analyses.update((file_path, stand_in(COMPLETION_TOKENS['analysis'])) for file_path in batch)
+    for file_path in singles:
+        chunks = split_content(file_path, read_text(file_path), chunk_tokens)
+        analyses[file_path] = "\n\n".join(
+            plan.add('analysis', analysis_messages(doc_index.context_for(file_path, chunk), chunk_label(file_path, i, len(chunks)), chunk),
+                     content=chunk)
+            for i, chunk in enumerate(chunks))
+
+    plan.begin('near-duplicates')
+    # Near-copies first, so copies of a near-copy find its analysis
+    for file_path, duplicate in sorted(duplicates.items(), key=lambda item: item[1].exact):
+        representative_analysis = analyses[duplicate.representative]
+        if duplicate.exact:
+            analyses[file_path] = rewrite_paths(representative_analysis, duplicate.representative, file_path, directory)
+        else:
+            analyses[file_path] = plan.add('near-duplicate', content=duplicate.diff, messages=adapt_messages(
+                representative_analysis, duplicate.representative, file_path, duplicate.diff))
+
+    # Stand-ins cannot be merged like real suggestions, so the analyzed files count in full: an upper bound
+    rule_suggestions = [suggestion for file_path, analysis in rule_analyses.items() for suggestion in parse_analysis(file_path, analysis)]
+    report_input = [render_cluster(cluster) for cluster in cluster_suggestions(rule_suggestions, similarity)] + list(analyses.values())
+    plan.begin('report')
+    plan.add('report', report_messages(report_input), completion_tokens=min(COMPLETION_TOKENS['report'], max_output_tokens))
 
 @click.command()
 @click.argument('doc-file', required=True, default='/Users/dre/dev/interview/codernize-ai/docs/output.md', type=click.Path(exists=True))
@@ -117,34 +271,158 @@ def generate_modernization_report(analyses: list, output_file: str, debug: bool)
 @click.option('--output', '-o', default='docs', help='Output directory for report')
 @click.option('--modernization-report-file', '-report', default='modernization-report.md', help='Output file for modernization report')
 @click.option('--debug', '-d', is_flag=True, help='Enable debug output')
-def main(doc_file: str, repo_directory: str, output: str, modernization_report_file: str, debug: bool):
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True, help='Number of files analyzed in parallel')
+@click.option('--no-cache', is_flag=True, help='Do not read or write the response cache')
+@click.option('--refresh', is_flag=True, help='Ignore cached responses and overwrite them with fresh ones')
+@click.option('--small-file-tokens', default=DEFAULT_SMALL_FILE_TOKENS, show_default=True, help='Files up to this many tokens are packed into shared requests (0 disables packing)')
+@click.option('--batch-token-budget', default=DEFAULT_BATCH_TOKEN_BUDGET, show_default=True, help='Maximum tokens of files packed into one request')
+@click.option('--chunk-tokens', default=DEFAULT_CHUNK_TOKENS, show_default=True, help='Larger files are split into chunks of this many tokens')
+@click.option('--max-file-tokens', default=DEFAULT_MAX_FILE_TOKENS, show_default=True, help='Files larger than this many tokens are skipped')
+@click.option('--doc-top-k', default=DEFAULT_TOP_K, show_default=True, help='Number of documentation sections sent with each file')
+@click.option('--doc-context-tokens', default=DEFAULT_CONTEXT_TOKENS, show_default=True, help='Maximum tokens of documentation sent with each file')
+@click.option('--batch', 'batch_mode', is_flag=True, help='Send the per-file requests through the OpenAI Batch API (cheaper, asynchronous, resumable)')
+@click.option('--batch-dir', default=None, help='Directory holding the batch requests, state and results (default: <output>/batch)')
+@click.option('--batch-poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True, help='Seconds between batch status checks')
+@click.option('--resume', is_flag=True, help='Skip files whose result is already in the journal of an interrupted run')
+@click.option('--prometheus-file', default=None, help='Also write the run metrics to this file for the Prometheus textfile collector')
+@click.option('--max-output-tokens', default=DEFAULT_MAX_OUTPUT_TOKENS, show_default=True, help='Cap on the tokens of the streamed report')
+@click.option('--similarity', default=DEFAULT_SIMILARITY, show_default=True, help='Similarity above which suggestions of different files are merged (above 1 disables merging)')
+@click.option('--triage-only', is_flag=True, help='Only write the rule-based migration inventory, without calling the model')
+@click.option('--no-triage', is_flag=True, help='Send every file to the model, including those the rules resolve')
+@click.option('--near-duplicate-similarity', default=DEFAULT_NEAR_DUPLICATE_SIMILARITY, show_default=True, help='Similarity above which a file reuses the analysis of a near-copy (above 1 only reuses exact copies)')
+@click.option('--plan', 'plan_only', is_flag=True, help='Print the requests, tokens, cost and time of the run without calling the model')
+def main(doc_file: str, repo_directory: str, output: str, modernization_report_file: str, debug: bool, concurrency: int, no_cache: bool, refresh: bool,
+         small_file_tokens: int, batch_token_budget: int, chunk_tokens: int, max_file_tokens: int,
+         doc_top_k: int, doc_context_tokens: int, batch_mode: bool, batch_dir: str, batch_poll_interval: float,
+         resume: bool, prometheus_file: str, max_output_tokens: int, similarity: float, triage_only: bool,
+         no_triage: bool, near_duplicate_similarity: float, plan_only: bool):
     """Analyze Java files from documentation and suggest Spring Boot modernization opportunities."""
-    if not os.getenv("OPENAI_API_KEY"):
+    if not (plan_only or triage_only) and not os.getenv("OPENAI_API_KEY"):
         console.print("[red]Error: OPENAI_API_KEY environment variable not set[/red]")
         return
+    # Triage alone sends no request
+    if not triage_only:
+        try:
+            get_router()
+        except ModelsFileError as e:
+            console.print(f"[red]Error: {str(e)}[/red]")
+            return
+
+    cache = open_cache(no_cache, refresh)
+    set_cache(cache)
+    batch_queue = BatchQueue(
+        client, batch_dir or os.path.join(output, 'batch'), batch_poll_interval,
+        on_status=lambda batch_id, status, detail: console.print(f"[cyan]Batch {batch_id}: {status} {detail}[/cyan]")
+    ) if batch_mode else None
     
     with open(doc_file, 'r') as file:
         doc_content = file.read()
+    # Each prompt only carries the documentation sections relevant to its file
+    doc_index = DocIndex(doc_content, doc_top_k, doc_context_tokens)
 
     console.print("[yellow]Extracting Java files from documentation...[/yellow]")
-    java_files = scan_codebase(repo_directory, debug)
+    with telemetry.stage('scan'):
+        java_files = scan_codebase(repo_directory, debug)
     
     if not java_files:
         console.print("[red]No Java files found in the repository[/red]")
         return
     
-    analyses = []
-    
-    with Progress() as progress:
-        task = progress.add_task("[green]Analyzing Java files...", total=len(java_files))
+    java_files = filter_skipped(
+        java_files, max_file_tokens,
+        on_skip=lambda file_path, reason: console.print(f"[yellow]Skipping {file_path}: {reason}[/yellow]"),
+        root=repo_directory)
+
+    # Well-known patterns are answered by the rules, only complex or unknown ones need the model
+    os.makedirs(output, exist_ok=True)
+    with telemetry.stage('triage'):
+        triaged = triage_files(java_files, repo_directory, os.path.join(output, INVENTORY_FILE))
+    if triage_only:
+        run_report_path = os.path.join(output, RUN_REPORT_FILE)
+        telemetry.write_report(run_report_path, 'mod-gen', prometheus_file)
+        return
+    if not no_triage:
+        java_files = [file_path for file_path in java_files if triaged[file_path].relevant]
+
+    if plan_only:
+        plan = Plan(cache)
+        rule_analyses = {} if no_triage else {file_path: rule_analysis(triaged[file_path])
+                                               for file_path in java_files if not triaged[file_path].needs_llm}
+        plan_analysis(plan, doc_index, [file_path for file_path in java_files if file_path not in rule_analyses],
+                      rule_analyses, repo_directory, chunk_tokens, small_file_tokens, batch_token_budget, similarity,
+                      near_duplicate_similarity, max_output_tokens)
+        for line in plan.summary(concurrency, get_limiter().rpm, get_limiter().tpm):
+            console.print(f"[cyan]{line}[/cyan]")
+        return
+
+    # Every analysis is journaled as soon as it arrives, so an interrupted run can resume
+    journal = Journal(os.path.join(output, JOURNAL_FILE), resume)
+    pending_files = [file_path for file_path in java_files if not journal.is_done(file_path, read_text(file_path))]
+    if resume: console.print(f"[yellow]Resuming: {len(java_files) - len(pending_files)} files already analyzed[/yellow]")
+    if not no_triage:
+        for file_path in pending_files:
+            if not triaged[file_path].needs_llm:
+                journal.append(file_path, read_text(file_path), rule_analysis(triaged[file_path]))
+        pending_files = [file_path for file_path in pending_files if triaged[file_path].needs_llm]
+
+    # Copies of a file reuse its analysis; near-copies get it updated from their diff, which batch mode cannot wait for
+    duplicates = find_duplicates(pending_files, near_duplicate_similarity, exact_only=batch_mode)
+    if duplicates: console.print(f"[cyan]{duplicates_summary(duplicates)}[/cyan]")
+    originals = [file_path for file_path in pending_files if file_path not in duplicates]
+
+    def process_duplicate(file_path: str, duplicate) -> str:
+        representative = duplicate.representative
+        if journal.is_done(representative, read_text(representative)):
+            try:
+                analysis = reuse_result(client, file_path, duplicate, next(journal.read([representative]))[1], repo_directory,
+                                        validate=has_suggestions)
+                if analysis is not None:
+                    return analysis
+            except Exception as e:
+                console.print(f"[red]Error analyzing {file_path}: {str(e)}[/red]")
+        return analyze_java_file(doc_index, file_path, debug, chunk_tokens)
+
+    def finish_file(file_path: str, analysis: str):
+        journal.append(file_path, read_text(file_path), analysis, failed=analysis.startswith("Error analyzing"))
+        progress.update(task, advance=1)
+
+    with telemetry.stage('per-file'), Progress() as progress:
+        task = progress.add_task("[green]Analyzing Java files...", total=len(pending_files))
         
-        for file_path in java_files:
-            analysis = analyze_java_file(doc_content, file_path, debug)
-            analyses.append(f"## Analysis for {file_path}\n\n{analysis}")
-            progress.update(task, advance=1)
+        if batch_queue:
+            set_batch(batch_queue)
+            batch_queue.run(
+                originals, lambda file_path: analyze_java_file(doc_index, file_path, debug, chunk_tokens),
+                on_done=finish_file)
+            set_batch(None)
+        else:
+            map_packed(
+                originals,
+                lambda file_path: analyze_java_file(doc_index, file_path, debug, chunk_tokens),
+                lambda file_paths: analyze_java_files(doc_index, file_paths, debug),
+                concurrency, on_done=finish_file,
+                small_file_tokens=small_file_tokens, batch_token_budget=batch_token_budget)
+        map_duplicates(duplicates, process_duplicate, concurrency, on_done=finish_file)
+
+    # Most files repeat the same advice, only the merged suggestions go into the report prompt
+    with telemetry.stage('aggregate'):
+        suggestions = aggregate_analyses(journal.read(java_files), similarity, debug)
     
     report_path = os.path.join(output, modernization_report_file)
-    generate_modernization_report(analyses, report_path, debug)
+    with telemetry.stage('combine'), Progress() as progress:
+        task = progress.add_task("[green]Generating modernization report...", total=max_output_tokens)
+        generate_modernization_report(
+            suggestions, report_path, debug, max_output_tokens,
+            on_tokens=lambda tokens: progress.update(task, completed=tokens, description=f"[green]Generating modernization report: {tokens} tokens"))
+    journal.close()
+
+    if routing_summary(): console.print(f"[cyan]{routing_summary()}[/cyan]")
+    if cache: console.print(f"[cyan]{cache.summary()}[/cyan]")
+    if get_limiter().retries: console.print(f"[cyan]{get_limiter().summary()}[/cyan]")
+
+    run_report_path = os.path.join(output, RUN_REPORT_FILE)
+    telemetry.write_report(run_report_path, 'mod-gen', prometheus_file)
+    console.print(f"[cyan]Run report saved to '{run_report_path}'[/cyan]")
 
 if __name__ == '__main__':
     main()
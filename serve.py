@@ -0,0 +1,318 @@
+import os
+import json
+import threading
+import time
+from typing import Optional
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+import click
+from rich.console import Console
+from dotenv import load_dotenv
+
+from codernize.cache import ResponseCache, open_cache
+from codernize.chunking import DEFAULT_CHUNK_TOKENS, DEFAULT_MAX_FILE_TOKENS, filter_skipped
+from codernize.classifier import DEFAULT_MIN_CONFIDENCE
+from codernize.diagram import DEFAULT_MAX_NODES
+from codernize.executor import DEFAULT_CONCURRENCY
+from codernize.llm import DEFAULT_MAX_OUTPUT_TOKENS, LazyClient, get_limiter, set_cache
+from codernize.manifest import is_unchanged, load_manifest, make_entry, refresh_stat, save_manifest
+from codernize.packing import DEFAULT_BATCH_TOKEN_BUDGET, DEFAULT_SMALL_FILE_TOKENS, map_packed
+from codernize.reduce import DEFAULT_FAN_IN, DEFAULT_NODE_TOKEN_BUDGET
+from codernize.routing import ModelsFileError, get_router, routing_summary
+from codernize.scanner import read_text, scan, set_snapshot
+from codernize.telemetry import telemetry
+from codernize.tools import load_tool
+from codernize.watch import DEFAULT_DEBOUNCE, DEFAULT_MAX_DELAY, DEFAULT_POLL_INTERVAL, Watcher
+
+load_dotenv()
+
+console = Console(width=200, force_terminal=True)
+
+RUN_REPORT_FILE = 'serve-run-report.json'
+DEFAULT_PORT = 8780
+
+
+class Outputs:
+    """The latest document, diagrams and short docs, each replaced whole so a reader never sees a partial one."""
+
+    def __init__(self):
+        self.doc = None
+        self.diagram = None
+        self.simplified_diagram = None
+        self.short_docs = {}  # Path relative to the repository -> short doc
+        self.pending = set()  # Files whose short doc is being regenerated
+        self.building = False
+        self.batches = 0
+        self.updated_at = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def start(self, file_names: list):
+        with self._lock:
+            self.pending.update(file_names)
+
+    def finish(self, file_name: str, short_doc: Optional[str]):
+        """Serve the new short doc of a file; None keeps the previous one."""
+        with self._lock:
+            if short_doc is not None:
+                self.short_docs[file_name] = short_doc
+            self.pending.discard(file_name)
+
+    def remove(self, file_name: str):
+        with self._lock:
+            self.short_docs.pop(file_name, None)
+
+    def status(self) -> dict:
+        with self._lock:
+            return {
+                'building': self.building,
+                'batches': self.batches,
+                'updated_at': self.updated_at,
+                'files': len(self.short_docs),
+                'pending': sorted(self.pending),
+                'error': self.error,
+            }
+
+
+class Handler(BaseHTTPRequestHandler):
+    outputs: Outputs = None
+
+    def log_message(self, *args):
+        pass
+
+    def send_text(self, text: str, content_type: str = 'text/plain', status: int = 200):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        path = unquote(urlparse(self.path).path)
+        outputs = self.outputs
+        documents = {
+            '/doc': (outputs.doc, 'text/markdown'),
+            '/diagram': (outputs.diagram, 'text/plain'),
+            '/diagram/simplified': (outputs.simplified_diagram, 'text/plain'),
+        }
+        if path == '/status':
+            self.send_text(json.dumps(outputs.status(), indent=2), 'application/json')
+        elif path in documents:
+            text, content_type = documents[path]
+            if text is None:
+                self.send_text("Not built yet, see /status\n", status=503)
+            else:
+                self.send_text(text, content_type)
+        elif path.startswith('/files/'):
+            file_name = path[len('/files/'):]
+            short_doc = outputs.short_docs.get(file_name)
+            if short_doc is None:
+                status = 503 if file_name in outputs.pending else 404
+                self.send_text(f"No documentation for {file_name}\n", status=status)
+            else:
+                self.send_text(short_doc, 'text/markdown')
+        else:
+            self.send_text(f"Unknown path {path}\n", status=404)
+
+
+def read_output(path: str):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@click.command()
+@click.argument('repo-directory', required=True, type=click.Path(exists=True))
+@click.option('--output', '-o', default='docs', help='Output directory for all generated files')
+@click.option('--doc-file', '-doc', default='project.md', help='Name of the documentation file')
+@click.option('--combined-diagram-file', '-diagram', default='system-diagram.mermaid', help='Name of the combined diagram file')
+@click.option('--host', default='127.0.0.1', show_default=True, help='Address the HTTP API listens on')
+@click.option('--port', default=DEFAULT_PORT, show_default=True, help='Port of the HTTP API')
+@click.option('--poll-interval', default=DEFAULT_POLL_INTERVAL, show_default=True, help='Seconds between checks for changed files')
+@click.option('--debounce', default=DEFAULT_DEBOUNCE, show_default=True, help='Seconds without further changes before a batch is rebuilt')
+@click.option('--max-delay', default=DEFAULT_MAX_DELAY, show_default=True, help='Seconds after the first change by which a batch is rebuilt, even if changes keep coming')
+@click.option('--debug', '-d', is_flag=True, help='Enable debug output')
+@click.option('--concurrency', '-c', default=DEFAULT_CONCURRENCY, show_default=True, help='Number of files processed in parallel')
+@click.option('--no-cache', is_flag=True, help='Keep responses in memory only, for the lifetime of the process')
+@click.option('--min-confidence', default=DEFAULT_MIN_CONFIDENCE, show_default=True, help='Confidence needed to accept the local file classifier')
+@click.option('--small-file-tokens', default=DEFAULT_SMALL_FILE_TOKENS, show_default=True, help='Files up to this many tokens are packed into shared requests (0 disables packing)')
+@click.option('--batch-token-budget', default=DEFAULT_BATCH_TOKEN_BUDGET, show_default=True, help='Maximum tokens of files packed into one request')
+@click.option('--chunk-tokens', default=DEFAULT_CHUNK_TOKENS, show_default=True, help='Larger files are split into chunks of this many tokens')
+@click.option('--max-file-tokens', default=DEFAULT_MAX_FILE_TOKENS, show_default=True, help='Files larger than this many tokens are skipped')
+@click.option('--fan-in', default=DEFAULT_FAN_IN, show_default=True, type=click.IntRange(min=2), help='Maximum number of docs combined in one summary call')
+@click.option('--node-token-budget', default=DEFAULT_NODE_TOKEN_BUDGET, show_default=True, help='Maximum input tokens of one summary call')
+@click.option('--max-nodes', default=DEFAULT_MAX_NODES, show_default=True, help='Maximum number of nodes in the simplified diagram')
+@click.option('--max-output-tokens', default=DEFAULT_MAX_OUTPUT_TOKENS, show_default=True, help='Cap on the tokens of the streamed cleanup answer')
+@click.option('--prometheus-file', default=None, help='Also write the metrics of each batch to this file for the Prometheus textfile collector')
+def main(repo_directory: str, output: str, doc_file: str, combined_diagram_file: str, host: str, port: int,
+         poll_interval: float, debounce: float, max_delay: float, debug: bool, concurrency: int, no_cache: bool,
+         min_confidence: float, small_file_tokens: int, batch_token_budget: int, chunk_tokens: int,
+         max_file_tokens: int, fan_in: int, node_token_budget: int, max_nodes: int, max_output_tokens: int,
+         prometheus_file: str):
+    """Keep the documentation and system diagram of a codebase current as it changes, and serve them over HTTP."""
+    if not os.getenv("OPENAI_API_KEY"):
+        console.print("[red]Error: OPENAI_API_KEY environment variable not set[/red]")
+        return
+    try:
+        get_router()
+    except ModelsFileError as e:
+        console.print(f"[red]Error: {str(e)}[/red]")
+        return
+
+    # Unchanged subtrees of the combine step are answered from the cache, so keep one even with --no-cache
+    cache = open_cache(no_cache, False) or ResponseCache(':memory:')
+    set_cache(cache)
+
+    doc_gen, diag_gen = load_tool('doc-gen.py'), load_tool('diag-gen.py')
+    # One client for the life of the process, so its connection pool stays warm between batches
+    client = LazyClient(api_key=os.getenv("OPENAI_API_KEY"))
+    for tool in (doc_gen, diag_gen):
+        tool.client = client
+
+    os.makedirs(output, exist_ok=True)
+    doc_path = os.path.join(output, doc_file)
+    diagram_path = os.path.join(output, combined_diagram_file)
+    simplified_path = diagram_path.replace('.mermaid', '_simplified.mermaid')
+    extensions = doc_gen.RELEVANT_EXTENSIONS | diag_gen.RELEVANT_EXTENSIONS
+    output_prefix = os.path.join(os.path.abspath(output), '')
+
+    def relative(file_path: str) -> str:
+        return os.path.relpath(file_path, repo_directory)
+
+    # The manifest and outputs of an earlier run (of serve or doc-gen) are served until the first build replaces them
+    entries = load_manifest(output)
+    outputs = Outputs()
+    outputs.short_docs = {file_name: entry['short_doc'] for file_name, entry in entries.items()}
+    outputs.doc = read_output(doc_path)
+    outputs.diagram = read_output(diagram_path)
+    outputs.simplified_diagram = read_output(simplified_path)
+    state = {'snapshot': None, 'diagram_hashes': None}
+
+    def process_file(file_path: str):
+        try:
+            content = read_text(file_path)
+            category, short_doc = doc_gen.document_file(file_path, content, min_confidence, chunk_tokens, debug)
+            return make_entry(file_path, content, category=category, short_doc=short_doc)
+        except Exception as e:
+            console.print(f"[red]Error processing {file_path}: {str(e)}[/red]")
+            return None
+
+    def process_batch(file_paths: list) -> dict:
+        try:
+            contents = {file_path: read_text(file_path) for file_path in file_paths}
+            documented = doc_gen.document_small_files(list(contents.items()), min_confidence, debug)
+            return {file_path: make_entry(file_path, contents[file_path], category=category, short_doc=short_doc)
+                    for file_path, (category, short_doc) in documented.items()}
+        except Exception as e:
+            console.print(f"[red]Error processing batch: {str(e)}[/red]")
+            return {}
+
+    def finish_file(file_path: str, entry: dict):
+        # Served as soon as it is in, before the combine step of its batch
+        if entry is not None and not entry['short_doc'].startswith("// Error documenting"):
+            entries[relative(file_path)] = entry
+            outputs.finish(relative(file_path), entry['short_doc'])
+        else:
+            outputs.finish(relative(file_path), None)
+
+    def rebuild():
+        """Regenerate the short docs of new and modified files, then the document and diagram they feed."""
+        with telemetry.stage('scan'):
+            snapshot = scan(repo_directory, extensions, previous=state['snapshot'])
+            set_snapshot(snapshot)
+            state['snapshot'] = snapshot
+        files = [file_path for file_path in snapshot.paths() if not os.path.abspath(file_path).startswith(output_prefix)]
+        doc_files = [file_path for file_path in files if os.path.splitext(file_path)[1] in doc_gen.RELEVANT_EXTENSIONS]
+        diag_files = [file_path for file_path in files if os.path.splitext(file_path)[1] in diag_gen.RELEVANT_EXTENSIONS]
+
+        current = {relative(file_path) for file_path in doc_files}
+        removed = [file_name for file_name in entries if file_name not in current]
+        for file_name in removed:
+            del entries[file_name]
+            outputs.remove(file_name)
+        stale_files = []
+        for file_path in doc_files:
+            entry = entries.get(relative(file_path))
+            if entry is None or not is_unchanged(entry, file_path):
+                stale_files.append(file_path)
+            else:
+                entries[relative(file_path)] = refresh_stat(entry, file_path)
+        stale_files = filter_skipped(
+            stale_files, max_file_tokens,
+            on_skip=lambda file_path, reason: console.print(f"[yellow]Skipping {file_path}: {reason}[/yellow]"),
+            root=repo_directory)
+
+        if stale_files:
+            console.print(f"[yellow]Documenting {len(stale_files)} new or modified files...[/yellow]")
+            outputs.start([relative(file_path) for file_path in stale_files])
+            with telemetry.stage('per-file'):
+                map_packed(stale_files, process_file, process_batch, concurrency, on_done=finish_file,
+                           small_file_tokens=small_file_tokens, batch_token_budget=batch_token_budget)
+        save_manifest(output, entries)
+
+        if stale_files or removed or outputs.doc is None:
+            leaves = [(relative(file_path), entries[relative(file_path)]['short_doc'])
+                      for file_path in doc_files if relative(file_path) in entries]
+            console.print("[blue]Combining documentation snippets into a single document...[/blue]")
+            with telemetry.stage('combine'):
+                combined_doc = doc_gen.combine_short_docs(leaves, fan_in, node_token_budget, concurrency, debug)
+            with telemetry.stage('cleanup'):
+                doc_gen.clean_up_within_budget(combined_doc, node_token_budget, doc_path, max_output_tokens, debug)
+            outputs.doc = read_output(doc_path)
+
+        # The diagram is extracted locally, so it is rebuilt whenever one of its files changed
+        diagram_hashes = {file_path: snapshot.get(file_path).hash for file_path in diag_files}
+        if diagram_hashes != state['diagram_hashes'] or outputs.diagram is None:
+            with telemetry.stage('diagram'):
+                diag_gen.write_static_diagram(diag_files, diagram_path, False, debug)
+                diag_gen.simplify_diagram(diagram_path, max_nodes, debug)
+            state['diagram_hashes'] = diagram_hashes
+            outputs.diagram = read_output(diagram_path)
+            outputs.simplified_diagram = read_output(simplified_path)
+
+    def run_batch(description: str):
+        console.print(f"[yellow]{description}[/yellow]")
+        telemetry.reset()
+        outputs.building = True
+        try:
+            rebuild()
+            outputs.error = None
+            outputs.batches += 1
+            outputs.updated_at = time.strftime('%Y-%m-%dT%H:%M:%S%z')
+        except Exception as e:
+            # Keep serving the last complete outputs; the next change retries
+            outputs.error = str(e)
+            console.print(f"[red]Error rebuilding: {str(e)}[/red]")
+        finally:
+            outputs.building = False
+
+        if routing_summary(): console.print(f"[cyan]{routing_summary()}[/cyan]")
+        console.print(f"[cyan]{cache.summary()}[/cyan]")
+        if get_limiter().retries: console.print(f"[cyan]{get_limiter().summary()}[/cyan]")
+        telemetry.write_report(os.path.join(output, RUN_REPORT_FILE), 'serve', prometheus_file)
+        console.print(f"[green]Up to date, serving on http://{host}:{port}[/green]")
+
+    # Changes made during the first build are picked up by the first batch after it
+    watcher = Watcher(repo_directory, extensions, poll_interval, debounce, max_delay, exclude=(output,))
+    Handler.outputs = outputs
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    console.print(f"[cyan]HTTP API on http://{host}:{port}: /doc, /diagram, /diagram/simplified, /files/<path>, /status[/cyan]")
+    console.print(f"[cyan]Watching {repo_directory} ({watcher.mode})[/cyan]")
+
+    try:
+        run_batch("Building documentation and diagram...")
+        while True:
+            changes = watcher.wait()
+            run_batch(f"{len(changes.changed)} files changed and {len(changes.removed)} removed, updating...")
+    except KeyboardInterrupt:
+        console.print("[yellow]Stopping[/yellow]")
+    finally:
+        watcher.close()
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()